@@ -1,9 +1,31 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
-from src.enums import Color
+from src.bitboard import square_bit
+from src.clock import GameClock
+from src.enums import Color, PieceType, CastlingRight
 from src.piece import Piece
-from src.data_types import Position
+from src.data_types import Position, BoardMove, PlyRecord, Undo
+
+# King destination when castling -> (rook start, rook end)
+CASTLING_ROOK_MOVES: Dict[Position, Tuple[Position, Position]] = {
+    (0, 6): ((0, 7), (0, 5)),
+    (0, 2): ((0, 0), (0, 3)),
+    (7, 6): ((7, 7), (7, 5)),
+    (7, 2): ((7, 0), (7, 3)),
+}
+# Rights lost once anything moves from or to one of these squares
+CASTLING_RIGHTS_LOST: Dict[Position, int] = {
+    (0, 4): int(CastlingRight.WHITE_KINGSIDE | CastlingRight.WHITE_QUEENSIDE),
+    (0, 7): int(CastlingRight.WHITE_KINGSIDE),
+    (0, 0): int(CastlingRight.WHITE_QUEENSIDE),
+    (7, 4): int(CastlingRight.BLACK_KINGSIDE | CastlingRight.BLACK_QUEENSIDE),
+    (7, 7): int(CastlingRight.BLACK_KINGSIDE),
+    (7, 0): int(CastlingRight.BLACK_QUEENSIDE),
+}
+# Occurrences of a position, and plies without a capture or pawn move, that draw the game
+THREEFOLD_REPETITION = 3
+FIFTY_MOVE_PLIES = 100
 
 
 class AbsChessBoard(ABC):
@@ -14,11 +36,30 @@ class AbsChessBoard(ABC):
         self.board: Optional[List[List[Optional[Piece]]]] = None
         self.is_white_checked: bool = False
         self.is_black_checked: bool = False
+        self.castling_rights: int = int(CastlingRight.NONE)
+        self.en_passant: Optional[Position] = None
+        # Bit i is set when the piece on square i has moved; pieces are shared flyweights, so this lives here
+        self.moved: int = 0
+        self.undo_stack: List[Undo] = []
+        # Zobrist key of the position (see src/zobrist.py), kept up to date by the subclasses
+        self.zobrist_key: int = 0
+        # Every position since the board was set up, the current one last; make_move and unmake_move maintain it
+        self.history: List[PlyRecord] = []
+        # How often each key occurs in history, so repetitions are found without scanning it
+        self.position_counts: Dict[int, int] = {}
+        # Plies played in the game before the first position of history, for the move number
+        self.plies_before_history = 0
+        # Only set for timed games
+        self.clock: Optional[GameClock] = None
 
     @abstractmethod
     def get_piece(self, pos: Position) -> Piece:
         pass
 
+    @abstractmethod
+    def set_piece(self, pos: Position, piece: Optional[Piece]) -> None:
+        pass
+
     @abstractmethod
     def move(self, start_pos: Position, end_pos: Position) -> None:
         pass
@@ -32,3 +73,172 @@ class AbsChessBoard(ABC):
         prev_piece: Piece,
     ) -> None:
         pass
+
+    @abstractmethod
+    def promote_pawn(self, promotion_piece: Piece, position: Position) -> None:
+        pass
+
+    @abstractmethod
+    def change_turn(self) -> None:
+        pass
+
+    def start_history(self, halfmove_clock: int = 0, fullmove_number: int = 1) -> None:
+        """Make the current position the first of the history; subclasses call this once the board is set up."""
+        self.history = [PlyRecord(self.zobrist_key, halfmove_clock, True)]
+        self.position_counts = {self.zobrist_key: 1}
+        self.plies_before_history = 2 * (fullmove_number - 1) + (self.turn == Color.BLACK)
+
+    @property
+    def halfmove_clock(self) -> int:
+        """Plies since the last capture or pawn move."""
+        return self.history[-1].halfmove_clock if self.history else 0
+
+    @property
+    def fullmove_number(self) -> int:
+        """The move number of the position, as in FEN: 1 at the start, going up after each black move."""
+        return 1 + (self.plies_before_history + max(len(self.history) - 1, 0)) // 2
+
+    def repetition_count(self) -> int:
+        """How many times the current position occurred, this occurrence included."""
+        return self.position_counts.get(self.zobrist_key, 0)
+
+    def is_threefold_repetition(self) -> bool:
+        return self.repetition_count() >= THREEFOLD_REPETITION
+
+    def is_fifty_move_draw(self) -> bool:
+        return self.halfmove_clock >= FIFTY_MOVE_PLIES
+
+    def has_moved(self, pos: Position) -> bool:
+        return bool(self.moved & square_bit(pos))
+
+    def set_castling_rights(self, castling_rights: int) -> None:
+        self.castling_rights = castling_rights
+
+    def set_en_passant(self, en_passant: Optional[Position]) -> None:
+        self.en_passant = en_passant
+
+    def make_move(self, move: BoardMove) -> Undo:
+        """
+        Play a full move (castling, en passant and promotion included), flip the turn and push the undo record.
+
+        Check flags are left as they are; callers that need them recompute after the move.
+        """
+        start_pos, end_pos, promotion = move
+        piece = self.get_piece(start_pos)
+        if piece is None:
+            raise ValueError(f"'{start_pos}' is not a valid starting position")
+        captured_position = end_pos
+        captured = self.get_piece(end_pos)
+        if piece.type == PieceType.PAWN and end_pos == self.en_passant and captured is None:
+            captured_position = (start_pos[0], end_pos[1])
+            captured = self.get_piece(captured_position)
+        undo = Undo(
+            move,
+            piece,
+            self.moved,
+            captured,
+            captured_position,
+            self.castling_rights,
+            self.en_passant,
+            self.is_white_checked,
+            self.is_black_checked,
+        )
+
+        moved = (self.moved & ~(square_bit(start_pos) | square_bit(captured_position))) | square_bit(end_pos)
+        if captured_position != end_pos:
+            self.set_piece(captured_position, None)
+        self.move(start_pos, end_pos)
+        if piece.type == PieceType.KING and abs(end_pos[1] - start_pos[1]) == 2:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end_pos]
+            self.move(rook_start, rook_end)
+            moved = (moved & ~square_bit(rook_start)) | square_bit(rook_end)
+        if promotion is not None:
+            self.promote_pawn(Piece(promotion, piece.color), end_pos)
+        self.moved = moved
+
+        castling_rights = self.castling_rights
+        if castling_rights:
+            castling_rights &= ~(CASTLING_RIGHTS_LOST.get(start_pos, 0) | CASTLING_RIGHTS_LOST.get(end_pos, 0))
+            if castling_rights != self.castling_rights:
+                self.set_castling_rights(castling_rights)
+        if piece.type == PieceType.PAWN and abs(end_pos[0] - start_pos[0]) == 2:
+            self.set_en_passant(((start_pos[0] + end_pos[0]) // 2, start_pos[1]))
+        elif self.en_passant is not None:
+            self.set_en_passant(None)
+        self.change_turn()
+        self.undo_stack.append(undo)
+
+        irreversible = captured is not None or piece.type == PieceType.PAWN
+        key = self.zobrist_key
+        self.history.append(PlyRecord(key, 0 if irreversible else self.halfmove_clock + 1, irreversible))
+        self.position_counts[key] = self.position_counts.get(key, 0) + 1
+        return undo
+
+    def unmake_move(self, undo: Optional[Undo] = None) -> None:
+        """
+        Take back the last move played with make_move. undo, when given, must be the record make_move returned for
+        that move, the top of the undo stack; only the last move can be taken back.
+        """
+        if undo is None:
+            undo = self.undo_stack[-1]
+        assert undo is self.undo_stack[-1], "only the last move played can be unmade"
+        self.undo_stack.pop()
+        key = self.history.pop().zobrist_key
+        count = self.position_counts[key]
+        if count == 1:
+            # Dropped rather than left at 0, or searches would fill the table with every position they visit
+            del self.position_counts[key]
+        else:
+            self.position_counts[key] = count - 1
+        start_pos, end_pos, _ = undo.move
+        piece = undo.piece
+
+        self.change_turn()
+        if piece.type == PieceType.KING and abs(end_pos[1] - start_pos[1]) == 2:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end_pos]
+            self.revert_move(rook_start, rook_end, self.get_piece(rook_end), None)
+        self.moved = undo.moved
+        if undo.captured_position == end_pos:
+            self.revert_move(start_pos, end_pos, piece, undo.captured)
+        else:
+            self.revert_move(start_pos, end_pos, piece, None)
+            self.set_piece(undo.captured_position, undo.captured)
+
+        if undo.castling_rights != self.castling_rights:
+            self.set_castling_rights(undo.castling_rights)
+        if undo.en_passant != self.en_passant:
+            self.set_en_passant(undo.en_passant)
+        self.is_white_checked = undo.is_white_checked
+        self.is_black_checked = undo.is_black_checked
+
+    @staticmethod
+    def changed_squares(undo: Undo) -> List[Position]:
+        """Squares whose contents the move recorded in undo changed."""
+        start_pos, end_pos, _ = undo.move
+        squares = [start_pos, end_pos]
+        if undo.captured_position != end_pos:
+            squares.append(undo.captured_position)
+        if undo.piece.type == PieceType.KING and abs(end_pos[1] - start_pos[1]) == 2:
+            squares.extend(CASTLING_ROOK_MOVES[end_pos])
+        return squares
+
+    def initial_castling_rights(self) -> int:
+        """Castling rights implied by unmoved kings and rooks on their starting squares."""
+        rights = CastlingRight.NONE
+        for row, color, kingside, queenside in (
+            (0, Color.WHITE, CastlingRight.WHITE_KINGSIDE, CastlingRight.WHITE_QUEENSIDE),
+            (7, Color.BLACK, CastlingRight.BLACK_KINGSIDE, CastlingRight.BLACK_QUEENSIDE),
+        ):
+            king = self.get_piece((row, 4))
+            if king is None or king.type != PieceType.KING or king.color != color or self.has_moved((row, 4)):
+                continue
+            for column, right in ((7, kingside), (0, queenside)):
+                rook = self.get_piece((row, column))
+                if (
+                    rook is not None
+                    and rook.type == PieceType.ROOK
+                    and rook.color == color
+                    and not self.has_moved((row, column))
+                ):
+                    rights |= right
+        return int(rights)
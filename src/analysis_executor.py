@@ -0,0 +1,170 @@
+"""
+Runs the CPU-heavy game checks (move validation, check and mate detection, engine search) without stalling the
+event loop that serves every socket of the worker.
+
+Calls cheaper than the inline cost threshold run directly on the live board. Everything else is sent to a thread
+or process pool as a compact board snapshot (the binary wire frame, see wire_format), with a bounded number of
+calls in flight and a timeout per call. None of them falls back to the event loop: a validation that times out
+fails the move, which the client may send again, and an analysis that times out runs on a thread of this process
+instead, so a stuck pool slows a game down instead of breaking it or stalling the other games.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple, Optional, TypeVar
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import LegalMoveMap, Position
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.engine import Engine, SearchResult, copy_board
+from src.enums import Color, ExecutorMode, MessageType
+from src.move_generator import MoveGenerator
+from src.move_verifier import MoveVerifier
+
+T = TypeVar("T")
+
+# Rough cost of each call in units of one legal-move generation, compared against the inline cost threshold
+VALIDATION_COST = 1
+ANALYSIS_COST = 2
+# Listing the legal moves on top of an analysis
+LEGAL_MOVES_COST = 1
+# Deciding mate means finding a legal evasion, which can mean trying most moves on the board
+IN_CHECK_COST_FACTOR = 16
+
+
+class PositionAnalysis(NamedTuple):
+    is_white_checked: bool
+    is_black_checked: bool
+    is_checkmate: bool
+    # Only when asked for
+    legal_moves: Optional[LegalMoveMap] = None
+
+
+def board_snapshot(board: AbsChessBoard) -> bytes:
+    snapshot: bytes = Encoder.encode_binary_message(MessageType.NEW_STATE, board)
+    return snapshot
+
+
+def board_from_snapshot(snapshot: bytes) -> ChessBoard:
+    _, matrix, game_state, moved = Decoder.decode_binary_game(snapshot)
+    return ChessBoard(board=matrix, game_state=game_state, moved=moved)
+
+
+def analyse_board(board: AbsChessBoard, with_legal_moves: bool = False) -> PositionAnalysis:
+    move_generator = MoveGenerator(board)
+    is_white_checked = move_generator.is_in_check(Color.WHITE)
+    is_black_checked = move_generator.is_in_check(Color.BLACK)
+    is_turn_checked = is_white_checked if board.turn == Color.WHITE else is_black_checked
+    if with_legal_moves:
+        legal_moves = move_generator.legal_move_map(board.turn)
+        return PositionAnalysis(is_white_checked, is_black_checked, is_turn_checked and not legal_moves, legal_moves)
+    return PositionAnalysis(
+        is_white_checked, is_black_checked, is_turn_checked and not move_generator.has_legal_move(board.turn)
+    )
+
+
+def validate_board_move(board: AbsChessBoard, start_pos: Position, end_pos: Position) -> bool:
+    is_valid: bool = MoveVerifier(board).is_valid_move(start_pos, end_pos)
+    return is_valid
+
+
+# Pool entry points; module level so that they pickle by reference
+
+
+def analyse_snapshot(snapshot: bytes, with_legal_moves: bool = False) -> PositionAnalysis:
+    return analyse_board(board_from_snapshot(snapshot), with_legal_moves)
+
+
+def validate_snapshot_move(snapshot: bytes, start_pos: Position, end_pos: Position) -> bool:
+    return validate_board_move(board_from_snapshot(snapshot), start_pos, end_pos)
+
+
+def search_snapshot(snapshot: bytes, time_budget: float) -> SearchResult:
+    return Engine(time_budget).search(board_from_snapshot(snapshot))
+
+
+class AnalysisExecutor:
+    def __init__(
+        self,
+        mode: ExecutorMode = ExecutorMode.PROCESS,
+        max_workers: Optional[int] = None,
+        max_pending: int = 64,
+        timeout: float = 5.0,
+        inline_cost_threshold: int = 8,
+    ) -> None:
+        self.mode = mode
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.inline_cost_threshold = inline_cost_threshold
+        # Calls waiting for or running in the pool; more callers wait here, within their timeout
+        self.slots = asyncio.Semaphore(max_pending)
+        self.pool: Optional[Executor] = None
+        self.inline_calls = 0
+        self.pooled_calls = 0
+        self.timeouts = 0
+
+    async def is_valid_move(self, board: AbsChessBoard, start_pos: Position, end_pos: Position) -> bool:
+        """Whether the move is legal; False if the pool doesn't answer in time, so the move fails and can be resent."""
+        if self.runs_inline(VALIDATION_COST):
+            return validate_board_move(board, start_pos, end_pos)
+        try:
+            return await self.submit(validate_snapshot_move, board_snapshot(board), start_pos, end_pos)
+        except TimeoutError:
+            return False
+
+    async def analyse(self, board: AbsChessBoard, with_legal_moves: bool = False) -> PositionAnalysis:
+        """Check flags of both sides and whether the side to move is mated, and its legal moves if asked for."""
+        cost = ANALYSIS_COST + (LEGAL_MOVES_COST if with_legal_moves else 0)
+        if MoveGenerator(board).is_in_check(board.turn):
+            cost *= IN_CHECK_COST_FACTOR
+        if self.runs_inline(cost):
+            return analyse_board(board, with_legal_moves)
+        snapshot = board_snapshot(board)
+        try:
+            return await self.submit(analyse_snapshot, snapshot, with_legal_moves)
+        except TimeoutError:
+            # The move is already on the board and must be announced, so this one can't simply fail
+            return await asyncio.to_thread(analyse_snapshot, snapshot, with_legal_moves)
+
+    async def search(self, board: AbsChessBoard, time_budget: float) -> SearchResult:
+        """Engine move for the side to move; a search is never cheap enough to run on the event loop."""
+        if self.mode != ExecutorMode.INLINE:
+            try:
+                return await self.submit(
+                    search_snapshot, board_snapshot(board), time_budget, timeout=time_budget + self.timeout
+                )
+            except TimeoutError:
+                pass
+        return await asyncio.to_thread(Engine(time_budget).search, copy_board(board))
+
+    def runs_inline(self, cost: int) -> bool:
+        if self.mode == ExecutorMode.INLINE or cost < self.inline_cost_threshold:
+            self.inline_calls += 1
+            return True
+        return False
+
+    async def submit(self, function: Callable[..., T], *args: Any, timeout: Optional[float] = None) -> T:
+        """Run function(*args) in the pool; raises TimeoutError if waiting for a slot and running take too long."""
+        try:
+            async with asyncio.timeout(self.timeout if timeout is None else timeout):
+                async with self.slots:
+                    self.pooled_calls += 1
+                    return await asyncio.get_running_loop().run_in_executor(self._pool(), function, *args)
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _pool(self) -> Executor:
+        if self.pool is None:
+            if self.mode == ExecutorMode.PROCESS:
+                self.pool = ProcessPoolExecutor(self.max_workers)
+            else:
+                self.pool = ThreadPoolExecutor(self.max_workers)
+        return self.pool
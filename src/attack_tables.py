@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Tuple
+
+from src.bitboard import POSITIONS
+from src.data_types import Position
+from src.enums import Color, PieceType
+
+ROOK_DIRECTIONS: List[Tuple[int, int]] = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_DIRECTIONS: List[Tuple[int, int]] = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+QUEEN_DIRECTIONS: List[Tuple[int, int]] = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_OFFSETS: List[Tuple[int, int]] = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+
+PAWN_DIRECTION: Dict[Color, int] = {Color.WHITE: 1, Color.BLACK: -1}
+PAWN_START_ROW: Dict[Color, int] = {Color.WHITE: 1, Color.BLACK: 6}
+
+Ray = Tuple[Position, ...]
+
+
+def _on_board(row: int, column: int) -> bool:
+    return 0 <= row <= 7 and 0 <= column <= 7
+
+
+def _step_targets(pos: Position, offsets: List[Tuple[int, int]]) -> Tuple[Position, ...]:
+    return tuple((pos[0] + dx, pos[1] + dy) for dx, dy in offsets if _on_board(pos[0] + dx, pos[1] + dy))
+
+
+def _ray(pos: Position, direction: Tuple[int, int]) -> Ray:
+    squares = []
+    row, column = pos[0] + direction[0], pos[1] + direction[1]
+    while _on_board(row, column):
+        squares.append((row, column))
+        row, column = row + direction[0], column + direction[1]
+    return tuple(squares)
+
+
+def _rays(pos: Position, directions: List[Tuple[int, int]]) -> Tuple[Ray, ...]:
+    return tuple(ray for ray in (_ray(pos, direction) for direction in directions) if ray)
+
+
+# Attack tables, indexed by square index (row * 8 + column) and built once at import.
+KNIGHT_TARGETS: List[Tuple[Position, ...]] = [_step_targets(pos, KNIGHT_OFFSETS) for pos in POSITIONS]
+KING_TARGETS: List[Tuple[Position, ...]] = [_step_targets(pos, QUEEN_DIRECTIONS) for pos in POSITIONS]
+ROOK_RAYS: List[Tuple[Ray, ...]] = [_rays(pos, ROOK_DIRECTIONS) for pos in POSITIONS]
+BISHOP_RAYS: List[Tuple[Ray, ...]] = [_rays(pos, BISHOP_DIRECTIONS) for pos in POSITIONS]
+QUEEN_RAYS: List[Tuple[Ray, ...]] = [ROOK_RAYS[i] + BISHOP_RAYS[i] for i in range(64)]
+SLIDER_RAYS: Dict[PieceType, List[Tuple[Ray, ...]]] = {
+    PieceType.ROOK: ROOK_RAYS,
+    PieceType.BISHOP: BISHOP_RAYS,
+    PieceType.QUEEN: QUEEN_RAYS,
+}
+# Squares a pawn of the given color attacks from each square.
+PAWN_ATTACKS: Dict[Color, List[Tuple[Position, ...]]] = {
+    color: [_step_targets(pos, [(direction, -1), (direction, 1)]) for pos in POSITIONS]
+    for color, direction in PAWN_DIRECTION.items()
+}
+
+# Every ray from every square keyed by direction, used to walk past a blocker (pins, x-rays through the king).
+DIRECTION_RAYS: Dict[Tuple[int, int], List[Ray]] = {
+    direction: [_ray(pos, direction) for pos in POSITIONS] for direction in QUEEN_DIRECTIONS
+}
+
+
+def _mask(positions: Tuple[Position, ...]) -> int:
+    mask = 0
+    for row, column in positions:
+        mask |= 1 << (row * 8 + column)
+    return mask
+
+
+def _direction(start: Position, end: Position) -> Optional[Tuple[int, int]]:
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    if (dx, dy) == (0, 0) or not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
+        return None
+    return (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+
+
+KNIGHT_ATTACK_MASKS: List[int] = [_mask(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACK_MASKS: List[int] = [_mask(targets) for targets in KING_TARGETS]
+PAWN_ATTACK_MASKS: Dict[Color, List[int]] = {
+    color: [_mask(targets) for targets in attacks] for color, attacks in PAWN_ATTACKS.items()
+}
+# Unit step from one square towards another when they share a rank, file or diagonal, else None.
+DIRECTIONS_BETWEEN: List[List[Optional[Tuple[int, int]]]] = [
+    [_direction(start, end) for end in POSITIONS] for start in POSITIONS
+]
+
+# Bitboard forms of the rays, for generators working on occupancy masks. A ray runs towards higher square indices
+# when its direction is positive, so its first blocker is the lowest set bit of ray & occupied, else the highest.
+RAY_MASKS: Dict[Tuple[int, int], List[int]] = {
+    direction: [_mask(ray) for ray in rays] for direction, rays in DIRECTION_RAYS.items()
+}
+# (ray mask, runs towards higher indices, the direction's ray masks from every square) per direction, by square
+SliderRay = Tuple[int, bool, List[int]]
+ROOK_RAY_MASKS: List[Tuple[SliderRay, ...]] = [
+    tuple(
+        (RAY_MASKS[direction][index], direction[0] * 8 + direction[1] > 0, RAY_MASKS[direction])
+        for direction in ROOK_DIRECTIONS
+        if RAY_MASKS[direction][index]
+    )
+    for index in range(64)
+]
+BISHOP_RAY_MASKS: List[Tuple[SliderRay, ...]] = [
+    tuple(
+        (RAY_MASKS[direction][index], direction[0] * 8 + direction[1] > 0, RAY_MASKS[direction])
+        for direction in BISHOP_DIRECTIONS
+        if RAY_MASKS[direction][index]
+    )
+    for index in range(64)
+]
+# Squares strictly between two squares on a shared rank, file or diagonal, else 0
+BETWEEN_MASKS: List[List[int]] = [
+    [
+        (
+            RAY_MASKS[direction][start] & ~RAY_MASKS[direction][end] & ~(1 << end)
+            if (direction := DIRECTIONS_BETWEEN[start][end]) is not None
+            else 0
+        )
+        for end in range(64)
+    ]
+    for start in range(64)
+]
+
+
+def slider_attacks(index: int, occupied: int, rays: Tuple[SliderRay, ...]) -> int:
+    """Squares a slider on index attacks along rays (ROOK_RAY_MASKS[index] or BISHOP_RAY_MASKS[index])."""
+    attacks = 0
+    for ray, ascending, ray_masks in rays:
+        blockers = ray & occupied
+        if blockers:
+            blocker = (blockers & -blockers).bit_length() - 1 if ascending else blockers.bit_length() - 1
+            attacks |= ray ^ ray_masks[blocker]
+        else:
+            attacks |= ray
+    return attacks
@@ -0,0 +1,407 @@
+"""
+Vectorized check, legal move count and mate detection over many positions at once, for offline jobs such as
+re-validating archived games. Needs NumPy, which the game server itself does not.
+
+A batch holds N positions as an (N, 64) int8 array of square codes (the wire_format encoding: 0 for empty,
+otherwise the PieceType value plus BLACK_PIECE_BIT for black, square index row * 8 + column) together with the
+side to move, castling rights and en passant square of each position. Build one from boards, FENs, binary board
+frames or packed bitboards, then call analyse_batch. Run from the repository root, for example::
+
+    python -m src.batch_analysis positions.fen
+
+Every position is first mirrored so that the side to move plays up the board as white, which lets one set of
+tables serve both colors. Pseudo-legal moves are generated for all positions together, each is played on its own
+copy of the board and kept if it leaves the mover's king safe, the same rule MoveGenerator applies one move at a
+time.
+"""
+
+import argparse
+import sys
+import time
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.abs_chess_board import AbsChessBoard
+from src.attack_tables import DIRECTION_RAYS, KING_TARGETS, KNIGHT_TARGETS, PAWN_ATTACKS, QUEEN_DIRECTIONS
+from src.bitboard import POSITIONS, square_index
+from src.bitboard_chess_board import COLORS, PIECE_TYPES
+from src.encoders import Encoder
+from src.enums import CastlingRight, Color, PieceType
+from src.fen import board_from_fen
+from src.wire_format import BLACK_PIECE_BIT, FLAG_BLACK_TO_MOVE, FLAG_DELTA, FRAME_SIZE, HEADER, NO_SQUARE
+
+# Index of the padding column appended to every board; it reads as OFF_BOARD so rays stop there
+PADDING = 64
+OFF_BOARD = -1
+DEFAULT_CHUNK_SIZE = 1024
+# A pawn reaching the last rank can promote to any of these
+PROMOTION_CHOICES = 4
+
+PAWN = PieceType.PAWN.value
+KNIGHT = PieceType.KNIGHT.value
+BISHOP = PieceType.BISHOP.value
+ROOK = PieceType.ROOK.value
+QUEEN = PieceType.QUEEN.value
+KING = PieceType.KING.value
+PIECE_TYPE_MASK = BLACK_PIECE_BIT - 1
+
+# After mirroring, the side to move is white and castles on row 0
+KINGSIDE = int(CastlingRight.WHITE_KINGSIDE)
+QUEENSIDE = int(CastlingRight.WHITE_QUEENSIDE)
+KING_START = 4
+# (right, squares that must be empty, squares the king crosses that must not be attacked)
+CASTLING_PATHS = (
+    (KINGSIDE, (5, 6), (4, 5, 6)),
+    (QUEENSIDE, (1, 2, 3), (4, 3, 2)),
+)
+
+
+def _padded_table(targets: Sequence[Sequence[int]], width: int) -> np.ndarray:
+    table: np.ndarray = np.full((len(targets), width), PADDING, dtype=np.intp)
+    for index, squares in enumerate(targets):
+        table[index, : len(squares)] = squares
+    return table
+
+
+def _indices(positions: Iterable) -> List[int]:
+    return [square_index(position) for position in positions]
+
+
+# RAYS[square, direction, step]: squares outward from square, rook directions first then bishop directions
+RAYS = np.stack(
+    [
+        _padded_table([_indices(DIRECTION_RAYS[direction][square]) for square in range(64)], 7)
+        for direction in QUEEN_DIRECTIONS
+    ],
+    axis=1,
+)
+STRAIGHT_DIRECTIONS = slice(0, 4)
+DIAGONAL_DIRECTIONS = slice(4, 8)
+# DIRECTIONS_BY_TYPE[piece type, direction]: whether the piece slides that way
+DIRECTIONS_BY_TYPE = np.zeros((PIECE_TYPE_MASK + 1, 8), dtype=bool)
+DIRECTIONS_BY_TYPE[ROOK, STRAIGHT_DIRECTIONS] = True
+DIRECTIONS_BY_TYPE[BISHOP, DIAGONAL_DIRECTIONS] = True
+DIRECTIONS_BY_TYPE[QUEEN] = True
+
+KNIGHT_TABLE = _padded_table([_indices(targets) for targets in KNIGHT_TARGETS], 8)
+KING_TABLE = _padded_table([_indices(targets) for targets in KING_TARGETS], 8)
+# Squares a pawn of each color attacks from each square. These are also where pawns of the other color that attack
+# the square stand.
+WHITE_PAWN_TABLE = _padded_table([_indices(targets) for targets in PAWN_ATTACKS[Color.WHITE]], 2)
+BLACK_PAWN_TABLE = _padded_table([_indices(targets) for targets in PAWN_ATTACKS[Color.BLACK]], 2)
+
+SQUARE_INDICES = np.arange(64)
+ROWS: np.ndarray = SQUARE_INDICES // 8
+# Where a white pawn on each square pushes one and two squares to, PADDING when it cannot
+PAWN_PUSH_TABLE = np.where(ROWS < 7, SQUARE_INDICES + 8, PADDING)
+PAWN_DOUBLE_PUSH_TABLE = np.where(ROWS == 1, SQUARE_INDICES + 16, PADDING)
+# ALIGNED[king, square]: whether square shares a row, column or diagonal with king, so a piece there may be pinned
+ALIGNED: np.ndarray = np.zeros((64, PADDING + 1), dtype=bool)
+ALIGNED[SQUARE_INDICES[:, None, None], RAYS] = True
+ALIGNED = ALIGNED[:, :PADDING]
+# MIRRORED[i] is square i seen from the other side of the board
+MIRRORED = SQUARE_INDICES ^ 56
+
+
+class PositionBatch(NamedTuple):
+    squares: np.ndarray  # (N, 64) int8 square codes
+    black_to_move: np.ndarray  # (N,) bool
+    castling_rights: np.ndarray  # (N,) uint8 CastlingRight bitmask
+    en_passant: np.ndarray  # (N,) uint8 square index, NO_SQUARE when there is none
+
+
+class BatchAnalysis(NamedTuple):
+    white_checked: np.ndarray  # (N,) bool
+    black_checked: np.ndarray  # (N,) bool
+    legal_move_counts: np.ndarray  # (N,) int32, promotions counted once per piece choice
+    is_checkmate: np.ndarray  # (N,) bool
+    is_stalemate: np.ndarray  # (N,) bool
+
+
+def make_batch(
+    squares: np.ndarray,
+    black_to_move: Optional[np.ndarray] = None,
+    castling_rights: Optional[np.ndarray] = None,
+    en_passant: Optional[np.ndarray] = None,
+) -> PositionBatch:
+    """A batch from square codes; by default white is to move with no castling rights and no en passant."""
+    squares = np.ascontiguousarray(squares, dtype=np.int8)
+    if squares.ndim != 2 or squares.shape[1] != 64:
+        raise ValueError(f"Expected an (N, 64) array of square codes, got shape {squares.shape}")
+    count = len(squares)
+    return PositionBatch(
+        squares,
+        np.zeros(count, dtype=bool) if black_to_move is None else np.asarray(black_to_move, dtype=bool),
+        np.zeros(count, dtype=np.uint8) if castling_rights is None else np.asarray(castling_rights, dtype=np.uint8),
+        np.full(count, NO_SQUARE, dtype=np.uint8) if en_passant is None else np.asarray(en_passant, dtype=np.uint8),
+    )
+
+
+def batch_from_boards(boards: Iterable[AbsChessBoard]) -> PositionBatch:
+    boards = list(boards)
+    squares = np.array(
+        [[Encoder.encode_square_code(board.get_piece(position)) for position in POSITIONS] for board in boards],
+        dtype=np.int8,
+    ).reshape(len(boards), 64)
+    return make_batch(
+        squares,
+        np.array([board.turn == Color.BLACK for board in boards], dtype=bool),
+        np.array([board.castling_rights for board in boards], dtype=np.uint8),
+        np.array(
+            [NO_SQUARE if board.en_passant is None else square_index(board.en_passant) for board in boards],
+            dtype=np.uint8,
+        ),
+    )
+
+
+def batch_from_fens(fens: Iterable[str]) -> PositionBatch:
+    return batch_from_boards(board_from_fen(fen) for fen in fens)
+
+
+def batch_from_frames(frames: Sequence[bytes]) -> PositionBatch:
+    """A batch from binary snapshot frames (Encoder.encode_binary_message), unpacked without a Python loop."""
+    if any(len(frame) != FRAME_SIZE for frame in frames):
+        raise ValueError(f"Binary snapshot frames are {FRAME_SIZE} bytes long")
+    raw = np.frombuffer(b"".join(frames), dtype=np.uint8).reshape(len(frames), FRAME_SIZE)
+    if (raw[:, 2] & FLAG_DELTA).any():
+        raise ValueError("Delta frames do not hold a full board")
+    board_offset = HEADER.size
+    packed = raw[:, board_offset:]
+    squares: np.ndarray = np.empty((len(frames), 64), dtype=np.int8)
+    squares[:, 0::2] = packed & 0x0F
+    squares[:, 1::2] = packed >> 4
+    return make_batch(squares, (raw[:, 2] & FLAG_BLACK_TO_MOVE) != 0, raw[:, 3], raw[:, 4])
+
+
+def squares_from_bitboards(bitboards: np.ndarray) -> np.ndarray:
+    """
+    Square codes from (N, 12) uint64 bitboards laid out as in BitboardChessBoard.bitboards
+    (color_index * 6 + piece_type_index, bit i for square i).
+    """
+    bitboards = np.ascontiguousarray(bitboards, dtype="<u8")
+    count = len(bitboards)
+    bits = np.unpackbits(bitboards.view(np.uint8).reshape(count, 12, 8), axis=-1, bitorder="little")
+    codes = np.array(
+        [
+            piece_type.value | (BLACK_PIECE_BIT if color == Color.BLACK else 0)
+            for color in COLORS
+            for piece_type in PIECE_TYPES
+        ],
+        dtype=np.int8,
+    )
+    squares: np.ndarray = (bits.astype(np.int8) * codes[None, :, None]).sum(axis=1, dtype=np.int8)
+    return squares
+
+
+def analyse_batch(batch: PositionBatch, chunk_size: int = DEFAULT_CHUNK_SIZE) -> BatchAnalysis:
+    """
+    Check flags, legal move counts and mate flags of every position in the batch.
+
+    Positions are processed chunk_size at a time, which bounds memory at a few tens of KB per position in a chunk.
+    Raises ValueError if a position lacks a king of either color.
+    """
+    results: List[BatchAnalysis] = []
+    for start in range(0, len(batch.squares), chunk_size):
+        stop = start + chunk_size
+        results.append(_analyse_chunk(PositionBatch(*(array[start:stop] for array in batch))))
+    if not results:
+        empty: np.ndarray = np.zeros(0, dtype=bool)
+        return BatchAnalysis(empty, empty, np.zeros(0, dtype=np.int32), empty, empty)
+    return BatchAnalysis(*(np.concatenate(arrays) for arrays in zip(*results)))
+
+
+def _analyse_chunk(batch: PositionBatch) -> BatchAnalysis:
+    squares, castling_rights, en_passant = _from_movers_side(batch)
+    own_king = squares == KING
+    enemy_king = squares == (KING | BLACK_PIECE_BIT)
+    if not (own_king.any(axis=1) & enemy_king.any(axis=1)).all():
+        raise ValueError("Every position needs a king of each color")
+    own_king_square = own_king.argmax(axis=1)
+    enemy_king_square = enemy_king.argmax(axis=1)
+
+    padded = _pad(squares)
+    mover_checked = _attacked(padded, own_king_square, by_enemy=True)
+    opponent_checked = _attacked(padded, enemy_king_square, by_enemy=False)
+
+    # Play the pseudo-legal moves that could expose the king, each on its own copy of the board, and keep those
+    # that leave the king safe. Out of check, any other piece leaving a square off the king's lines is safe.
+    position, start, end = _pseudo_legal_moves(squares, padded, en_passant)
+    piece = squares[position, start]
+    captures_en_passant = (piece == PAWN) & (end == en_passant[position]) & (squares[position, end] == 0)
+    risky = (piece == KING) | captures_en_passant | mover_checked[position] | ALIGNED[own_king_square[position], start]
+    legal = ~risky
+    tested = np.nonzero(risky)[0]
+    moved = squares[position[tested]]
+    move_rows = np.arange(len(tested))
+    moved[move_rows, end[tested]] = piece[tested]
+    moved[move_rows, start[tested]] = 0
+    en_passant_rows = captures_en_passant[tested]
+    moved[move_rows[en_passant_rows], end[tested][en_passant_rows] - 8] = 0
+    king_square = np.where(piece[tested] == KING, end[tested], own_king_square[position[tested]])
+    legal[tested] = ~_attacked(_pad(moved), king_square, by_enemy=True)
+    promotes = (piece == PAWN) & (ROWS[end] == 7)
+    weights = np.where(promotes, PROMOTION_CHOICES, 1)[legal]
+    counts = np.bincount(position[legal], weights=weights, minlength=len(squares)).astype(np.int32)
+
+    # Castling moves cannot be tested by playing them, as the squares the king crosses matter too
+    on_start = own_king_square == KING_START
+    for right, empty_squares, safe_squares in CASTLING_PATHS:
+        allowed = on_start & ((castling_rights & right) != 0) & (squares[:, empty_squares] == 0).all(axis=1)
+        for square in safe_squares:
+            allowed &= ~_attacked(padded, np.full(len(squares), square), by_enemy=True)
+        counts += allowed
+
+    black_to_move = batch.black_to_move
+    no_moves = counts == 0
+    return BatchAnalysis(
+        np.where(black_to_move, opponent_checked, mover_checked),
+        np.where(black_to_move, mover_checked, opponent_checked),
+        counts,
+        mover_checked & no_moves,
+        ~mover_checked & no_moves,
+    )
+
+
+def _from_movers_side(batch: PositionBatch) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mirror the positions with black to move and swap colors, so the side to move is always white."""
+    squares = batch.squares.copy()
+    castling_rights = batch.castling_rights.copy()
+    en_passant: np.ndarray = batch.en_passant.astype(np.intp)
+    black = batch.black_to_move
+    flipped = squares[black][:, MIRRORED]
+    squares[black] = np.where(flipped != 0, flipped ^ BLACK_PIECE_BIT, 0)
+    black_rights = castling_rights[black]
+    castling_rights[black] = (black_rights >> 2) | ((black_rights & 3) << 2)
+    has_en_passant = en_passant != NO_SQUARE
+    en_passant[black & has_en_passant] ^= 56
+    en_passant[~has_en_passant] = PADDING
+    return squares, castling_rights, en_passant
+
+
+def _pad(squares: np.ndarray) -> np.ndarray:
+    padded: np.ndarray = np.concatenate([squares, np.full((len(squares), 1), OFF_BOARD, dtype=np.int8)], axis=1)
+    return padded
+
+
+def _first_on_rays(padded: np.ndarray, squares: np.ndarray) -> np.ndarray:
+    """Code of the first occupied square in each direction from squares: (N, 8), 0 or OFF_BOARD when none."""
+    along = padded[np.arange(len(padded))[:, None, None], RAYS[squares]]
+    first = (along != 0).argmax(axis=-1)
+    codes: np.ndarray = np.take_along_axis(along, first[..., None], axis=-1)[..., 0]
+    return codes
+
+
+def _attacked(padded: np.ndarray, squares: np.ndarray, by_enemy: bool) -> np.ndarray:
+    """Whether each board's square is attacked by the enemy (black) pieces, or by the mover's when not by_enemy."""
+    color = BLACK_PIECE_BIT if by_enemy else 0
+    rows = np.arange(len(padded))[:, None]
+    pawn_sources = WHITE_PAWN_TABLE[squares] if by_enemy else BLACK_PAWN_TABLE[squares]
+    attacked: np.ndarray = (padded[rows, pawn_sources] == (PAWN | color)).any(axis=1)
+    attacked |= (padded[rows, KNIGHT_TABLE[squares]] == (KNIGHT | color)).any(axis=1)
+    attacked |= (padded[rows, KING_TABLE[squares]] == (KING | color)).any(axis=1)
+    first = _first_on_rays(padded, squares)
+    straight, diagonal = first[:, STRAIGHT_DIRECTIONS], first[:, DIAGONAL_DIRECTIONS]
+    attacked |= ((straight == (ROOK | color)) | (straight == (QUEEN | color))).any(axis=1)
+    attacked |= ((diagonal == (BISHOP | color)) | (diagonal == (QUEEN | color))).any(axis=1)
+    return attacked
+
+
+def _pseudo_legal_moves(
+    squares: np.ndarray, padded: np.ndarray, en_passant: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(position, start, end) of every non-castling move of the side to move, working piece by piece."""
+    count = len(squares)
+    own = (squares > 0) & ((squares & BLACK_PIECE_BIT) == 0)
+    position, start = np.nonzero(own)
+    piece_types = squares[position, start]
+    # Squares a move may end on: empty or enemy, and never the padding column
+    open_padded = (padded == 0) | ((padded > 0) & ((padded & BLACK_PIECE_BIT) != 0))
+    moves: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+
+    # Sliders: a ray square is reachable while every square before it is empty
+    sliding = DIRECTIONS_BY_TYPE[piece_types].any(axis=1)
+    slider_position, slider_start = position[sliding], start[sliding]
+    rays = RAYS[slider_start]
+    along = padded[slider_position[:, None, None], rays]
+    blocked = np.logical_or.accumulate(along != 0, axis=-1)
+    reachable = open_padded[slider_position[:, None, None], rays]
+    reachable[..., 1:] &= ~blocked[..., :-1]
+    reachable &= DIRECTIONS_BY_TYPE[piece_types[sliding]][..., None]
+    moves.append((slider_position, slider_start, rays, reachable))
+
+    # Knights and the king jump to any open square of their table
+    for piece_type, table in ((KNIGHT, KNIGHT_TABLE), (KING, KING_TABLE)):
+        jumping = piece_types == piece_type
+        jump_position, jump_start = position[jumping], start[jumping]
+        jump_ends = table[jump_start]
+        moves.append((jump_position, jump_start, jump_ends, open_padded[jump_position[:, None], jump_ends]))
+
+    # Pawns push onto empty squares and capture enemy pieces or the en passant square
+    pawn = piece_types == PAWN
+    pawn_position, pawn_start = position[pawn], start[pawn]
+    empty_padded = padded == 0
+    capturable = open_padded & ~empty_padded
+    capturable[np.arange(count), en_passant] = True
+    capturable[:, PADDING] = False
+    single, double = PAWN_PUSH_TABLE[pawn_start], PAWN_DOUBLE_PUSH_TABLE[pawn_start]
+    captures = WHITE_PAWN_TABLE[pawn_start]
+    pushes = np.stack([single, double], axis=1)
+    can_push = empty_padded[pawn_position[:, None], pushes]
+    can_push[:, 1] &= can_push[:, 0]
+    moves.append((pawn_position, pawn_start, pushes, can_push))
+    moves.append((pawn_position, pawn_start, captures, capturable[pawn_position[:, None], captures]))
+
+    positions: List[np.ndarray] = []
+    starts: List[np.ndarray] = []
+    ends: List[np.ndarray] = []
+    for piece_position, piece_start, piece_ends, valid in moves:
+        index = np.nonzero(valid)
+        positions.append(piece_position[index[0]])
+        starts.append(piece_start[index[0]])
+        ends.append(piece_ends[index])
+    return np.concatenate(positions), np.concatenate(starts), np.concatenate(ends)
+
+
+def read_fens(path: str) -> List[str]:
+    """One FEN per line; blank lines and lines starting with # are skipped."""
+    with open(path) as fen_file:
+        return [line.strip() for line in fen_file if line.strip() and not line.startswith("#")]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check, legal move count and mate flags for a file of positions.")
+    parser.add_argument("path", help="file with one FEN per line")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="positions analysed together")
+    parser.add_argument("--verbose", action="store_true", help="print the result for every position")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    fens = read_fens(args.path)
+    start = time.perf_counter()
+    batch = batch_from_fens(fens)
+    loaded = time.perf_counter()
+    analysis = analyse_batch(batch, args.chunk_size)
+    seconds = time.perf_counter() - loaded
+
+    if args.verbose:
+        for fen, moves, checkmate, stalemate in zip(
+            fens, analysis.legal_move_counts, analysis.is_checkmate, analysis.is_stalemate
+        ):
+            status = "checkmate" if checkmate else "stalemate" if stalemate else ""
+            print(f"{fen:<90} {moves:>4} {status}")
+    print(
+        f"{len(fens)} positions, {int(analysis.is_checkmate.sum())} checkmates, "
+        f"{int(analysis.is_stalemate.sum())} stalemates, {int(analysis.legal_move_counts.sum())} legal moves"
+    )
+    print(
+        f"loaded in {loaded - start:.3f}s, analysed in {seconds:.3f}s "
+        f"({round(len(fens) / seconds) if seconds > 0 else 0} positions/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
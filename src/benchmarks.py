@@ -0,0 +1,224 @@
+"""
+Micro-benchmarks of the message pipeline: each stage a move or a reconnect goes through, timed in isolation and end
+to end on fixed payloads, with the memory each call allocates. Run from the repository root, for example::
+
+    python -m src.benchmarks
+    python -m src.benchmarks --stage encode --payload endgame
+    python -m src.benchmarks --output bench_output.json --compare bench_baseline.json
+
+Payloads are built from three FENs (an opening, a crowded middlegame and a sparse endgame), since the size of an
+encoded board grows with the number of pieces. A stage's time is the best of --repeat runs of as many calls as fill
+about 0.2s, so noise from other processes only ever makes it slower. Its memory is measured with tracemalloc over
+one call: the peak allocated while it runs and what is still held by its result.
+
+With --compare, stages slower than in the earlier output by more than --max-regression are reported and the run
+fails (exit status 1), so an encoder or decoder change shows its cost before it ships.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import Game, MoveMessage
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.enums import Color, MessageType
+from src.fen import board_from_fen
+from src.message_parser import MessageParser
+from src.move_generator import MoveGenerator
+
+BENCHMARK_PAYLOADS: Dict[str, str] = {
+    "opening": "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "middlegame": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "endgame": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+}
+# Seconds one timed run should last; the call count is picked to fill it
+TARGET_RUN_SECONDS = 0.2
+DEFAULT_REPEAT = 5
+
+
+class Stage(NamedTuple):
+    name: str
+    # "parse", "decode", "encode" or "end_to_end"
+    group: str
+    call: Callable[[], Any]
+
+
+def same_json_text(data: Any) -> str:
+    """JSON text as Starlette's send_json writes it."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def build_stages(fen: str) -> List[Stage]:
+    board: AbsChessBoard = board_from_fen(fen, ChessBoard)
+    move = MoveGenerator(board).legal_board_moves(board.turn)[0]
+    move_data = {"message_type": "move", "move": {"start_position": move.start, "end_position": move.end}}
+    move_frame = same_json_text(move_data)
+    # Some clients send the frame as a JSON string of the JSON text
+    double_encoded_move_frame = json.dumps(move_frame)
+    snapshot = Encoder.encode_message(MessageType.NEW_STATE, board, 1, "0" * 32)
+    game = Encoder.encode_game(board)
+    # Browsers keep the game in the cookie as JSON text
+    cookie_frame = same_json_text({"message_type": "cookie", "game": same_json_text(game.model_dump())})
+    fen_cookie_frame = same_json_text({"message_type": "cookie", "fen": fen})
+    changed_squares = [move.start, move.end]
+
+    def move_round_trip() -> str:
+        Decoder.decode_move(MessageParser.parse_message(move_frame))
+        return same_json_text(Encoder.encode_message(MessageType.NEW_STATE, board, 1, "0" * 32))
+
+    def reconnect() -> str:
+        cookie = MessageParser.parse_cookie(cookie_frame)
+        matrix, game_state, moved = Decoder.decode_game(cookie.game)
+        resumed = ChessBoard(board=matrix, game_state=game_state, turn=Color.WHITE, moved=moved)
+        return same_json_text(Encoder.encode_message(MessageType.NEW_STATE, resumed, 1, "0" * 32))
+
+    def fen_reconnect() -> str:
+        cookie = MessageParser.parse_cookie(fen_cookie_frame)
+        resumed = board_from_fen(cookie.fen, ChessBoard)
+        # A client keeping a FEN cookie opts in to FEN snapshots
+        return same_json_text(Encoder.encode_message(MessageType.NEW_STATE, resumed, 1, "0" * 32, fen_snapshots=True))
+
+    return [
+        Stage("parse_message", "parse", lambda: MessageParser.parse_message(move_frame)),
+        Stage("parse_double_encoded", "parse", lambda: MessageParser.parse_message(double_encoded_move_frame)),
+        Stage("recursive_json_loads", "parse", lambda: Decoder.recursive_json_loads(cookie_frame)),
+        Stage("move_model_validate", "parse", lambda: MoveMessage.model_validate(move_data)),
+        Stage("parse_cookie", "parse", lambda: MessageParser.parse_cookie(cookie_frame)),
+        Stage("decode_game", "decode", lambda: Decoder.decode_game(game)),
+        Stage("decode_position", "decode", lambda: Decoder.decode_position("(6, 4)")),
+        Stage("decode_fen", "decode", lambda: Decoder.decode_fen(fen)),
+        Stage("game_model_validate", "decode", lambda: Game.model_validate(snapshot["game"])),
+        Stage("encode_game", "encode", lambda: Encoder.encode_game(board)),
+        Stage("encode_fen", "encode", lambda: Encoder.encode_fen(board)),
+        Stage("encode_message", "encode", lambda: Encoder.encode_message(MessageType.NEW_STATE, board, 1, "0" * 32)),
+        Stage(
+            "encode_fen_message",
+            "encode",
+            lambda: Encoder.encode_message(MessageType.NEW_STATE, board, 1, "0" * 32, fen_snapshots=True),
+        ),
+        Stage("encode_delta", "encode", lambda: Encoder.encode_delta(MessageType.DELTA, board, changed_squares, 1)),
+        Stage("encode_binary_message", "encode", lambda: Encoder.encode_binary_message(MessageType.NEW_STATE, board)),
+        Stage("json_dumps_snapshot", "encode", lambda: same_json_text(snapshot)),
+        Stage("move_round_trip", "end_to_end", move_round_trip),
+        Stage("reconnect", "end_to_end", reconnect),
+        Stage("fen_reconnect", "end_to_end", fen_reconnect),
+    ]
+
+
+def time_call(call: Callable[[], Any], repeat: int) -> float:
+    """Best seconds per call over repeat runs."""
+    timer = timeit.Timer(call)
+    calls, seconds = timer.autorange()
+    calls = max(1, round(calls * TARGET_RUN_SECONDS / seconds)) if seconds > 0 else calls
+    return min(timer.repeat(repeat, calls)) / calls
+
+
+def measure_memory(call: Callable[[], Any]) -> Dict[str, int]:
+    """Bytes allocated at the peak of one call, and bytes still held by what it returned."""
+    call()
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = call()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_bytes": peak - start, "retained_bytes": current - start}
+
+
+def run_stage(payload: str, stage: Stage, repeat: int) -> Dict[str, Any]:
+    seconds = time_call(stage.call, repeat)
+    return {
+        "payload": payload,
+        "stage": stage.name,
+        "group": stage.group,
+        "ns_per_call": round(seconds * 1e9, 1),
+        "calls_per_second": round(1 / seconds) if seconds > 0 else None,
+        **measure_memory(stage.call),
+    }
+
+
+def compare_results(results: List[Dict[str, Any]], previous_path: str, max_regression: float) -> List[str]:
+    """Annotate results with the speed of the matching stage in a previous output file; returns the regressions."""
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    previous_by_key = {(run["payload"], run["stage"]): run for run in previous.get("results", [])}
+    regressions = []
+    for result in results:
+        match = previous_by_key.get((result["payload"], result["stage"]))
+        if match is None or not match.get("ns_per_call"):
+            continue
+        result["previous_ns_per_call"] = match["ns_per_call"]
+        result["speedup"] = round(match["ns_per_call"] / result["ns_per_call"], 3)
+        if result["ns_per_call"] > match["ns_per_call"] * (1 + max_regression):
+            regressions.append(f"{result['payload']}/{result['stage']}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time and measure the allocations of each message pipeline stage.")
+    parser.add_argument(
+        "--payload", default="all", choices=["all", *BENCHMARK_PAYLOADS], help="position to encode (default: all)"
+    )
+    parser.add_argument(
+        "--stage", help="only run stages whose name or group contains this, e.g. encode or cookie (default: all)"
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"timed runs (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="previous JSON output to compare against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="fraction a stage may slow down against --compare before the run fails (default: 0.2)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    payloads = BENCHMARK_PAYLOADS if args.payload == "all" else {args.payload: BENCHMARK_PAYLOADS[args.payload]}
+
+    results = []
+    for payload, fen in payloads.items():
+        for stage in build_stages(fen):
+            if args.stage and args.stage not in stage.name and args.stage != stage.group:
+                continue
+            result = run_stage(payload, stage, args.repeat)
+            results.append(result)
+            print(
+                f"{payload:<10} {stage.name:<22} {result['ns_per_call']:>10.1f} ns {result['peak_bytes']:>8} B peak "
+                f"{result['retained_bytes']:>8} B retained"
+            )
+
+    regressions = compare_results(results, args.compare, args.max_regression) if args.compare else []
+    for result in results:
+        if "speedup" in result:
+            print(f"{result['payload']:<10} {result['stage']:<22} {result['speedup']:.3f}x vs {args.compare}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if args.output:
+        report = {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
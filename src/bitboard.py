@@ -0,0 +1,34 @@
+from typing import Iterator, List
+
+from src.data_types import Position
+
+# Squares are numbered row-major: index = row * 8 + column, so (0, 0) is bit 0 and (7, 7) is bit 63.
+FULL_BOARD = (1 << 64) - 1
+
+POSITIONS: List[Position] = [(i // 8, i % 8) for i in range(64)]
+
+
+def square_index(pos: Position) -> int:
+    index: int = pos[0] * 8 + pos[1]
+    return index
+
+
+def square_position(index: int) -> Position:
+    return POSITIONS[index]
+
+
+def square_bit(pos: Position) -> int:
+    bit: int = 1 << (pos[0] * 8 + pos[1])
+    return bit
+
+
+def iter_squares(bitboard: int) -> Iterator[int]:
+    """Yield the index of every set bit, lowest first."""
+    while bitboard:
+        low_bit = bitboard & -bitboard
+        yield low_bit.bit_length() - 1
+        bitboard ^= low_bit
+
+
+def pop_count(bitboard: int) -> int:
+    return bitboard.bit_count()
@@ -0,0 +1,165 @@
+from typing import List, Optional
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import square_index
+from src.chess_board import ChessBoard
+from src.data_types import Position, GameState
+from src.enums import Color, PieceType
+from src.piece import Piece
+from src.zobrist import BLACK_TO_MOVE_KEY, PIECE_KEYS, castling_key, en_passant_key, turn_key
+
+COLORS: List[Color] = [Color.WHITE, Color.BLACK]
+PIECE_TYPES: List[PieceType] = list(PieceType)
+# The piece each entry of BitboardChessBoard.bitboards holds
+BITBOARD_PIECES: List[Piece] = [Piece(piece_type, color) for color in COLORS for piece_type in PIECE_TYPES]
+# Mailbox entry of an empty square
+NO_PIECE = -1
+
+
+class BitboardChessBoard(AbsChessBoard):
+    """
+    Chess board that stores one 64-bit occupancy integer per (color, piece type).
+
+    Bitboards are kept in ``self.bitboards`` indexed by ``color_index * 6 + piece_type_index``, the same index
+    ``src.zobrist`` gives pieces, so ``zobrist_key`` is updated from the bitboard index wherever a bit changes.
+    ``self.squares`` mirrors them as a mailbox (the bitboard index of each square's piece) so that looking up one
+    square doesn't scan all twelve, and ``self.color_occupied`` holds each side's pieces for the move generator.
+    """
+
+    def __init__(
+        self,
+        turn: Optional[Color] = None,
+        board: Optional[List[List[Optional[Piece]]]] = None,
+        game_state: Optional[GameState] = None,
+        moved: int = 0,
+    ) -> None:
+        super().__init__()
+        self.bitboards: List[int] = [0] * (len(COLORS) * len(PIECE_TYPES))
+        self.squares: List[int] = [NO_PIECE] * 64
+        # Indexed like COLORS
+        self.color_occupied: List[int] = [0, 0]
+        self.occupied: int = 0
+        if board is None:
+            if turn is not None:
+                matrix, self.white_king_position, self.black_king_position = ChessBoard.default_board()
+                self._load_matrix(matrix)
+                self.turn = turn
+                self.is_white_checked = False
+                self.is_black_checked = False
+        elif game_state is not None:
+            self._load_matrix(board)
+            self.white_king_position = game_state.white_king_position
+            self.black_king_position = game_state.black_king_position
+            self.turn = Color.from_string(game_state.turn.upper())
+            self.is_white_checked = game_state.is_white_checked
+            self.is_black_checked = game_state.is_black_checked
+            self.en_passant = game_state.en_passant
+            self.moved = moved
+        self.castling_rights = self.initial_castling_rights()
+        # The pieces' keys were added as they were loaded
+        self.zobrist_key ^= turn_key(self.turn) ^ castling_key(self.castling_rights) ^ en_passant_key(self.en_passant)
+        if game_state is not None:
+            self.start_history(game_state.halfmove_clock, game_state.fullmove_number)
+        else:
+            self.start_history()
+
+    @staticmethod
+    def bitboard_index(piece_type: PieceType, color: Color) -> int:
+        index: int = (0 if color == Color.WHITE else len(PIECE_TYPES)) + piece_type.value - 1
+        return index
+
+    def color_occupancy(self, color: Color) -> int:
+        return self.color_occupied[0 if color == Color.WHITE else 1]
+
+    def pieces_of(self, piece_type: PieceType, color: Color) -> int:
+        return self.bitboards[BitboardChessBoard.bitboard_index(piece_type, color)]
+
+    def get_piece(self, start_pos: Position) -> Optional[Piece]:
+        index = self.squares[start_pos[0] * 8 + start_pos[1]]
+        return None if index == NO_PIECE else BITBOARD_PIECES[index]
+
+    def set_piece(self, pos: Position, piece: Optional[Piece]) -> None:
+        self._put(square_index(pos), piece)
+        if piece is not None and piece.type == PieceType.KING:
+            if piece.color == Color.WHITE:
+                self.white_king_position = pos
+            else:
+                self.black_king_position = pos
+
+    def move(self, start_pos: Position, end_pos: Position) -> None:
+        start = square_index(start_pos)
+        end = square_index(end_pos)
+        moving_index = self.squares[start]
+        if moving_index == NO_PIECE:
+            raise ValueError(f"'{start_pos}' is not a valid starting position")
+        self._clear(end)
+        start_bit = 1 << start
+        end_bit = 1 << end
+        self.bitboards[moving_index] ^= start_bit | end_bit
+        self.color_occupied[moving_index >= len(PIECE_TYPES)] ^= start_bit | end_bit
+        self.squares[start] = NO_PIECE
+        self.squares[end] = moving_index
+        self.zobrist_key ^= PIECE_KEYS[moving_index * 64 + start] ^ PIECE_KEYS[moving_index * 64 + end]
+        self.occupied = (self.occupied & ~start_bit) | end_bit
+        if PIECE_TYPES[moving_index % len(PIECE_TYPES)] == PieceType.KING:
+            if moving_index < len(PIECE_TYPES):
+                self.white_king_position = end_pos
+            else:
+                self.black_king_position = end_pos
+
+    def revert_move(
+        self,
+        start_pos: Position,
+        end_pos: Position,
+        piece: Piece,
+        prev_piece: Optional[Piece],
+    ) -> None:
+        self._put(square_index(start_pos), piece)
+        self._put(square_index(end_pos), prev_piece)
+        if piece.type == PieceType.KING:
+            if piece.color == Color.WHITE:
+                self.white_king_position = start_pos
+            else:
+                self.black_king_position = start_pos
+
+    def promote_pawn(self, promotion_piece: Piece, position: Position) -> None:
+        self._put(square_index(position), promotion_piece)
+
+    def change_turn(self) -> None:
+        self.turn = Color.WHITE if self.turn == Color.BLACK else Color.BLACK
+        self.zobrist_key ^= BLACK_TO_MOVE_KEY
+
+    def set_castling_rights(self, castling_rights: int) -> None:
+        self.zobrist_key ^= castling_key(self.castling_rights) ^ castling_key(castling_rights)
+        self.castling_rights = castling_rights
+
+    def set_en_passant(self, en_passant: Optional[Position]) -> None:
+        self.zobrist_key ^= en_passant_key(self.en_passant) ^ en_passant_key(en_passant)
+        self.en_passant = en_passant
+
+    def _load_matrix(self, matrix: List[List[Optional[Piece]]]) -> None:
+        for i in range(8):
+            for j in range(8):
+                self._put(square_index((i, j)), matrix[i][j])
+
+    def _clear(self, square: int) -> None:
+        index = self.squares[square]
+        if index != NO_PIECE:
+            bit = 1 << square
+            self.bitboards[index] &= ~bit
+            self.color_occupied[index >= len(PIECE_TYPES)] &= ~bit
+            self.occupied &= ~bit
+            self.squares[square] = NO_PIECE
+            self.zobrist_key ^= PIECE_KEYS[index * 64 + square]
+
+    def _put(self, square: int, piece: Optional[Piece]) -> None:
+        self._clear(square)
+        if piece is None:
+            return
+        index = BitboardChessBoard.bitboard_index(piece.type, piece.color)
+        bit = 1 << square
+        self.bitboards[index] |= bit
+        self.color_occupied[index >= len(PIECE_TYPES)] |= bit
+        self.occupied |= bit
+        self.squares[square] = index
+        self.zobrist_key ^= PIECE_KEYS[index * 64 + square]
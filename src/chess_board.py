@@ -1,17 +1,44 @@
-from typing import Tuple, List, Optional
+from typing import Dict, Tuple, List, Optional
 
-from enums import Color
 from src.abs_chess_board import AbsChessBoard
-from src.enums import PieceType
+from src.attack_tables import (
+    DIRECTION_RAYS,
+    DIRECTIONS_BETWEEN,
+    KING_ATTACK_MASKS,
+    KING_TARGETS,
+    KNIGHT_ATTACK_MASKS,
+    PAWN_ATTACK_MASKS,
+    QUEEN_DIRECTIONS,
+    SLIDER_RAYS,
+)
+from src.bitboard import iter_squares, square_index
+from src.enums import PieceType, Color
 from src.piece import Piece
+from src.zobrist import castling_key, en_passant_key, square_key, turn_key
 from src.data_types import Position, GameState
 
 
 class ChessBoard(AbsChessBoard):
+    """
+    Matrix-backed chess board.
 
+    Besides the 8x8 matrix the board keeps incremental attack maps: ``attack_maps[color][square]`` is a bitmask of
+    the squares holding ``color`` pieces that attack ``square``, and ``attacks_from[square]`` is the bitmask of
+    squares attacked by the piece standing on ``square``. Every board mutation goes through ``_set_squares``,
+    which only recomputes the changed squares and the sliders whose rays pass through them.
+
+    ``zobrist_key`` identifies the position (pieces, side to move, castling rights and en passant square) and is
+    updated the same way.
+    """
+
+    attacks_from: List[int]
+    attack_maps: Dict[Color, List[int]]
+    zobrist_key: int
+    castling_rights: int
+    en_passant: Optional[Position]
 
     def promote_pawn(self, promotion_piece: Piece, position: Position) -> None:
-        self.board[position[0]][position[1]] = promotion_piece
+        self._set_squares(((position, promotion_piece),))
 
     def revert_move(
         self,
@@ -20,32 +47,234 @@ class ChessBoard(AbsChessBoard):
         piece: Piece,
         prev_piece: Piece,
     ) -> None:
-        self.board[start_pos[0]][start_pos[1]] = piece
-        self.board[end_pos[0]][end_pos[1]] = prev_piece
+        self._set_squares(((start_pos, piece), (end_pos, prev_piece)))
+        if piece.type == PieceType.KING:
+            if piece.color == Color.WHITE:
+                self.white_king_position = start_pos
+            else:
+                self.black_king_position = start_pos
 
     def move(self, start_pos: Position, end_pos: Position) -> None:
         piece = self.board[start_pos[0]][start_pos[1]]
         if piece is None:
             raise ValueError(f"'{piece}' is not a valid starting position")
         elif piece.type == PieceType.KING:
-            self.black_king_position: Position = end_pos if piece.color == Color.BLACK else self.black_king_position
-            self.white_king_position: Position = end_pos if piece.color == Color.WHITE else self.white_king_position
-        self.board[end_pos[0]][end_pos[1]] = self.board[start_pos[0]][start_pos[1]]
-        self.board[start_pos[0]][start_pos[1]] = None
+            self.black_king_position = end_pos if piece.color == Color.BLACK else self.black_king_position
+            self.white_king_position = end_pos if piece.color == Color.WHITE else self.white_king_position
+        self._set_squares(((start_pos, None), (end_pos, piece)))
 
     def get_piece(self, start_pos: Position) -> Piece:
         return self.board[start_pos[0]][start_pos[1]]
 
+    def set_piece(self, pos: Position, piece: Optional[Piece]) -> None:
+        self._set_squares(((pos, piece),))
+        if piece is not None and piece.type == PieceType.KING:
+            if piece.color == Color.WHITE:
+                self.white_king_position = pos
+            else:
+                self.black_king_position = pos
+
+    def set_castling_rights(self, castling_rights: int) -> None:
+        self.zobrist_key ^= castling_key(self.castling_rights) ^ castling_key(castling_rights)
+        self.castling_rights = castling_rights
+
+    def set_en_passant(self, en_passant: Optional[Position]) -> None:
+        self.zobrist_key ^= en_passant_key(self.en_passant) ^ en_passant_key(en_passant)
+        self.en_passant = en_passant
+
     def change_turn(self) -> None:
+        previous_turn = self.turn
         self.turn: Color = Color.WHITE if self.turn == Color.BLACK else Color.BLACK
+        self.zobrist_key ^= turn_key(previous_turn) ^ turn_key(self.turn)
+
+    def attackers_of(self, pos: Position, by_color: Color) -> int:
+        """Bitmask of the squares holding by_color pieces that attack pos."""
+        index: int = pos[0] * 8 + pos[1]
+        return self.attack_maps[by_color][index]
+
+    def is_square_attacked(self, pos: Position, by_color: Color) -> bool:
+        index: int = pos[0] * 8 + pos[1]
+        return self.attack_maps[by_color][index] != 0
+
+    def is_in_check(self, color: Color) -> bool:
+        king_position = self.white_king_position if color == Color.WHITE else self.black_king_position
+        if king_position is None:
+            return False
+        return self.is_square_attacked(king_position, Color.BLACK if color == Color.WHITE else Color.WHITE)
+
+    def pinned_pieces(self, color: Color) -> int:
+        """Bitmask of color's pieces that are pinned to their king."""
+        king_position = self.white_king_position if color == Color.WHITE else self.black_king_position
+        if king_position is None:
+            return 0
+        enemy_map = self.attack_maps[Color.BLACK if color == Color.WHITE else Color.WHITE]
+        king_index = square_index(king_position)
+        pinned = 0
+        for direction in QUEEN_DIRECTIONS:
+            for row, column in DIRECTION_RAYS[direction][king_index]:
+                piece = self.board[row][column]
+                if piece is None:
+                    continue
+                if piece.color == color:
+                    index = row * 8 + column
+                    # An enemy slider attacking this piece from the far side of the line pins it
+                    for attacker in iter_squares(enemy_map[index]):
+                        if DIRECTIONS_BETWEEN[index][attacker] == direction and self._slides_along(attacker, direction):
+                            pinned |= 1 << index
+                            break
+                break
+        return pinned
+
+    def escape_squares(self, color: Color) -> List[Position]:
+        """Squares the king of color can step to without being attacked."""
+        king_position = self.white_king_position if color == Color.WHITE else self.black_king_position
+        if king_position is None:
+            return []
+        enemy_map = self.attack_maps[Color.BLACK if color == Color.WHITE else Color.WHITE]
+        king_index = square_index(king_position)
+        # Squares behind the king on a checking slider's line are attacked once the king steps off it
+        x_rayed = 0
+        for checker in iter_squares(enemy_map[king_index]):
+            direction = DIRECTIONS_BETWEEN[checker][king_index]
+            if direction is not None and self._slides_along(checker, direction):
+                behind = (king_position[0] + direction[0], king_position[1] + direction[1])
+                if 0 <= behind[0] <= 7 and 0 <= behind[1] <= 7:
+                    x_rayed |= 1 << square_index(behind)
+        escapes = []
+        for target in KING_TARGETS[king_index]:
+            index = square_index(target)
+            occupant = self.board[target[0]][target[1]]
+            if occupant is not None and occupant.color == color:
+                continue
+            if enemy_map[index] == 0 and not x_rayed & (1 << index):
+                escapes.append(target)
+        return escapes
+
+    def _slides_along(self, index: int, direction: Tuple[int, int]) -> bool:
+        piece = self.board[index // 8][index % 8]
+        if piece is None or piece.type == PieceType.QUEEN:
+            return piece is not None
+        if piece.type == PieceType.ROOK:
+            return direction[0] == 0 or direction[1] == 0
+        return piece.type == PieceType.BISHOP and direction[0] != 0 and direction[1] != 0
+
+    def _set_squares(self, changes: Tuple[Tuple[Position, Optional[Piece]], ...]) -> None:
+        """Write pieces to squares and update the attack maps of every piece whose attacks changed."""
+        maps = self.attack_maps
+        white_map, black_map = maps[Color.WHITE], maps[Color.BLACK]
+        changed = 0
+        sliders = 0
+        for pos, _ in changes:
+            index = pos[0] * 8 + pos[1]
+            changed |= 1 << index
+            attackers = white_map[index] | black_map[index]
+            while attackers:
+                low_bit = attackers & -attackers
+                attacker = low_bit.bit_length() - 1
+                if self.board[attacker // 8][attacker % 8].type in SLIDER_RAYS:
+                    sliders |= low_bit
+                attackers ^= low_bit
+        for pos, _ in changes:
+            self._remove_attacks(pos[0] * 8 + pos[1])
+        for pos, piece in changes:
+            index = pos[0] * 8 + pos[1]
+            self.zobrist_key ^= square_key(self.board[pos[0]][pos[1]], index) ^ square_key(piece, index)
+            self.board[pos[0]][pos[1]] = piece
+        for pos, _ in changes:
+            self._add_attacks(pos[0] * 8 + pos[1])
+        # Sliders that saw a changed square keep their square but their rays may now stop earlier or later
+        for index in iter_squares(sliders & ~changed):
+            self._refresh_attacks(index)
+
+    def _attacks_of(self, index: int, piece: Piece) -> int:
+        attacked: int
+        if piece.type == PieceType.PAWN:
+            attacked = PAWN_ATTACK_MASKS[piece.color][index]
+            return attacked
+        if piece.type == PieceType.KNIGHT:
+            attacked = KNIGHT_ATTACK_MASKS[index]
+            return attacked
+        if piece.type == PieceType.KING:
+            attacked = KING_ATTACK_MASKS[index]
+            return attacked
+        attacked = 0
+        for ray in SLIDER_RAYS[piece.type][index]:
+            for row, column in ray:
+                attacked |= 1 << (row * 8 + column)
+                if self.board[row][column] is not None:
+                    break
+        return attacked
+
+    def _add_attacks(self, index: int) -> None:
+        piece = self.board[index // 8][index % 8]
+        if piece is None:
+            return
+        attacked = self._attacks_of(index, piece)
+        self.attacks_from[index] = attacked
+        color_map = self.attack_maps[piece.color]
+        bit = 1 << index
+        while attacked:
+            low_bit = attacked & -attacked
+            color_map[low_bit.bit_length() - 1] |= bit
+            attacked ^= low_bit
+
+    def _remove_attacks(self, index: int) -> None:
+        attacked = self.attacks_from[index]
+        if not attacked:
+            return
+        piece = self.board[index // 8][index % 8]
+        assert piece is not None
+        color_map = self.attack_maps[piece.color]
+        mask = ~(1 << index)
+        while attacked:
+            low_bit = attacked & -attacked
+            color_map[low_bit.bit_length() - 1] &= mask
+            attacked ^= low_bit
+        self.attacks_from[index] = 0
+
+    def _refresh_attacks(self, index: int) -> None:
+        piece = self.board[index // 8][index % 8]
+        assert piece is not None
+        old_attacked = self.attacks_from[index]
+        new_attacked = self._attacks_of(index, piece)
+        self.attacks_from[index] = new_attacked
+        color_map = self.attack_maps[piece.color]
+        bit = 1 << index
+        difference = old_attacked ^ new_attacked
+        while difference:
+            low_bit = difference & -difference
+            if new_attacked & low_bit:
+                color_map[low_bit.bit_length() - 1] |= bit
+            else:
+                color_map[low_bit.bit_length() - 1] &= ~bit
+            difference ^= low_bit
+
+    def _compute_zobrist_key(self) -> int:
+        key: int = turn_key(self.turn) ^ castling_key(self.castling_rights) ^ en_passant_key(self.en_passant)
+        if self.board is None:
+            return key
+        for index in range(64):
+            key ^= square_key(self.board[index // 8][index % 8], index)
+        return key
+
+    def _rebuild_attack_maps(self) -> None:
+        self.attacks_from = [0] * 64
+        self.attack_maps = {Color.WHITE: [0] * 64, Color.BLACK: [0] * 64}
+        if self.board is None:
+            return
+        for index in range(64):
+            self._add_attacks(index)
 
     def __init__(
         self,
         turn: Optional[Color] = None,
         board: Optional[List[List[Optional[Piece]]]] = None,
         game_state: Optional[GameState] = None,
+        moved: int = 0,
     ) -> None:
         super().__init__()
+        self.attacks_from = []
+        self.attack_maps = {}
         if board is None:
             if turn is not None:
                 self.board, self.white_king_position, self.black_king_position = ChessBoard.default_board()
@@ -59,8 +288,16 @@ class ChessBoard(AbsChessBoard):
             self.turn = Color.from_string(game_state.turn.upper())
             self.is_white_checked = game_state.is_white_checked
             self.is_black_checked = game_state.is_black_checked
-
-
+            self.en_passant = game_state.en_passant
+            self.moved = moved
+        if self.board is not None:
+            self.castling_rights = self.initial_castling_rights()
+        self._rebuild_attack_maps()
+        self.zobrist_key = self._compute_zobrist_key()
+        if game_state is not None:
+            self.start_history(game_state.halfmove_clock, game_state.fullmove_number)
+        else:
+            self.start_history()
 
     @staticmethod
     def default_board() -> Tuple[List[List[Optional[Piece]]], Position, Position]:
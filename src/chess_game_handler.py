@@ -1,113 +1,535 @@
+import asyncio
+import hmac
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple, Type, Union
 
 from starlette.websockets import WebSocket
 
+from src.abs_chess_board import AbsChessBoard
+from src.analysis_executor import AnalysisExecutor, PositionAnalysis
+from src.bitboard import square_index
+from src.bitboard_chess_board import BitboardChessBoard
 from src.chess_board import ChessBoard
+from src.clock import GameClock, TimeControl
 from src.decoders import Decoder
 from src.encoders import Encoder
-from src.enums import MessageType, Color, MessageKeys
-from src.data_types import MessageDict, MoveDict, Position, Cookie, Message, \
-    MoveMessage
+from src.enums import MessageType, Color, WireFormat, ExecutorMode, GameResult
+from src.data_types import (
+    LegalMoveMap,
+    MoveDict,
+    Position,
+    CookieMessage,
+    Message,
+    MoveMessage,
+    BoardMove,
+    Undo,
+    InboundMessage,
+    RestartMessage,
+    ResyncMessage,
+    ProfileMessage,
+)
+from src.fen import board_from_fen, board_to_fen
+from src.game_archive import GameArchiveWriter
+from src.game_hub import BROADCAST_MESSAGE_TYPES, GameHub
+from src.game_store import GameStore, replay_game
+from src.message_parser import MessageParser
+from src.metrics import BOOK_PROBES, MESSAGES_SENT, MOVES, STAGE_SECONDS
+from src.move_generator import PROMOTION_TYPES
 from src.move_verifier import MoveVerifier
+from src.opening_book import BookEntry, OpeningBook
+from src.profiler import SamplingProfiler
+from src.timer_wheel import Timer, TimerWheel
+
+# Most of its time left the engine spends on one move in a timed game
+ENGINE_CLOCK_SHARE = 0.05
+# Seconds to wait for the client to acknowledge the end of a game before starting the next one anyway
+ACKNOWLEDGEMENT_TIMEOUT = 60.0
 
 
 class ChessGameHandler:
-    def __init__(self, websocket: WebSocket) -> None:
+    # Methods a SamplingProfiler attributes samples from; between them they cover all the work done for a game
+    PROFILED_ENTRY_POINTS = ("handle_message", "is_checkmate", "handle_checkmate", "initialize_game")
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        use_bitboard: bool = False,
+        game_store: Optional[GameStore] = None,
+        engine_time_budget: float = 1.0,
+        analysis_executor: Optional[AnalysisExecutor] = None,
+        profiler: Optional[SamplingProfiler] = None,
+        admin_token: Optional[str] = None,
+        opening_book: Optional[OpeningBook] = None,
+        game_archive: Optional[GameArchiveWriter] = None,
+        game_hub: Optional[GameHub] = None,
+        timer_wheel: Optional[TimerWheel] = None,
+        time_control: Optional[TimeControl] = None,
+    ) -> None:
         self.websocket = websocket
-        self.game_board: Optional[ChessBoard] = None
+        # Validation, check/mate detection and engine search go through the executor to keep the event loop free
+        self.analysis_executor = analysis_executor or AnalysisExecutor(ExecutorMode.INLINE)
+        self.game_store = game_store
+        self.game_id: Optional[str] = None
+        self.board_class: Type[AbsChessBoard] = BitboardChessBoard if use_bitboard else ChessBoard
+        self.game_board: Optional[AbsChessBoard] = None
         self.move_verifier: MoveVerifier = MoveVerifier(self.game_board)
+        self.wire_format: WireFormat = WireFormat.JSON
+        # Send only changed squares after a move; the client asks for a snapshot with RESYNC on a sequence gap
+        self.delta_updates: bool = False
+        # Send JSON snapshots with the position as a FEN string instead of the game dict
+        self.fen_snapshots: bool = False
+        self.sequence: int = 0
+        # Attach the legal moves of the side to move to state messages, so the client can reject illegal drags
+        self.send_legal_moves: bool = False
+        # Legal moves of the current position once computed, None until then
+        self.legal_moves: Optional[LegalMoveMap] = None
+        # Color the built-in engine plays, None when both sides are human
+        self.engine_color: Optional[Color] = None
+        self.engine_time_budget = engine_time_budget
+        # Positions whose legal moves, check flag and replies are known without generating any moves
+        self.opening_book = opening_book
+        # Finished games are appended here; the initial FEN is only kept when there is an archive
+        self.game_archive = game_archive
+        self.initial_fen: Optional[str] = None
+        self.game_archived = False
+        # Spectators of the game get its positions through the hub
+        self.game_hub = game_hub
+        # Games are untimed without a time control; the wheel, shared by the worker's games, calls flag falls
+        self.time_control = time_control
+        self.timer_wheel = timer_wheel
+        self.flag_timer: Optional[Timer] = None
+        self.flag_task: Optional[asyncio.Task[None]] = None
+        # Held while a message is handled, so that a flag fall is only looked at between moves
+        self.move_lock = asyncio.Lock()
+        # Set once the game ended on time; moves are refused until the client restarts
+        self.game_result: Optional[GameResult] = None
+        self.profiler = profiler
+        # PROFILE messages are ignored unless the server has an admin token and the message carries it
+        self.admin_token = admin_token
+        # Executor to go back to when profiling stops
+        self.pooled_executor: Optional[AnalysisExecutor] = None
+
+    def set_board(self, board: AbsChessBoard, initial_fen: Optional[str] = None) -> None:
+        """
+        Replace the current board and bind the move verifier to it. The game started from initial_fen, by default
+        the board's position; the moves since are the board's undo stack. Timed games start the side to move's clock.
+        """
+        self.stop_clock()
+        self.game_board = board
+        self.move_verifier = MoveVerifier(board)
+        self.legal_moves = None
+        self.game_result = None
+        if self.time_control is not None:
+            board.clock = GameClock(self.time_control)
+            board.clock.start(board.turn)
+            self.schedule_flag()
+        if self.game_archive is not None:
+            self.initial_fen = initial_fen or board_to_fen(board)
+            self.game_archived = False
+
+    async def archive_game(self, result: GameResult = GameResult.UNFINISHED) -> None:
+        """Append the current game to the archive, once per game and only if a move was played."""
+        if self.game_archive is None or self.game_archived or self.game_board is None or not self.game_board.undo_stack:
+            return
+        self.game_archived = True
+        moves = [undo.move for undo in self.game_board.undo_stack]
+        game_id = self.game_id or GameStore.new_game_id()
+        await asyncio.to_thread(self.game_archive.append, game_id, self.initial_fen, moves, result)
+
+    def probe_book(self) -> Optional[BookEntry]:
+        """The opening book's entry for the current position, if there is a book and it has the position."""
+        if self.opening_book is None:
+            return None
+        entry = self.opening_book.probe(self.game_board)
+        BOOK_PROBES.inc(1, "miss" if entry is None else "hit")
+        return entry
+
+    async def analyse(self) -> PositionAnalysis:
+        """
+        Check flags and mate for the current position, from the opening book when it has the position, plus the
+        legal moves when the client asked for them.
+        """
+        assert self.game_board is not None
+        entry = self.probe_book()
+        if entry is None:
+            with STAGE_SECONDS.time("mate_check"):
+                return await self.analysis_executor.analyse(self.game_board, self.send_legal_moves)
+        is_white_turn = self.game_board.turn == Color.WHITE
+        return PositionAnalysis(
+            entry.in_check and is_white_turn,
+            entry.in_check and not is_white_turn,
+            entry.is_checkmate,
+            entry.legal_move_map if self.send_legal_moves else None,
+        )
 
-    def is_checkmate(self)-> bool:
-        is_turn_checked: bool = self.game_board.is_white_checked \
-            if self.game_board.turn == Color.WHITE else self.game_board.is_black_checked
+    async def current_legal_moves(self) -> Optional[LegalMoveMap]:
+        """Legal moves of the current position for the client, None if it didn't ask for them."""
+        if self.send_legal_moves and self.legal_moves is None:
+            self.legal_moves = (await self.analyse()).legal_moves
+        return self.legal_moves
+
+    async def is_checkmate(self) -> bool:
+        assert self.game_board is not None
+        is_turn_checked: bool = (
+            self.game_board.is_white_checked
+            if self.game_board.turn == Color.WHITE
+            else self.game_board.is_black_checked
+        )
         if not is_turn_checked:
             return False
 
-        turn_king_position: Position = self.game_board.white_king_position\
-            if self.game_board.turn == Color.WHITE else self.game_board.black_king_position
-        return self.is_mate_preventable(turn_king_position)
-    def is_mate_preventable(self, king_position) -> bool:
-        king = self.game_board.get_piece(king_position)
-        for i in range(8):
-            for j in range(8):
-                cur_piece = self.game_board.get_piece((i,j))
-                if cur_piece is None or cur_piece.color != king.color:
-                    continue
-                all_valid_ends = self.move_verifier.get_all_valid_ends((i,j))
-                for end in all_valid_ends:
-                    if not self.move_verifier.would_leave_in_check(cur_piece, (i,j), end):
-                        return True
-        return False
-
-    async def initialize_game(self, cookie: Cookie = None) -> None:
-        """Initialize a new game or load from cookie."""
-        board = game_state = None
-        if cookie.game:
-            board, game_state = Decoder.decode_game(cookie.game)
-        self.game_board = ChessBoard(board=board, game_state=game_state, turn=Color.WHITE)
-        msg = Encoder.encode_message(MessageType.NEW_STATE, self.game_board)
-        await self.send_json(msg)
+        analysis = await self.analyse()
+        is_checkmate: bool = analysis.is_checkmate
+        return is_checkmate
+
+    async def initialize_game(self, cookie: Optional[CookieMessage] = None) -> None:
+        """Initialize a new game, or resume the stored game the cookie names, or load the position the cookie holds."""
+        if self.game_store is not None and cookie is not None and cookie.game_id:
+            stored_game = await self.game_store.load_game(cookie.game_id)
+            if stored_game is not None:
+                self.stop_broadcasting()
+                self.game_id = stored_game.game_id
+                self.set_board(replay_game(stored_game, self.board_class), stored_game.initial_fen)
+                await self.send_state(MessageType.NEW_STATE)
+                await self.play_engine_move()
+                return
+
+        if cookie is not None and cookie.fen:
+            try:
+                self.set_board(board_from_fen(cookie.fen, self.board_class))
+            except ValueError:
+                # A cookie the client mangled gets a new game, as does one holding no game
+                self.set_board(self.board_class(turn=Color.WHITE))
+        else:
+            board, game_state, moved = None, None, 0
+            if cookie is not None and cookie.game is not None:
+                board, game_state, moved = Decoder.decode_game(cookie.game)
+            self.set_board(self.board_class(board=board, game_state=game_state, turn=Color.WHITE, moved=moved))
+        await self.store_new_game()
+        await self.send_state(MessageType.NEW_STATE)
+        await self.play_engine_move()
 
     async def restart_game(self) -> None:
         """Start a new game."""
-        self.game_board = ChessBoard(turn=Color.WHITE)
-        await self.send_json(Encoder.encode_message(MessageType.RESTART, self.game_board))
+        await self.archive_game()
+        self.set_board(self.board_class(turn=Color.WHITE))
+        await self.store_new_game()
+        await self.send_state(MessageType.RESTART)
+        await self.play_engine_move()
+
+    async def store_new_game(self) -> None:
+        """Store the current board as the start of a new game, which the client resumes by its id."""
+        if self.game_store is None:
+            return
+        self.stop_broadcasting()
+        self.game_id = await self.game_store.create_game(board_to_fen(self.game_board))
+        if self.wire_format == WireFormat.BINARY:
+            # Binary frames have no room for the id, JSON snapshots carry it
+            await self.send(MessageType.GAME_ID, Encoder.encode_message(MessageType.GAME_ID, game_id=self.game_id))
+
+    def schedule_flag(self) -> None:
+        """Have the timer wheel call on_flag_fall when the running clock runs out, replacing the previous timer."""
+        if self.flag_timer is not None:
+            self.flag_timer.cancel()
+            self.flag_timer = None
+        assert self.game_board is not None
+        deadline = None if self.game_board.clock is None else self.game_board.clock.deadline()
+        if self.timer_wheel is not None and deadline is not None:
+            self.flag_timer = self.timer_wheel.call_at(deadline, self.on_flag_fall)
 
-    async def handle_checkmate(self) -> None:
+    def stop_clock(self) -> None:
+        """Stop the game's clock and its timer, at the end of the game or when the client leaves."""
+        if self.flag_timer is not None:
+            self.flag_timer.cancel()
+            self.flag_timer = None
+        if self.game_board is not None and self.game_board.clock is not None:
+            self.game_board.clock.stop()
+
+    def on_flag_fall(self) -> None:
+        """Timer wheel callback; runs on the event loop, so the timeout is handled in a task."""
+        self.flag_timer = None
+        self.flag_task = asyncio.create_task(self.flag_fallen())
+
+    async def flag_fallen(self) -> None:
+        async with self.move_lock:
+            # A move may have come in while the timer was due; its clock press already rescheduled the flag
+            if self.flag_timer is None and not await self.check_flag():
+                self.schedule_flag()
+
+    async def check_flag(self, now: Optional[float] = None) -> bool:
+        """End the game on time if the side to move ran out of it before now. Returns True if the game is over."""
+        if self.game_result is not None:
+            return True
+        assert self.game_board is not None
+        loser = None if self.game_board.clock is None else self.game_board.clock.flagged(now)
+        if loser is None:
+            return False
+        await self.handle_timeout(loser)
+        return True
+
+    async def handle_timeout(self, loser: Color) -> None:
+        """Handle flag fall: the game is lost on time, and the client starts the next one with RESTART."""
+        self.stop_clock()
+        self.game_result = GameResult.BLACK_WINS if loser == Color.WHITE else GameResult.WHITE_WINS
+        await self.send_update(MessageType.TIMEOUT)
+        await self.archive_game(self.game_result)
+
+    async def handle_checkmate(self, changed_squares: Iterable[Position] = ()) -> None:
         """Handle checkmate scenario."""
-        await self.send_json(Encoder.encode_message(MessageType.CHECKMATE, self.game_board))
+        assert self.game_board is not None
+        self.stop_clock()
+        await self.send_update(MessageType.CHECKMATE, changed_squares)
+        await self.archive_game(GameResult.BLACK_WINS if self.game_board.turn == Color.WHITE else GameResult.WHITE_WINS)
+
+        await self.wait_for_acknowledgement()
+
+        # Restart game
+        await self.restart_game()
+
+    async def wait_for_acknowledgement(self) -> None:
+        """Wait for the user to acknowledge the end of the game, for at most ACKNOWLEDGEMENT_TIMEOUT seconds."""
+        try:
+            async with asyncio.timeout(ACKNOWLEDGEMENT_TIMEOUT):
+                await self.websocket.receive_json()
+        except TimeoutError:
+            pass
+
+    def draw_type(self) -> Optional[MessageType]:
+        """The draw the current position ends the game in, if any; both are looked up without scanning the history."""
+        assert self.game_board is not None
+        if self.game_board.is_threefold_repetition():
+            return MessageType.REPETITION_DRAW
+        if self.game_board.is_fifty_move_draw():
+            return MessageType.FIFTY_MOVE_DRAW
+        return None
+
+    async def handle_draw(self, message_type: MessageType, changed_squares: Iterable[Position] = ()) -> None:
+        """Handle a draw by threefold repetition or the fifty-move rule, like checkmate."""
+        self.stop_clock()
+        await self.send_update(message_type, changed_squares)
+        await self.archive_game(GameResult.DRAW)
 
-        # Wait for user acknowledgment
-        await self.websocket.receive_json()
+        await self.wait_for_acknowledgement()
 
         # Restart game
         await self.restart_game()
 
-    async def handle_message(self, message: MessageDict) -> None:
-        if message["message_type"] == str(MessageType.RESTART):
+    async def handle_message(self, message: InboundMessage) -> None:
+        async with self.move_lock:
+            await self.dispatch_message(message)
+
+    async def dispatch_message(self, message: InboundMessage) -> None:
+        if isinstance(message, MoveMessage):
+            await self.handle_move(message)
+        elif isinstance(message, RestartMessage):
             await self.restart_game()
-        elif message["message_type"] == str(MessageType.MOVE):
-            await self.handle_move(MoveMessage.model_validate(message))
+        elif isinstance(message, ResyncMessage):
+            await self.send_state(MessageType.NEW_STATE)
+        elif isinstance(message, ProfileMessage):
+            await self.handle_profile(message)
+
+    async def handle_profile(self, message: ProfileMessage) -> None:
+        """Switch profiling of this game on or off if the message carries the admin token."""
+        if self.admin_token is None or not hmac.compare_digest(message.token, self.admin_token):
+            return
+        if message.enabled:
+            self.start_profiling()
+        else:
+            await self.stop_profiling()
+
+    def start_profiling(self) -> None:
+        """
+        Sample this game's message handling and mate checks until stop_profiling. Analysis runs inline meanwhile, so
+        that move validation and mate detection show up in the profile instead of in a pool process.
+        """
+        if self.profiler is None or self.profiler.is_profiling(self):
+            return
+        self.pooled_executor = self.analysis_executor
+        self.analysis_executor = AnalysisExecutor(ExecutorMode.INLINE)
+        self.profiler.start(self)
+
+    async def stop_profiling(self) -> None:
+        """Stop sampling this game and write its profile, off the event loop."""
+        if self.profiler is None or not self.profiler.is_profiling(self):
+            return
+        if self.pooled_executor is not None:
+            self.analysis_executor, self.pooled_executor = self.pooled_executor, None
+        await asyncio.to_thread(self.profiler.stop, self)
 
     async def handle_move(self, data: MoveMessage) -> None:
         """Process a move from the client."""
+        # The mover's clock stops when the move arrives, not once it has been validated
+        received_at = time.monotonic()
+        if self.game_result is not None:
+            await self.send_update(MessageType.FAILED_MOVE)
+            return
+        if await self.check_flag(received_at):
+            return
+        assert self.game_board is not None
         start, end = Decoder.decode_move(data)
 
-        # Handle pawn promotion
-        if not self.move_verifier.is_valid_move(start, end):
-            await self.send_json(Encoder.encode_message(MessageType.FAILED_MOVE, self.game_board))
+        with STAGE_SECONDS.time("validate_move"):
+            is_valid = self.game_board.turn != self.engine_color and await self.is_valid_move(start, end)
+        if not is_valid:
+            await self.send_update(MessageType.FAILED_MOVE)
             return
 
+        # Handle pawn promotion
+
         elif self.move_verifier.is_final_rank_pawn(start, end):
-            await self.handle_pawn_promotion(start, end)
+            # The mover's clock runs on until the promotion piece is chosen
+            promotion = await self.handle_pawn_promotion(start, end)
+            if promotion is None:
+                return
+            undo, received_at = promotion
 
         else:
-            self.game_board.move(start, end)
-            self.game_board.get_piece(end).has_moved = True
-            if self.move_verifier.is_king_checked(Color.WHITE):
-                self.game_board.is_white_checked = True
-            if self.move_verifier.is_king_checked(Color.BLACK):
-                self.game_board.is_black_checked = True
+            undo = self.game_board.make_move(BoardMove(start, end))
+
+        MOVES.inc(1, "human")
+        if await self.complete_move(undo, received_at):
+            await self.play_engine_move()
 
+    async def is_valid_move(self, start: Position, end: Position) -> bool:
+        if self.legal_moves is not None:
+            return bool(self.legal_moves.get(square_index(start), 0) >> square_index(end) & 1)
+        entry = self.probe_book()
+        is_valid: bool = (
+            entry.has_move(start, end)
+            if entry is not None
+            else await self.analysis_executor.is_valid_move(self.game_board, start, end)
+        )
+        return is_valid
+
+    async def complete_move(self, undo: Undo, moved_at: Optional[float] = None) -> bool:
+        """Store and announce a move just played on the board at moved_at. Returns False if it ended the game."""
+        assert self.game_board is not None
+        self.legal_moves = None
+        if self.game_board.clock is not None:
+            self.game_board.clock.press(moved_at)
+            self.schedule_flag()
+        if self.game_store is not None:
+            await self.game_store.append_move(self.game_id, undo.move)
 
         # Update board state
-        if self.game_board.is_checkmate():
-            await self.handle_checkmate()
+        analysis = await self.analyse()
+        self.game_board.is_white_checked = analysis.is_white_checked
+        self.game_board.is_black_checked = analysis.is_black_checked
+        self.legal_moves = analysis.legal_moves
+        changed_squares = self.game_board.changed_squares(undo)
+        if analysis.is_checkmate:
+            await self.handle_checkmate(changed_squares)
+            return False
+        draw_type = self.draw_type()
+        if draw_type is not None:
+            await self.handle_draw(draw_type, changed_squares)
+            return False
+        await self.send_update(MessageType.NEW_STATE, changed_squares)
+        return True
+
+    async def play_engine_move(self) -> None:
+        """Play the engine's reply if it is the engine's turn."""
+        assert self.game_board is not None
+        if self.engine_color is None or self.game_board.turn != self.engine_color:
+            return
+        entry = self.probe_book()
+        if entry is not None and entry.reply_count:
+            # The most played reply
+            move: Optional[BoardMove] = entry.replies[0]
         else:
-            self.game_board.change_turn()
-            await self.send_json(Encoder.encode_message(MessageType.NEW_STATE, self.game_board))
+            time_budget = self.engine_time_budget
+            if self.game_board.clock is not None:
+                time_budget = min(time_budget, self.game_board.clock.time_left(self.engine_color) * ENGINE_CLOCK_SHARE)
+            with STAGE_SECONDS.time("engine_search"):
+                move = (await self.analysis_executor.search(self.game_board, time_budget)).move
+        if move is None or await self.check_flag():
+            return
+        MOVES.inc(1, "engine")
+        await self.complete_move(self.game_board.make_move(move))
 
-    async def handle_pawn_promotion(self, start: Position, end: Position) -> None:
-        """Handle pawn promotion scenario."""
-        await self.send_json(Encoder.encode_message(MessageType.PROMOTION, self.game_board))
+    async def handle_pawn_promotion(self, start: Position, end: Position) -> Optional[Tuple[Undo, float]]:
+        """
+        Handle pawn promotion scenario. Returns the move and the time the piece was chosen at, or None if the mover's
+        flag fell while choosing.
+        """
+        assert self.game_board is not None
+        await self.send_update(MessageType.PROMOTION)
+        deadline = None if self.game_board.clock is None else self.game_board.clock.deadline()
 
-        # Wait for user selection
-        message = await self.websocket.receive_json()
-        promotion_piece = Decoder.decode_piece(message[MessageKeys.PIECE])
-        self.game_board.move(start, end)
-        self.game_board.promote_pawn(promotion_piece, end)
+        # Wait for user selection, ignoring anything that isn't a piece the pawn can promote to
+        try:
+            async with asyncio.timeout(None if deadline is None else max(deadline - time.monotonic(), 0.0)):
+                while True:
+                    try:
+                        message = MessageParser.parse_promotion(await self.websocket.receive_text())
+                        promotion_piece = Decoder.decode_piece(message.piece)
+                    except ValueError:
+                        continue
+                    if promotion_piece.type in PROMOTION_TYPES:
+                        break
+        except TimeoutError:
+            # The loop may wake a hair before the deadline, so don't ask the clock whether the flag fell
+            await self.handle_timeout(self.game_board.turn)
+            return None
+        chosen_at = time.monotonic()
+        if await self.check_flag(chosen_at):
+            return None
+        return self.game_board.make_move(BoardMove(start, end, promotion_piece.type)), chosen_at
 
     async def send_json(self, data: Dict[Any, Any]) -> None:
         """Send JSON data to the client."""
         await self.websocket.send_json(data)
+
+    async def send(self, message_type: MessageType, payload: Union[bytes, Dict[Any, Any]]) -> None:
+        """Send an encoded binary frame or JSON message and count it."""
+        if isinstance(payload, bytes):
+            await self.websocket.send_bytes(payload)
+        else:
+            await self.send_json(payload)
+        MESSAGES_SENT.inc(1, str(message_type))
+
+    def broadcast(self, message_type: MessageType) -> None:
+        """Publish the current position to the game's spectators, if the update is one they see."""
+        if self.game_hub is not None and self.game_id is not None and message_type in BROADCAST_MESSAGE_TYPES:
+            self.game_hub.publish(self.game_id, message_type, self.game_board, self.sequence)
+
+    def stop_broadcasting(self) -> None:
+        """Leave the current game's final position with its spectators; call before switching games or leaving."""
+        if self.game_hub is not None and self.game_id is not None:
+            self.game_hub.end_game(self.game_id)
+
+    async def send_state(self, message_type: MessageType) -> None:
+        """Send a full snapshot of the board in the wire format negotiated at startup."""
+        legal_moves = await self.current_legal_moves()
+        self.sequence += 1
+        with STAGE_SECONDS.time("encode_message"):
+            if self.wire_format == WireFormat.BINARY:
+                payload = Encoder.encode_binary_message(message_type, self.game_board, self.sequence, legal_moves)
+            else:
+                payload = Encoder.encode_message(
+                    message_type, self.game_board, self.sequence, self.game_id, legal_moves, self.fen_snapshots
+                )
+        self.broadcast(message_type)
+        await self.send(message_type, payload)
+
+    async def send_update(self, message_type: MessageType, changed_squares: Iterable[Position] = ()) -> None:
+        """Send the squares changed since the last message, or a full snapshot if the client didn't opt in."""
+        if not self.delta_updates:
+            await self.send_state(message_type)
+            return
+        legal_moves = await self.current_legal_moves()
+        self.sequence += 1
+        self.broadcast(message_type)
+        if message_type == MessageType.NEW_STATE:
+            message_type = MessageType.DELTA
+        with STAGE_SECONDS.time("encode_message"):
+            if self.wire_format == WireFormat.BINARY:
+                payload = Encoder.encode_binary_delta(
+                    message_type, self.game_board, changed_squares, self.sequence, legal_moves
+                )
+            else:
+                payload = Encoder.encode_delta(
+                    message_type, self.game_board, changed_squares, self.sequence, legal_moves
+                )
+        await self.send(message_type, payload)
@@ -0,0 +1,91 @@
+"""
+Chess clocks. A time control gives each side an initial number of seconds plus a per-move bonus, either added
+after each move (increment) or spent before the clock starts running on each move (delay), written as in
+"300+2" or "300d5". Times come from time.monotonic(); pass now to get consistent readings across several calls.
+"""
+
+import re
+import time
+from typing import Dict, NamedTuple, Optional
+
+from src.enums import ClockMode, Color
+
+TIME_CONTROL_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)(?:([+d])(\d+(?:\.\d+)?))?$")
+CLOCK_MODE_SEPARATORS = {"+": ClockMode.INCREMENT, "d": ClockMode.DELAY}
+
+
+class TimeControl(NamedTuple):
+    # Seconds each side starts with
+    initial: float
+    # Seconds per move, added afterwards or waited out first depending on mode
+    bonus: float = 0.0
+    mode: ClockMode = ClockMode.INCREMENT
+
+    def __str__(self) -> str:
+        separator = "d" if self.mode == ClockMode.DELAY else "+"
+        return f"{self.initial:g}{separator}{self.bonus:g}"
+
+    @classmethod
+    def from_string(cls, text: str) -> "TimeControl":
+        parsed = TIME_CONTROL_PATTERN.match(text.strip())
+        if parsed is None or float(parsed.group(1)) <= 0:
+            raise ValueError(f"'{text}' is not a valid time control")
+        initial, separator, bonus = parsed.groups()
+        return cls(float(initial), float(bonus or 0), CLOCK_MODE_SEPARATORS[separator or "+"])
+
+
+class GameClock:
+    """Time left for each side, with at most one side's clock running."""
+
+    def __init__(self, time_control: TimeControl) -> None:
+        self.time_control = time_control
+        # Time left at the start of the running side's turn, or now for the other side
+        self.remaining: Dict[Color, float] = {Color.WHITE: time_control.initial, Color.BLACK: time_control.initial}
+        self.running: Optional[Color] = None
+        self.turn_started = 0.0
+
+    def start(self, color: Color, now: Optional[float] = None) -> None:
+        """Start color's clock, for example at the start of a game."""
+        self.running = color
+        self.turn_started = time.monotonic() if now is None else now
+
+    def press(self, now: Optional[float] = None) -> None:
+        """End the running side's turn after its move and start the opponent's clock."""
+        if self.running is None:
+            return
+        now = time.monotonic() if now is None else now
+        self.remaining[self.running] -= self._spent(now)
+        if self.time_control.mode == ClockMode.INCREMENT:
+            self.remaining[self.running] += self.time_control.bonus
+        self.start(Color.BLACK if self.running == Color.WHITE else Color.WHITE, now)
+
+    def stop(self, now: Optional[float] = None) -> None:
+        """Stop the running clock for good, at the end of the game."""
+        if self.running is None:
+            return
+        self.remaining[self.running] -= self._spent(time.monotonic() if now is None else now)
+        self.running = None
+
+    def time_left(self, color: Color, now: Optional[float] = None) -> float:
+        if color != self.running:
+            return max(self.remaining[color], 0.0)
+        return max(self.remaining[color] - self._spent(time.monotonic() if now is None else now), 0.0)
+
+    def deadline(self) -> Optional[float]:
+        """Monotonic time at which the running side's flag falls, None when no clock runs."""
+        if self.running is None:
+            return None
+        delay = self.time_control.bonus if self.time_control.mode == ClockMode.DELAY else 0.0
+        return self.turn_started + delay + self.remaining[self.running]
+
+    def flagged(self, now: Optional[float] = None) -> Optional[Color]:
+        """The running side if it has run out of time."""
+        if self.running is None or self.time_left(self.running, now) > 0:
+            return None
+        return self.running
+
+    def _spent(self, now: float) -> float:
+        elapsed = now - self.turn_started
+        if self.time_control.mode == ClockMode.DELAY:
+            return max(elapsed - self.time_control.bonus, 0.0)
+        return elapsed
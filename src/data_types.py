@@ -1,6 +1,13 @@
-from typing import Tuple, Dict, Union, TypeAlias, List, Self
-from pydantic import BaseModel, Field, validator, ValidationError
-from typing import List, Optional
+import json
+from typing import Tuple, Dict, Union, TypeAlias, List, Self, NamedTuple, TYPE_CHECKING, Annotated, Literal
+from pydantic import BaseModel, Field, validator, ValidationError, field_validator
+from typing import Any, List, Optional
+
+from src.clock import TimeControl
+from src.enums import Color, PieceType, WireFormat
+
+if TYPE_CHECKING:
+    from src.piece import Piece
 
 
 class EncodedPiece(BaseModel):
@@ -8,35 +15,200 @@ class EncodedPiece(BaseModel):
     type: str
     has_moved: bool
 
+
 Position: TypeAlias = Tuple[int, int]
+BoardCoordinate: TypeAlias = Annotated[int, Field(ge=0, le=7)]
 BoardValue: TypeAlias = Union[EncodedPiece, str, Position]
 EncodedBoard: TypeAlias = Dict[str, BoardValue]
 KeyDecodedBoard: TypeAlias = Dict[Position, EncodedPiece]
 CookieBoardDict: TypeAlias = Dict[str, Union[str, EncodedPiece]]
 MoveDict: TypeAlias = Dict[str, List[int]]
 MessageDict: TypeAlias = Dict[str, Union[str, MoveDict, CookieBoardDict]]
+# Legal moves of the side to move: start square index (row * 8 + column) to a bitmask of end square indexes
+LegalMoveMap: TypeAlias = Dict[int, int]
+# The same in JSON: start square index to its end square indexes, ascending
+EncodedLegalMoves: TypeAlias = Dict[str, List[int]]
+
+
+class BoardMove(NamedTuple):
+    start: Position
+    end: Position
+    promotion: Optional[PieceType] = None
+
+
+class Undo(NamedTuple):
+    """Everything make_move changes that unmake_move can't derive from the move itself."""
+
+    move: BoardMove
+    piece: "Piece"
+    # AbsChessBoard.moved before the move
+    moved: int
+    captured: Optional["Piece"]
+    captured_position: Position
+    castling_rights: int
+    en_passant: Optional[Position]
+    is_white_checked: bool
+    is_black_checked: bool
+
+
+class PlyRecord(NamedTuple):
+    """One position in a board's history."""
+
+    zobrist_key: int
+    # Plies since the last capture or pawn move, for the fifty-move rule
+    halfmove_clock: int
+    # Reached by a capture or pawn move, so no earlier position can recur
+    irreversible: bool
+
 
 class Message(BaseModel):
     message_type: str
 
+
 class Move(BaseModel):
-    start_position: Position
-    end_position: Position
+    start_position: Tuple[BoardCoordinate, BoardCoordinate]
+    end_position: Tuple[BoardCoordinate, BoardCoordinate]
+
 
 class MoveMessage(Message):
+    message_type: Literal["move"] = "move"
     move: Move
 
+
+class RestartMessage(Message):
+    message_type: Literal["restart"] = "restart"
+
+
+class PromotionMessage(Message):
+    message_type: Literal["promotion"] = "promotion"
+    piece: EncodedPiece
+
+
+class ResyncMessage(Message):
+    message_type: Literal["resync"] = "resync"
+    # Last sequence number the client applied
+    sequence: int = 0
+
+
+class ProfileMessage(Message):
+    """Admin request to switch the sampling profiler on or off for the sender's game."""
+
+    message_type: Literal["profile"] = "profile"
+    # Must match the server's admin token
+    token: str
+    enabled: bool = True
+
+
+class WatchMessage(Message):
+    """Spectator request to start or stop receiving the snapshots of a game, sent on the watch socket."""
+
+    message_type: Literal["watch"] = "watch"
+    game_id: str
+    enabled: bool = True
+
+
 class GameState(BaseModel):
     white_king_position: Position
     black_king_position: Position
     turn: str
     is_white_checked: bool
     is_black_checked: bool
+    en_passant: Optional[Position] = None
+    # Plies since the last capture or pawn move
+    halfmove_clock: int = 0
+    # Move number, starting at 1 and going up after each black move
+    fullmove_number: int = 1
+    # Seconds left on each side's clock, only in timed games
+    white_time: Optional[float] = None
+    black_time: Optional[float] = None
+
 
 class Game(BaseModel):
     game_state: GameState
     board: EncodedBoard
 
+
 class Cookie(Message):
     message_type: str
-    game: Game
\ No newline at end of file
+    # The position as a board dict, or None for clients that opted in to FEN snapshots
+    game: Optional[Game] = None
+    sequence: Optional[int] = None
+    game_id: Optional[str] = None
+    # The position as a FEN string, in place of the game, for clients that opted in to FEN snapshots
+    fen: Optional[str] = None
+    # Only for clients that opted in; drags not listed here can be rejected without asking the server
+    legal_moves: Optional[EncodedLegalMoves] = None
+
+
+class CookieMessage(Message):
+    """First client message: the stored game (possibly still a JSON string) and the options picked from STARTUP."""
+
+    message_type: str = ""
+    game: Optional[Game] = None
+    # The client-held position as a FEN string, used in place of game when both are sent
+    fen: Optional[str] = None
+    # Server-issued id of a stored game; when set the stored game wins over the client-held one
+    game_id: Optional[str] = None
+    wire_format: WireFormat = WireFormat.JSON
+    delta_updates: bool = False
+    # Get snapshots with the position as "fen" and no "game" dict, about 70 bytes instead of about 2 KB
+    fen_snapshots: bool = False
+    # Attach the legal moves of the side to move to every state message
+    legal_moves: bool = False
+    # Color the built-in engine plays, None for a game between humans
+    engine_color: Optional[Color] = None
+    # Time control such as "300+2" (increment) or "300d5" (delay), None for the server default
+    time_control: Optional[TimeControl] = None
+
+    @field_validator("game", mode="before")
+    @classmethod
+    def load_game(cls, game: Any) -> Any:
+        # Browsers keep the game in a cookie as a JSON string, an empty one when there is no game yet
+        if isinstance(game, (str, bytes)):
+            return json.loads(game) if game else None
+        return game
+
+    @field_validator("wire_format", mode="before")
+    @classmethod
+    def load_wire_format(cls, wire_format: Any) -> Any:
+        return WireFormat.from_string(wire_format) if isinstance(wire_format, str) else wire_format
+
+    @field_validator("engine_color", mode="before")
+    @classmethod
+    def load_engine_color(cls, engine_color: Any) -> Any:
+        return Color.from_string(engine_color.upper()) if isinstance(engine_color, str) and engine_color else None
+
+    @field_validator("time_control", mode="before")
+    @classmethod
+    def load_time_control(cls, time_control: Any) -> Any:
+        return TimeControl.from_string(time_control) if isinstance(time_control, str) and time_control else None
+
+
+InboundMessage: TypeAlias = Annotated[
+    Union[MoveMessage, RestartMessage, PromotionMessage, ResyncMessage, ProfileMessage],
+    Field(discriminator="message_type"),
+]
+
+
+class Delta(Message):
+    """Squares changed since the previous message (None for emptied squares) plus the full game state."""
+
+    sequence: int
+    game_state: GameState
+    changes: Dict[str, Optional[EncodedPiece]]
+    legal_moves: Optional[EncodedLegalMoves] = None
+
+
+class StoredGame(NamedTuple):
+    game_id: str
+    initial_fen: str
+    moves: List[BoardMove]
+
+
+class BinaryHeader(NamedTuple):
+    version: int
+    message_type: int
+    flags: int
+    castling_rights: int
+    en_passant: int
+    sequence: int
@@ -1,8 +1,23 @@
 import json
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from src.enums import PieceType, Color
+from src.bitboard import POSITIONS, square_bit, square_position
+from src.enums import PieceType, Color, CastlingRight, MessageType
+from src.notation import FEN_CASTLING, FEN_PIECE_TYPES, square_name_to_position
 from src.piece import Piece
+from src.wire_format import (
+    BINARY_FRAME_VERSION,
+    DELTA_CHANGE_SIZE,
+    FLAG_BLACK_CHECKED,
+    FLAG_BLACK_TO_MOVE,
+    FLAG_DELTA,
+    FLAG_LEGAL_MOVES,
+    FLAG_WHITE_CHECKED,
+    FRAME_SIZE,
+    HEADER,
+    LEGAL_MOVE_ENTRY,
+    NO_SQUARE,
+)
 from src.data_types import (
     MessageDict,
     EncodedPiece,
@@ -10,21 +25,28 @@ from src.data_types import (
     EncodedBoard,
     GameState,
     KeyDecodedBoard,
-    MoveDict, Game, Move, MoveMessage,
+    MoveDict,
+    Game,
+    Move,
+    MoveMessage,
+    BinaryHeader,
+    BoardMove,
+    LegalMoveMap,
 )
 
 
 class Decoder:
     @staticmethod
     def decode_move(move_message: MoveMessage) -> Tuple[Position, Position]:
-        start: Position =  (move_message.move.start_position[0], move_message.move.start_position[1])
+        start: Position = (move_message.move.start_position[0], move_message.move.start_position[1])
         end: Position = (move_message.move.end_position[0], move_message.move.end_position[1])
         return start, end
 
     @staticmethod
     def decode_game(
         game: Game,
-    ) -> Tuple[List[List[Optional[Piece]]], GameState]:
+    ) -> Tuple[List[List[Optional[Piece]]], GameState, int]:
+        """The piece matrix, the game state and the moved mask (see AbsChessBoard.moved) of an encoded game."""
         encoded_board: EncodedBoard = game.board
         encoded_game_state: GameState = game.game_state
         key_decoded_board: KeyDecodedBoard = {}
@@ -32,7 +54,7 @@ class Decoder:
             position: Position = Decoder.decode_position(key)
             key_decoded_board[position] = value
         fully_decoded_board: List[List[Optional[Piece]]] = Decoder.decode_board(key_decoded_board)
-        return fully_decoded_board, encoded_game_state
+        return fully_decoded_board, encoded_game_state, Decoder.decode_moved(key_decoded_board)
 
     @staticmethod
     def decode_piece(piece_dict: EncodedPiece) -> Piece:
@@ -41,6 +63,14 @@ class Decoder:
             Color.from_string(piece_dict.color.upper()),
         )
 
+    @staticmethod
+    def decode_moved(board_dict: KeyDecodedBoard) -> int:
+        moved = 0
+        for position, piece_dict in board_dict.items():
+            if piece_dict.has_moved:
+                moved |= square_bit(position)
+        return moved
+
     @staticmethod
     def decode_board(
         board_dict: KeyDecodedBoard,
@@ -60,6 +90,179 @@ class Decoder:
         position: Position = (int(position_strs[0]), int(position_strs[1]))
         return position
 
+    @staticmethod
+    def unpack_move(record: int) -> BoardMove:
+        """Inverse of Encoder.pack_move."""
+        promotion = record >> 12 & 0x7
+        return BoardMove(
+            square_position(record & 0x3F),
+            square_position(record >> 6 & 0x3F),
+            PieceType(promotion) if promotion else None,
+        )
+
+    @staticmethod
+    def decode_binary_header(frame: bytes) -> BinaryHeader:
+        if len(frame) < HEADER.size:
+            raise ValueError(f"binary frame has {len(frame)} bytes, expected at least {HEADER.size}")
+        header = BinaryHeader(*HEADER.unpack_from(frame))
+        if header.version != BINARY_FRAME_VERSION:
+            raise ValueError(f"'{header.version}' is not a supported binary frame version")
+        return header
+
+    @staticmethod
+    def decode_square_code(code: int) -> Optional[Piece]:
+        if not code:
+            return None
+        return Piece.from_code(code)
+
+    @staticmethod
+    def decode_binary_game(frame: bytes) -> Tuple[MessageType, List[List[Optional[Piece]]], GameState, int]:
+        """
+        Unpack a snapshot frame produced by Encoder.encode_binary_message.
+
+        The frame has no per-piece moved flags, so the moved mask returned is the one implied by the castling rights.
+        """
+        header = Decoder.decode_binary_header(frame)
+        if header.flags & FLAG_DELTA:
+            raise ValueError("expected a snapshot frame, got a delta frame")
+        if len(frame) < FRAME_SIZE:
+            raise ValueError(f"binary frame has {len(frame)} bytes, expected {FRAME_SIZE}")
+        flags, castling_rights, en_passant = header.flags, header.castling_rights, header.en_passant
+        matrix: List[List[Optional[Piece]]] = [[None for _ in range(8)] for _ in range(8)]
+        king_positions = {}
+        for index, (row, column) in enumerate(POSITIONS):
+            piece = Decoder.decode_square_code((frame[HEADER.size + (index >> 1)] >> (4 * (index & 1))) & 0xF)
+            if piece is None:
+                continue
+            matrix[row][column] = piece
+            if piece.type == PieceType.KING:
+                king_positions[piece.color] = (row, column)
+        moved = Decoder.decode_castling_rights(matrix, castling_rights)
+        game_state = GameState(
+            white_king_position=king_positions[Color.WHITE],
+            black_king_position=king_positions[Color.BLACK],
+            turn=str(Color.BLACK if flags & FLAG_BLACK_TO_MOVE else Color.WHITE),
+            is_white_checked=bool(flags & FLAG_WHITE_CHECKED),
+            is_black_checked=bool(flags & FLAG_BLACK_CHECKED),
+            en_passant=None if en_passant == NO_SQUARE else square_position(en_passant),
+        )
+        return MessageType(header.message_type), matrix, game_state, moved
+
+    @staticmethod
+    def decode_binary_delta(frame: bytes) -> Dict[Position, Optional[Piece]]:
+        """
+        Unpack the changed squares of a delta frame produced by Encoder.encode_binary_delta.
+
+        The turn, check flags, castling rights, en passant square and sequence are in decode_binary_header.
+        """
+        header = Decoder.decode_binary_header(frame)
+        if not header.flags & FLAG_DELTA:
+            raise ValueError("expected a delta frame, got a snapshot frame")
+        start = HEADER.size + 1
+        count = frame[HEADER.size] if len(frame) >= start else 0
+        if len(frame) < start + count * DELTA_CHANGE_SIZE:
+            raise ValueError(f"binary frame has {len(frame)} bytes, expected {start + count * DELTA_CHANGE_SIZE}")
+        changes: Dict[Position, Optional[Piece]] = {}
+        for offset in range(start, start + count * DELTA_CHANGE_SIZE, DELTA_CHANGE_SIZE):
+            changes[square_position(frame[offset])] = Decoder.decode_square_code(frame[offset + 1])
+        return changes
+
+    @staticmethod
+    def decode_binary_legal_moves(frame: bytes) -> Optional[LegalMoveMap]:
+        """The legal moves section of a snapshot or delta frame, None if the frame has none."""
+        header = Decoder.decode_binary_header(frame)
+        if not header.flags & FLAG_LEGAL_MOVES:
+            return None
+        if header.flags & FLAG_DELTA:
+            start = HEADER.size + 1 + frame[HEADER.size] * DELTA_CHANGE_SIZE
+        else:
+            start = FRAME_SIZE
+        entries_start = start + 1
+        entries_end = entries_start + (frame[start] if len(frame) > start else 0) * LEGAL_MOVE_ENTRY.size
+        if len(frame) < max(entries_start, entries_end):
+            raise ValueError(f"binary frame has {len(frame)} bytes, expected {max(entries_start, entries_end)}")
+        return dict(LEGAL_MOVE_ENTRY.iter_unpack(frame[entries_start:entries_end]))
+
+    @staticmethod
+    def decode_castling_rights(matrix: List[List[Optional[Piece]]], castling_rights: int) -> int:
+        """
+        The moved mask (see AbsChessBoard.moved) under which boards built from matrix derive exactly castling_rights.
+        """
+        moved = 0
+        for row in (0, 7):
+            for column in (0, 4, 7):
+                piece = matrix[row][column]
+                if piece is not None and piece.type in (PieceType.KING, PieceType.ROOK):
+                    moved |= square_bit((row, column))
+        for right, row, column in (
+            (CastlingRight.WHITE_KINGSIDE, 0, 7),
+            (CastlingRight.WHITE_QUEENSIDE, 0, 0),
+            (CastlingRight.BLACK_KINGSIDE, 7, 7),
+            (CastlingRight.BLACK_QUEENSIDE, 7, 0),
+        ):
+            if castling_rights & right:
+                moved &= ~(square_bit((row, column)) | square_bit((row, 4)))
+        return moved
+
+    @staticmethod
+    def decode_fen(fen: str) -> Tuple[List[List[Optional[Piece]]], GameState, int]:
+        """
+        The piece matrix, the game state and the moved mask of a FEN string, like decode_game. The check flags are
+        left False; board_from_fen works them out. The move counters default to 0 and 1 when they are missing or,
+        as in EPD, the fields after the fourth hold operations instead.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"'{fen}' is not a valid FEN")
+        placement, turn, castling, en_passant = fields[:4]
+        has_counters = len(fields) > 4 and fields[4].isdigit()
+        halfmove_clock = int(fields[4]) if has_counters else 0
+        fullmove_number = max(int(fields[5]), 1) if has_counters and len(fields) > 5 and fields[5].isdigit() else 1
+        ranks = placement.split("/")
+        if len(ranks) != 8 or turn not in ("w", "b"):
+            raise ValueError(f"'{fen}' is not a valid FEN")
+
+        matrix: List[List[Optional[Piece]]] = [[None for _ in range(8)] for _ in range(8)]
+        king_positions: Dict[Color, Position] = {}
+        for rank_index, rank in enumerate(ranks):
+            row = 7 - rank_index
+            column = 0
+            for char in rank:
+                if char.isdigit():
+                    column += int(char)
+                    continue
+                if char.lower() not in FEN_PIECE_TYPES or column > 7:
+                    raise ValueError(f"'{fen}' is not a valid FEN")
+                color = Color.WHITE if char.isupper() else Color.BLACK
+                piece = Piece(FEN_PIECE_TYPES[char.lower()], color)
+                matrix[row][column] = piece
+                if piece.type == PieceType.KING:
+                    king_positions[color] = (row, column)
+                column += 1
+            if column != 8:
+                raise ValueError(f"'{fen}' is not a valid FEN")
+        if Color.WHITE not in king_positions or Color.BLACK not in king_positions:
+            raise ValueError(f"'{fen}' must have both kings")
+
+        castling_rights = 0
+        for letter in castling if castling != "-" else "":
+            if letter not in FEN_CASTLING:
+                raise ValueError(f"'{fen}' has invalid castling rights")
+            castling_rights |= FEN_CASTLING[letter]
+
+        game_state = GameState(
+            white_king_position=king_positions[Color.WHITE],
+            black_king_position=king_positions[Color.BLACK],
+            turn=str(Color.WHITE if turn == "w" else Color.BLACK),
+            is_white_checked=False,
+            is_black_checked=False,
+            en_passant=None if en_passant == "-" else square_name_to_position(en_passant),
+            halfmove_clock=halfmove_clock,
+            fullmove_number=fullmove_number,
+        )
+        # Boards derive castling rights from which kings and rooks have moved
+        return matrix, game_state, Decoder.decode_castling_rights(matrix, castling_rights)
+
     @staticmethod
     def recursive_json_loads(data):
         """
@@ -97,4 +300,4 @@ class Decoder:
             return {k: Decoder.recursive_json_loads(v) for k, v in loaded_data.items()}
         elif isinstance(loaded_data, list):
             return [Decoder.recursive_json_loads(item) for item in loaded_data]
-        return loaded_data
\ No newline at end of file
+        return loaded_data
@@ -1,39 +1,233 @@
-from typing import Union, Dict
-from src.chess_board import ChessBoard
-from src.enums import MessageType
-from src.data_types import EncodedBoard, EncodedPiece, GameState, Game, Cookie
+import time
+from typing import Iterable, Optional, Union, Dict
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import POSITIONS, square_index
+from src.enums import ClockMode, MessageType, Color, WireFormat
+from src.data_types import (
+    EncodedBoard,
+    EncodedPiece,
+    GameState,
+    Game,
+    Cookie,
+    Delta,
+    Position,
+    BoardMove,
+    LegalMoveMap,
+    EncodedLegalMoves,
+)
+from src.notation import FEN_CASTLING, FEN_PIECE_LETTERS, position_to_square_name
 from src.piece import Piece
+from src.wire_format import (
+    BINARY_FRAME_VERSION,
+    FLAG_BLACK_CHECKED,
+    FLAG_BLACK_TO_MOVE,
+    FLAG_DELTA,
+    FLAG_LEGAL_MOVES,
+    FLAG_WHITE_CHECKED,
+    HEADER,
+    LEGAL_MOVE_ENTRY,
+    NO_SQUARE,
+    PACKED_BOARD_SIZE,
+)
 
 
 class Encoder:
     @staticmethod
-    def encode_piece(piece: Piece) -> EncodedPiece:
-        return EncodedPiece(color=str(piece.color), type=str(piece.type), has_moved=piece.has_moved)
+    def encode_piece(piece: Piece, has_moved: bool = False) -> EncodedPiece:
+        return EncodedPiece(color=str(piece.color), type=str(piece.type), has_moved=has_moved)
 
     @staticmethod
-    def encode_game(chess_board: ChessBoard) -> Game:
-        game_state: GameState = GameState(white_king_position=chess_board.white_king_position,
-                                            black_king_position=chess_board.black_king_position,
-                                            is_white_checked=chess_board.is_white_checked,
-                                            is_black_checked=chess_board.is_black_checked,
-                                            turn=chess_board.turn,)
+    def encode_game_state(chess_board: AbsChessBoard) -> GameState:
+        clock = chess_board.clock
+        now = time.monotonic()
+        return GameState(
+            white_king_position=chess_board.white_king_position,
+            black_king_position=chess_board.black_king_position,
+            is_white_checked=chess_board.is_white_checked,
+            is_black_checked=chess_board.is_black_checked,
+            turn=str(chess_board.turn),
+            en_passant=chess_board.en_passant,
+            halfmove_clock=chess_board.halfmove_clock,
+            fullmove_number=chess_board.fullmove_number,
+            white_time=None if clock is None else round(clock.time_left(Color.WHITE, now), 3),
+            black_time=None if clock is None else round(clock.time_left(Color.BLACK, now), 3),
+        )
+
+    @staticmethod
+    def encode_game(chess_board: AbsChessBoard) -> Game:
+        game_state: GameState = Encoder.encode_game_state(chess_board)
 
         board_dict = {}
         for i in range(8):
             for j in range(8):
-                cur_piece = chess_board.board[i][j]
+                cur_piece = chess_board.get_piece((i, j))
                 if cur_piece is None:
                     continue
                 position_str: str = str((i, j))
-                board_dict[position_str] = Encoder.encode_piece(cur_piece)
+                board_dict[position_str] = Encoder.encode_piece(cur_piece, chess_board.has_moved((i, j)))
         return Game(game_state=game_state, board=board_dict)
 
+    @staticmethod
+    def encode_fen(chess_board: AbsChessBoard) -> str:
+        """FEN of the position."""
+        rows = []
+        for row in range(7, -1, -1):
+            text = ""
+            empty = 0
+            for column in range(8):
+                piece = chess_board.get_piece((row, column))
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = FEN_PIECE_LETTERS[piece.type]
+                text += letter.upper() if piece.color == Color.WHITE else letter
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = "".join(letter for letter, right in FEN_CASTLING.items() if chess_board.castling_rights & right)
+        en_passant = position_to_square_name(chess_board.en_passant) if chess_board.en_passant is not None else "-"
+        turn = "w" if chess_board.turn == Color.WHITE else "b"
+        counters = f"{chess_board.halfmove_clock} {chess_board.fullmove_number}"
+        return f"{'/'.join(rows)} {turn} {castling or '-'} {en_passant} {counters}"
+
     @staticmethod
     def encode_message(
-        message_type: MessageType, chess_board: ChessBoard = None
+        message_type: MessageType,
+        chess_board: AbsChessBoard = None,
+        sequence: Optional[int] = None,
+        game_id: Optional[str] = None,
+        legal_moves: Optional[LegalMoveMap] = None,
+        fen_snapshots: bool = False,
     ) -> Dict[str, Union[str, EncodedBoard]]:
+        """The JSON message; snapshots carry the position as a FEN string instead of a game dict if fen_snapshots."""
         if message_type == MessageType.STARTUP:
-            return {"message_type": str(message_type)}
+            return {
+                "message_type": str(message_type),
+                "wire_formats": [str(wire_format) for wire_format in WireFormat],
+                "delta_updates": True,
+                "fen_snapshots": True,
+                "legal_moves": True,
+                "clock_modes": [str(clock_mode) for clock_mode in ClockMode],
+            }
+        elif message_type == MessageType.GAME_ID:
+            return {"message_type": str(message_type), "game_id": game_id}
         else:
-            game = Encoder.encode_game(chess_board)
-            return Cookie(message_type=str(message_type), game=game).model_dump()
+            cookie: Dict[str, Union[str, EncodedBoard]] = Cookie(
+                message_type=str(message_type),
+                game=None if fen_snapshots else Encoder.encode_game(chess_board),
+                sequence=sequence,
+                game_id=game_id,
+                fen=Encoder.encode_fen(chess_board) if fen_snapshots else None,
+                legal_moves=Encoder.encode_legal_moves(legal_moves) if legal_moves is not None else None,
+            ).model_dump()
+            return cookie
+
+    @staticmethod
+    def encode_delta(
+        message_type: MessageType,
+        chess_board: AbsChessBoard,
+        squares: Iterable[Position],
+        sequence: int,
+        legal_moves: Optional[LegalMoveMap] = None,
+    ) -> Dict[str, Union[str, EncodedBoard]]:
+        """Only the given squares plus the game state, for a client already holding the previous sequence."""
+        changes = {}
+        for position in squares:
+            piece = chess_board.get_piece(position)
+            changes[str(position)] = (
+                Encoder.encode_piece(piece, chess_board.has_moved(position)) if piece is not None else None
+            )
+        delta: Dict[str, Union[str, EncodedBoard]] = Delta(
+            message_type=str(message_type),
+            sequence=sequence,
+            game_state=Encoder.encode_game_state(chess_board),
+            changes=changes,
+            legal_moves=Encoder.encode_legal_moves(legal_moves) if legal_moves is not None else None,
+        ).model_dump()
+        return delta
+
+    @staticmethod
+    def encode_binary_message(
+        message_type: MessageType,
+        chess_board: AbsChessBoard,
+        sequence: int = 0,
+        legal_moves: Optional[LegalMoveMap] = None,
+    ) -> bytes:
+        """Pack the board into the binary snapshot frame described in wire_format."""
+        if legal_moves is None:
+            return Encoder.encode_binary_header(message_type, chess_board, sequence) + Encoder.pack_board(chess_board)
+        header = Encoder.encode_binary_header(message_type, chess_board, sequence, FLAG_LEGAL_MOVES)
+        return header + Encoder.pack_board(chess_board) + Encoder.pack_legal_moves(legal_moves)
+
+    @staticmethod
+    def encode_binary_delta(
+        message_type: MessageType,
+        chess_board: AbsChessBoard,
+        squares: Iterable[Position],
+        sequence: int,
+        legal_moves: Optional[LegalMoveMap] = None,
+    ) -> bytes:
+        """Pack the given squares into the binary delta frame described in wire_format."""
+        changes = bytearray()
+        for position in squares:
+            changes.append(square_index(position))
+            changes.append(Encoder.encode_square_code(chess_board.get_piece(position)))
+        flags = FLAG_DELTA if legal_moves is None else FLAG_DELTA | FLAG_LEGAL_MOVES
+        header = Encoder.encode_binary_header(message_type, chess_board, sequence, flags)
+        frame = header + bytes((len(changes) // 2,)) + bytes(changes)
+        return frame if legal_moves is None else frame + Encoder.pack_legal_moves(legal_moves)
+
+    @staticmethod
+    def encode_legal_moves(legal_moves: LegalMoveMap) -> EncodedLegalMoves:
+        encoded = {}
+        for start, ends in legal_moves.items():
+            indexes = []
+            while ends:
+                lowest = ends & -ends
+                indexes.append(lowest.bit_length() - 1)
+                ends ^= lowest
+            encoded[str(start)] = indexes
+        return encoded
+
+    @staticmethod
+    def pack_legal_moves(legal_moves: LegalMoveMap) -> bytes:
+        """The legal moves section of a binary frame, see wire_format."""
+        entries = b"".join(LEGAL_MOVE_ENTRY.pack(start, ends) for start, ends in legal_moves.items())
+        return bytes((len(legal_moves),)) + entries
+
+    @staticmethod
+    def encode_binary_header(
+        message_type: MessageType, chess_board: AbsChessBoard, sequence: int, flags: int = 0
+    ) -> bytes:
+        if chess_board.turn == Color.BLACK:
+            flags |= FLAG_BLACK_TO_MOVE
+        if chess_board.is_white_checked:
+            flags |= FLAG_WHITE_CHECKED
+        if chess_board.is_black_checked:
+            flags |= FLAG_BLACK_CHECKED
+        en_passant = square_index(chess_board.en_passant) if chess_board.en_passant is not None else NO_SQUARE
+        header: bytes = HEADER.pack(
+            BINARY_FRAME_VERSION, message_type.value, flags, chess_board.castling_rights, en_passant, sequence
+        )
+        return header
+
+    @staticmethod
+    def pack_move(move: BoardMove) -> int:
+        """16-bit move record: start square in bits 0-5, end square in bits 6-11, promotion PieceType in bits 12-14."""
+        promotion = move.promotion.value if move.promotion is not None else 0
+        record: int = square_index(move.start) | square_index(move.end) << 6 | promotion << 12
+        return record
+
+    @staticmethod
+    def encode_square_code(piece: Optional[Piece]) -> int:
+        return 0 if piece is None else piece.code
+
+    @staticmethod
+    def pack_board(chess_board: AbsChessBoard) -> bytes:
+        packed = bytearray(PACKED_BOARD_SIZE)
+        for index, position in enumerate(POSITIONS):
+            packed[index >> 1] |= Encoder.encode_square_code(chess_board.get_piece(position)) << (4 * (index & 1))
+        return bytes(packed)
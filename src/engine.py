@@ -0,0 +1,227 @@
+"""
+Built-in computer opponent: negamax alpha-beta with quiescence search, MVV-LVA and killer move ordering, and
+iterative deepening under a per-move time budget.
+
+Searching is plain CPU-bound Python, so callers on the event loop run Engine.search in a worker thread on a copy of
+the game board (see copy_board) rather than on the board the game handler keeps playing on.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import POSITIONS
+from src.data_types import BoardMove
+from src.enums import Color, PieceType
+from src.fen import board_from_fen, board_to_fen
+from src.move_generator import MoveGenerator
+
+PIECE_VALUES: Dict[PieceType, int] = {
+    PieceType.PAWN: 100,
+    PieceType.KNIGHT: 320,
+    PieceType.BISHOP: 330,
+    PieceType.ROOK: 500,
+    PieceType.QUEEN: 900,
+    PieceType.KING: 0,
+}
+
+# Positional bonus per square from white's side (index row * 8 + column, row 0 is white's back rank); black
+# pieces read the table with the rows mirrored.
+CENTER_BONUS: List[int] = [
+    (3 - int(abs(3.5 - row))) * 5 + (3 - int(abs(3.5 - column))) * 5 for row in range(8) for column in range(8)
+]
+# Pawns gain for advancing, and central pawns more so up to the middle of the board
+PAWN_FILE_BONUS: List[int] = [0, 2, 4, 8, 8, 4, 2, 0]
+PAWN_BONUS: List[int] = [
+    0 if row in (0, 7) else (row - 1) * 6 + PAWN_FILE_BONUS[column] * (min(row, 4) - 1) for row, column in POSITIONS
+]
+KING_BONUS: List[int] = [(10 if row == 0 and column in (1, 2, 6) else 0) - row * 10 for row, column in POSITIONS]
+SQUARE_BONUS: Dict[PieceType, List[int]] = {
+    PieceType.PAWN: PAWN_BONUS,
+    PieceType.KNIGHT: CENTER_BONUS,
+    PieceType.BISHOP: CENTER_BONUS,
+    PieceType.ROOK: [0] * 64,
+    PieceType.QUEEN: [bonus // 2 for bonus in CENTER_BONUS],
+    PieceType.KING: KING_BONUS,
+}
+
+MATE_SCORE = 1_000_000
+# Mates found this many plies from the root still score above any material balance
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+# How many nodes to search between looks at the clock
+TIME_CHECK_INTERVAL = 256
+
+
+class SearchResult(NamedTuple):
+    move: Optional[BoardMove]
+    score: int
+    depth: int
+    nodes: int
+    seconds: float
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def copy_board(board: AbsChessBoard) -> AbsChessBoard:
+    """An independent board in the same position, for searching without touching the game board."""
+    copy = board_from_fen(board_to_fen(board), type(board))
+    copy.is_white_checked = board.is_white_checked
+    copy.is_black_checked = board.is_black_checked
+    return copy
+
+
+def evaluate(board: AbsChessBoard) -> int:
+    """Material and square bonuses, in centipawns from the point of view of the side to move."""
+    score = 0
+    for index, position in enumerate(POSITIONS):
+        piece = board.get_piece(position)
+        if piece is None:
+            continue
+        if piece.color == Color.WHITE:
+            score += PIECE_VALUES[piece.type] + SQUARE_BONUS[piece.type][index]
+        else:
+            score -= PIECE_VALUES[piece.type] + SQUARE_BONUS[piece.type][index ^ 56]
+    return score if board.turn == Color.WHITE else -score
+
+
+class Engine:
+    def __init__(self, time_budget: float = 1.0, max_depth: int = MAX_DEPTH) -> None:
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.deadline = 0.0
+        self.killers: List[List[Optional[BoardMove]]] = []
+        # Best (move, score) of the root iteration in progress
+        self.root_best: Optional[Tuple[BoardMove, int]] = None
+
+    def search(self, board: AbsChessBoard) -> SearchResult:
+        """
+        Best move for the side to move, deepening one ply at a time until the time budget runs out.
+
+        The board is searched in place and left as it was; the move is None when there is no legal move. If even the
+        first iteration runs out of time, the best of the root moves it got through is played.
+        """
+        start = time.monotonic()
+        self.deadline = start + self.time_budget
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        move_generator = MoveGenerator(board, use_cache=False)
+        root_moves = move_generator.legal_board_moves(board.turn)
+        if not root_moves:
+            return SearchResult(None, 0, 0, 0, time.monotonic() - start)
+
+        root_moves = self._presorted(board, root_moves)
+
+        best_move, best_score, completed_depth = root_moves[0], 0, 0
+        for depth in range(1, self.max_depth + 1):
+            # Searching the previous iteration's best move first gives the tightest window soonest
+            root_moves.sort(key=lambda move: move != best_move)
+            try:
+                move, score = self._search_root(board, move_generator, root_moves, depth)
+            except SearchTimeout:
+                if completed_depth == 0 and self.root_best is not None:
+                    best_move, best_score = self.root_best
+                break
+            best_move, best_score, completed_depth = move, score, depth
+            if abs(score) >= MATE_THRESHOLD:
+                break
+        return SearchResult(best_move, best_score, completed_depth, self.nodes, time.monotonic() - start)
+
+    def _search_root(
+        self, board: AbsChessBoard, move_generator: MoveGenerator, moves: List[BoardMove], depth: int
+    ) -> Tuple[BoardMove, int]:
+        alpha, best_move = -INFINITY, moves[0]
+        self.root_best = None
+        for move in moves:
+            board.make_move(move)
+            try:
+                score = -self._alpha_beta(board, move_generator, depth - 1, 1, -INFINITY, -alpha)
+            finally:
+                board.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+                self.root_best = (move, score)
+        return best_move, alpha
+
+    def _alpha_beta(
+        self, board: AbsChessBoard, move_generator: MoveGenerator, depth: int, ply: int, alpha: int, beta: int
+    ) -> int:
+        if depth <= 0:
+            return self._quiescence(board, move_generator, ply, alpha, beta)
+        self._count_node()
+
+        moves = move_generator.legal_board_moves(board.turn)
+        if not moves:
+            return -(MATE_SCORE - ply) if move_generator.is_in_check(board.turn) else 0
+        for move in self._ordered(board, moves, ply):
+            board.make_move(move)
+            try:
+                score = -self._alpha_beta(board, move_generator, depth - 1, ply + 1, -beta, -alpha)
+            finally:
+                board.unmake_move()
+            if score >= beta:
+                if board.get_piece(move.end) is None and ply < len(self.killers):
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1], killers[0] = killers[0], move
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _quiescence(self, board: AbsChessBoard, move_generator: MoveGenerator, ply: int, alpha: int, beta: int) -> int:
+        """Search captures and promotions only, so the static evaluation is never taken mid-exchange."""
+        self._count_node()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return beta
+        alpha = max(alpha, stand_pat)
+
+        for move in self._ordered(board, move_generator.legal_captures(board.turn), MAX_DEPTH):
+            board.make_move(move)
+            try:
+                score = -self._quiescence(board, move_generator, ply + 1, -beta, -alpha)
+            finally:
+                board.unmake_move()
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+    @staticmethod
+    def _presorted(board: AbsChessBoard, moves: List[BoardMove]) -> List[BoardMove]:
+        """Moves by static evaluation of the position they lead to, so that equal search scores favour the best."""
+        scores = {}
+        for move in moves:
+            board.make_move(move)
+            scores[move] = -evaluate(board)
+            board.unmake_move()
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def _ordered(self, board: AbsChessBoard, moves: List[BoardMove], ply: int) -> List[BoardMove]:
+        """Promotions and captures first by MVV-LVA, then this ply's killer moves, then the rest."""
+        killers = self.killers[ply] if ply < len(self.killers) else [None, None]
+        keys = {}
+        for move in moves:
+            victim = board.get_piece(move.end)
+            key = 0
+            if move.promotion is not None:
+                key += 10 * PIECE_VALUES[move.promotion]
+            if victim is not None:
+                attacker = board.get_piece(move.start)
+                key += 10 * PIECE_VALUES[victim.type] - PIECE_VALUES[attacker.type] // 10 + 1
+            elif move == killers[0]:
+                key = 2
+            elif move == killers[1]:
+                key = 1
+            keys[move] = key
+        return sorted(moves, key=keys.__getitem__, reverse=True)
+
+    def _count_node(self) -> None:
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.monotonic() >= self.deadline:
+            raise SearchTimeout
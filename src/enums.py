@@ -1,4 +1,4 @@
-from enum import Enum, auto
+from enum import Enum, IntFlag, auto
 from typing import Self
 
 
@@ -35,6 +35,82 @@ class Color(Enum):
         except KeyError:
             raise ValueError(f"'{name}' is not a valid Color")
 
+
+class CastlingRight(IntFlag):
+    NONE = 0
+    WHITE_KINGSIDE = 1
+    WHITE_QUEENSIDE = 2
+    BLACK_KINGSIDE = 4
+    BLACK_QUEENSIDE = 8
+    ALL = 15
+
+
+class WireFormat(Enum):
+    JSON = "json"
+    BINARY = "binary"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def from_string(cls, name: str) -> Self:
+        try:
+            return cls(name.lower())
+        except ValueError:
+            raise ValueError(f"'{name}' is not a valid WireFormat")
+
+
+class ExecutorMode(Enum):
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def from_string(cls, name: str) -> Self:
+        try:
+            return cls(name.lower())
+        except ValueError:
+            raise ValueError(f"'{name}' is not a valid ExecutorMode")
+
+
+class ClockMode(Enum):
+    # Fischer: the increment is added after every move
+    INCREMENT = "increment"
+    # Simple delay: the clock only starts running once the delay has passed each move
+    DELAY = "delay"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def from_string(cls, name: str) -> Self:
+        try:
+            return cls(name.lower())
+        except ValueError:
+            raise ValueError(f"'{name}' is not a valid ClockMode")
+
+
+class GameResult(Enum):
+    # Values are the PGN result tokens
+    WHITE_WINS = "1-0"
+    BLACK_WINS = "0-1"
+    DRAW = "1/2-1/2"
+    UNFINISHED = "*"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def from_string(cls, name: str) -> Self:
+        try:
+            return cls(name)
+        except ValueError:
+            raise ValueError(f"'{name}' is not a valid GameResult")
+
+
 class MessageKeys(Enum):
     PIECE = "piece"
 
@@ -47,6 +123,8 @@ class MessageKeys(Enum):
             return cls[name]  # Lookup enum by name
         except KeyError:
             raise ValueError(f"'{name}' is not a valid MessageKey")
+
+
 class MessageType(Enum):
     STARTUP = auto()
     MOVE = auto()
@@ -56,8 +134,16 @@ class MessageType(Enum):
     CHECKMATE = auto()
     FAILED_MOVE = auto()
     PROMOTION = auto()
+    DELTA = auto()
+    RESYNC = auto()
+    GAME_ID = auto()
+    TIMEOUT = auto()
+    REPETITION_DRAW = auto()
+    FIFTY_MOVE_DRAW = auto()
+
     def __str__(self):
         return self.name.lower()
+
     @classmethod
     def from_string(cls, name: str) -> Self:
         try:
@@ -0,0 +1,52 @@
+"""
+FEN import and export: single positions, and streams of them one per line (FEN or EPD files) in constant memory.
+
+Decoder.decode_fen and Encoder.encode_fen do the text work; this module builds boards and handles files.
+"""
+
+from typing import Iterable, Iterator, Type
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.enums import Color
+from src.move_generator import MoveGenerator
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def board_from_fen(fen: str, board_class: Type[AbsChessBoard] = ChessBoard) -> AbsChessBoard:
+    """Build a board from a FEN string."""
+    matrix, game_state, moved = Decoder.decode_fen(fen)
+    board = board_class(board=matrix, game_state=game_state, moved=moved)
+    move_generator = MoveGenerator(board, use_cache=False)
+    board.is_white_checked = move_generator.is_in_check(Color.WHITE)
+    board.is_black_checked = move_generator.is_in_check(Color.BLACK)
+    return board
+
+
+def board_to_fen(board: AbsChessBoard) -> str:
+    fen: str = Encoder.encode_fen(board)
+    return fen
+
+
+def read_fens(lines: Iterable[str], board_class: Type[AbsChessBoard] = ChessBoard) -> Iterator[AbsChessBoard]:
+    """
+    A board per FEN line, skipping blank lines and "#" comments. EPD lines work too: the operations after the
+    fourth field are ignored. Raises ValueError naming the line number of the first invalid position.
+    """
+    for line_number, line in enumerate(lines, 1):
+        fen = line.strip()
+        if not fen or fen.startswith("#"):
+            continue
+        try:
+            yield board_from_fen(fen, board_class)
+        except ValueError as error:
+            raise ValueError(f"line {line_number}: {error}") from error
+
+
+def write_fens(boards: Iterable[AbsChessBoard]) -> Iterator[str]:
+    """One FEN line, newline included, per board; pass the result to a file's writelines."""
+    for board in boards:
+        yield Encoder.encode_fen(board) + "\n"
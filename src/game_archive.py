@@ -0,0 +1,225 @@
+"""
+Append-only archive of finished games, for keeping every game a server plays and streaming them back for
+analytics without a file or a JSON blob per game.
+
+An archive is two files side by side:
+
+    <path>          game data: per game its initial FEN (left out for the standard starting position), padded to an
+                    even length, then one uint16 move record (Encoder.pack_move) per ply
+    <path>.index    one fixed-size ARCHIVE_INDEX_ENTRY per game: id, data offset, move count, FEN length, result
+                    and finish time
+
+Both are only ever appended to, data before index, so a game is either fully archived or invisible to readers.
+Writers take an exclusive lock on the index while appending, so several worker processes can share an archive.
+GameArchive maps both files and hands out each game's moves as a view into the mapping, so reading millions of
+games copies nothing but the moves actually decoded. Summarise an archive and time a full replay with::
+
+    python -m src.game_archive games.archive --replay
+
+or export it for other chess software with ``--pgn games.pgn``.
+"""
+
+import argparse
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Type
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import BoardMove
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.enums import GameResult
+from src.fen import START_FEN, board_from_fen
+from src.pgn import PgnGame, pgn_game, write_pgn
+
+INDEX_SUFFIX = ".index"
+# game id (16 bytes of the uuid), data offset, move count, FEN length, result, reserved, finished at (unix time)
+ARCHIVE_INDEX_ENTRY = struct.Struct("<16sQIHBxQ")
+GAME_RESULTS: List[GameResult] = list(GameResult)
+
+
+def game_id_bytes(game_id: str) -> bytes:
+    """The 16 bytes of a hex game id as issued by GameStore.new_game_id; other ids get a fresh one."""
+    try:
+        return uuid.UUID(hex=game_id).bytes
+    except ValueError:
+        return uuid.uuid4().bytes
+
+
+class ArchivedGame(NamedTuple):
+    game_id: str
+    initial_fen: str
+    result: GameResult
+    finished_at: int
+    # uint16 move records, a view into the archive mapping
+    records: memoryview
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def moves(self) -> Iterator[BoardMove]:
+        for record in self.records:
+            yield Decoder.unpack_move(record)
+
+    def to_pgn(self) -> PgnGame:
+        finished = time.strftime("%Y.%m.%d", time.gmtime(self.finished_at))
+        return pgn_game(self.initial_fen, self.moves(), self.result, {"Date": finished, "GameId": self.game_id})
+
+    def replay(self, board_class: Type[AbsChessBoard] = ChessBoard) -> AbsChessBoard:
+        """The final position of the game."""
+        board = board_from_fen(self.initial_fen, board_class)
+        for record in self.records:
+            board.make_move(Decoder.unpack_move(record))
+        return board
+
+
+class GameArchiveWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.data_file = open(path, "ab")
+        self.index_file = open(path + INDEX_SUFFIX, "ab")
+        # flock excludes other processes only; threads of this one take the lock first
+        self.lock = threading.Lock()
+
+    def append(
+        self,
+        game_id: str,
+        initial_fen: str,
+        moves: Iterable[BoardMove],
+        result: GameResult = GameResult.UNFINISHED,
+        finished_at: Optional[int] = None,
+    ) -> None:
+        """Archive a game; blocking, so call it from a worker thread when on the event loop."""
+        fen = initial_fen.encode() if initial_fen != START_FEN else b""
+        records = array("H", (Encoder.pack_move(move) for move in moves))
+        if sys.byteorder != "little":
+            records.byteswap()
+        block = fen + b"\0" * (len(fen) & 1) + records.tobytes()
+        with self.lock:
+            fcntl.flock(self.index_file, fcntl.LOCK_EX)
+            try:
+                offset = self.data_file.seek(0, os.SEEK_END)
+                self.data_file.write(block)
+                self.data_file.flush()
+                entry = ARCHIVE_INDEX_ENTRY.pack(
+                    game_id_bytes(game_id),
+                    offset,
+                    len(records),
+                    len(fen),
+                    GAME_RESULTS.index(result),
+                    int(time.time()) if finished_at is None else finished_at,
+                )
+                self.index_file.write(entry)
+                self.index_file.flush()
+            finally:
+                fcntl.flock(self.index_file, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        self.data_file.close()
+        self.index_file.close()
+
+
+class GameArchive:
+    """Read-only view of the games archived when it was opened."""
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("game archives are little-endian and can only be mapped on little-endian hosts")
+        self.path = path
+        # An empty file can't be mapped, and has nothing to read anyway
+        self.mappings = [GameArchive._map(archive_path) for archive_path in (path, path + INDEX_SUFFIX)]
+        self.data, self.index = (memoryview(mapping if mapping is not None else b"") for mapping in self.mappings)
+        # Entries appended after opening are ignored, as is a partly written last entry
+        self.count = len(self.index) // ARCHIVE_INDEX_ENTRY.size
+        self.offsets: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, number: int) -> ArchivedGame:
+        if not 0 <= number < self.count:
+            raise IndexError("archived game number out of range")
+        raw_id, offset, move_count, fen_length, result, finished_at = ARCHIVE_INDEX_ENTRY.unpack_from(
+            self.index, number * ARCHIVE_INDEX_ENTRY.size
+        )
+        fen_end = offset + fen_length
+        records_start = fen_end + (fen_length & 1)
+        records_end = records_start + 2 * move_count
+        return ArchivedGame(
+            uuid.UUID(bytes=raw_id).hex,
+            bytes(self.data[offset:fen_end]).decode() if fen_length else START_FEN,
+            GAME_RESULTS[result],
+            finished_at,
+            self.data[records_start:records_end].cast("H"),
+        )
+
+    def __iter__(self) -> Iterator[ArchivedGame]:
+        for number in range(self.count):
+            yield self[number]
+
+    def find(self, game_id: str) -> Optional[ArchivedGame]:
+        """The latest archived version of a game, None if it isn't archived."""
+        if self.offsets is None:
+            self.offsets = {}
+            for number in range(self.count):
+                raw_id = ARCHIVE_INDEX_ENTRY.unpack_from(self.index, number * ARCHIVE_INDEX_ENTRY.size)[0]
+                self.offsets[uuid.UUID(bytes=raw_id).hex] = number
+        found = self.offsets.get(game_id)
+        return self[found] if found is not None else None
+
+    def close(self) -> None:
+        self.data.release()
+        self.index.release()
+        for mapping in self.mappings:
+            if mapping is not None:
+                mapping.close()
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        with open(path, "rb") as archive_file:
+            if os.fstat(archive_file.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summarise a game archive.")
+    parser.add_argument("archive", help="archive data file (the index is read from <archive>.index)")
+    parser.add_argument("--replay", action="store_true", help="replay every game and report games/sec")
+    parser.add_argument("--pgn", metavar="PATH", help="write every game to a PGN file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    archive = GameArchive(args.archive)
+    results: Dict[GameResult, int] = {result: 0 for result in GameResult}
+    plies = 0
+    start = time.perf_counter()
+    for game in archive:
+        results[game.result] += 1
+        plies += len(game)
+        if args.replay:
+            game.replay()
+    seconds = time.perf_counter() - start
+    print(f"{len(archive)} games, {plies} plies")
+    print(", ".join(f"{result}: {count}" for result, count in results.items()))
+    if args.replay and seconds > 0:
+        print(f"replayed in {seconds:.3f}s, {len(archive) / seconds:.0f} games/s, {plies / seconds:.0f} plies/s")
+    if args.pgn:
+        with open(args.pgn, "w", encoding="utf-8") as pgn_file:
+            pgn_file.writelines(write_pgn(game.to_pgn() for game in archive))
+        print(f"exported to {args.pgn}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Fan-out of game updates to spectators, so that a game can have thousands of viewers without its state being
+encoded once per viewer.
+
+The handler playing a game publishes every new position to the worker's GameHub. A spectator connection (main.py's
+/ws/watch) is a Subscriber, which can watch any number of games over its one socket by sending WATCH messages. An
+update is encoded once, as the JSON snapshot players who opted in to FEN snapshots get (game_id included, so clients
+can tell the boards apart), and the same text goes to every subscriber of the game.
+
+Publishing never waits on a spectator: it only leaves the text with each subscriber, and a task per subscriber
+does the sending. A snapshot supersedes the previous one of its game, so a subscriber that can't keep up skips to
+the latest position of each game rather than queueing them all, and a slow viewer holds at most one pending
+snapshot per game it watches.
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Set, Tuple
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from src.abs_chess_board import AbsChessBoard
+from src.encoders import Encoder
+from src.enums import MessageType
+from src.metrics import BROADCAST_SKIPPED, MESSAGES_SENT, SPECTATORS, STAGE_SECONDS
+
+# Updates that change what spectators see; the others only concern the player who moved
+BROADCAST_MESSAGE_TYPES = frozenset(
+    (
+        MessageType.NEW_STATE,
+        MessageType.CHECKMATE,
+        MessageType.REPETITION_DRAW,
+        MessageType.FIFTY_MOVE_DRAW,
+        MessageType.TIMEOUT,
+        MessageType.RESTART,
+    )
+)
+# Games one spectator connection may watch at once
+MAX_SUBSCRIPTIONS = 64
+
+
+class Subscriber:
+    """A spectator socket and the snapshots waiting to be sent on it."""
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.game_ids: Set[str] = set()
+        # Latest unsent snapshot per game, the game updated longest ago first
+        self.pending: Dict[str, Tuple[MessageType, str]] = {}
+        self.ready = asyncio.Event()
+
+    def offer(self, game_id: str, message_type: MessageType, text: str) -> None:
+        if self.pending.pop(game_id, None) is not None:
+            BROADCAST_SKIPPED.inc()
+        self.pending[game_id] = (message_type, text)
+        self.ready.set()
+
+    async def run(self, hub: "GameHub") -> None:
+        """
+        Send snapshots as they are offered, until cancelled or the socket fails; a closed socket takes the subscriber
+        off all its games in hub.
+        """
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.pending:
+                    game_id = next(iter(self.pending))
+                    message_type, text = self.pending.pop(game_id)
+                    await self.websocket.send_text(text)
+                    MESSAGES_SENT.inc(1, str(message_type))
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # Starlette raises RuntimeError and uvicorn an OSError for sends after the close
+            hub.unsubscribe_all(self)
+
+
+class GameChannel:
+    __slots__ = ("subscribers", "board", "message_type", "sequence", "text")
+
+    def __init__(self) -> None:
+        self.subscribers: Set[Subscriber] = set()
+        # Board and last published state of the game, the board only while a handler plays it
+        self.board: Optional[AbsChessBoard] = None
+        self.message_type = MessageType.NEW_STATE
+        self.sequence = 0
+        # Snapshot of that state, encoded when the first subscriber needs it
+        self.text: Optional[str] = None
+
+    def snapshot(self, game_id: str) -> Optional[str]:
+        if self.text is None and self.board is not None:
+            with STAGE_SECONDS.time("encode_broadcast"):
+                payload = Encoder.encode_message(
+                    self.message_type, self.board, self.sequence, game_id, fen_snapshots=True
+                )
+                # Starlette's send_json separators, so spectators get the same text players do
+                self.text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        return self.text
+
+
+class GameHub:
+    """The games played by this worker's handlers, and the spectators subscribed to each."""
+
+    def __init__(self, max_subscriptions: int = MAX_SUBSCRIPTIONS) -> None:
+        self.max_subscriptions = max_subscriptions
+        self.channels: Dict[str, GameChannel] = {}
+
+    def publish(self, game_id: str, message_type: MessageType, board: AbsChessBoard, sequence: int) -> None:
+        """Record the game's new state and pass it on to its subscribers; costs a dict lookup when it has none."""
+        channel = self.channels.get(game_id)
+        if channel is None:
+            channel = self.channels[game_id] = GameChannel()
+        channel.board = board
+        channel.message_type = message_type
+        channel.sequence = sequence
+        channel.text = None
+        if not channel.subscribers:
+            return
+        text = channel.snapshot(game_id)
+        if text is not None:
+            for subscriber in channel.subscribers:
+                subscriber.offer(game_id, message_type, text)
+
+    def end_game(self, game_id: str) -> None:
+        """The game is no longer played here: keep its final snapshot for its subscribers, if it has any."""
+        channel = self.channels.get(game_id)
+        if channel is None:
+            return
+        if not channel.subscribers:
+            del self.channels[game_id]
+            return
+        channel.snapshot(game_id)
+        channel.board = None
+
+    def subscribe(self, game_id: str, subscriber: Subscriber) -> bool:
+        """Send the game's snapshots to subscriber, starting with the current one; False if it watches too many."""
+        if game_id in subscriber.game_ids:
+            return True
+        if len(subscriber.game_ids) >= self.max_subscriptions:
+            return False
+        channel = self.channels.get(game_id)
+        if channel is None:
+            # Not played here (yet); snapshots follow if a handler starts publishing it
+            channel = self.channels[game_id] = GameChannel()
+        channel.subscribers.add(subscriber)
+        subscriber.game_ids.add(game_id)
+        SPECTATORS.inc()
+        text = channel.snapshot(game_id)
+        if text is not None:
+            subscriber.offer(game_id, channel.message_type, text)
+        return True
+
+    def unsubscribe(self, game_id: str, subscriber: Subscriber) -> None:
+        if game_id not in subscriber.game_ids:
+            return
+        subscriber.game_ids.discard(game_id)
+        subscriber.pending.pop(game_id, None)
+        SPECTATORS.dec()
+        channel = self.channels[game_id]
+        channel.subscribers.discard(subscriber)
+        if not channel.subscribers and channel.board is None:
+            del self.channels[game_id]
+
+    def unsubscribe_all(self, subscriber: Subscriber) -> None:
+        for game_id in list(subscriber.game_ids):
+            self.unsubscribe(game_id, subscriber)
@@ -0,0 +1,233 @@
+"""
+Server-side storage of games, so a game survives process restarts and can be resumed by any worker.
+
+A game is stored as its initial FEN plus an append-only list of 16-bit move records (Encoder.pack_move), keyed by
+a server-issued game id. Pick a backend with create_game_store, for example from the CHESS_GAME_STORE variable:
+
+    memory                  games live in this process only, the most recently played MAX_IN_MEMORY_GAMES (the
+                            default)
+    sqlite:///path/to.db    games are kept in a SQLite database that several workers on the host can share
+"""
+
+import asyncio
+import logging
+import sqlite3
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Type
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import BoardMove, StoredGame
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.enums import Color
+from src.fen import board_from_fen
+from src.metrics import GAME_STORE_ERRORS
+from src.move_generator import MoveGenerator
+
+SQLITE_PREFIX = "sqlite:///"
+# Games the in-memory store keeps; past this the least recently played one is dropped
+MAX_IN_MEMORY_GAMES = 10_000
+
+logger = logging.getLogger(__name__)
+
+
+class GameStore(ABC):
+    """Async interface the game handler loads and saves games through."""
+
+    @staticmethod
+    def new_game_id() -> str:
+        return uuid.uuid4().hex
+
+    @abstractmethod
+    async def create_game(self, initial_fen: str) -> str:
+        """Store a new game starting from initial_fen and return its id."""
+
+    @abstractmethod
+    async def append_move(self, game_id: str, move: BoardMove) -> None:
+        pass
+
+    @abstractmethod
+    async def load_game(self, game_id: str) -> Optional[StoredGame]:
+        """The stored game, or None for an unknown id."""
+
+    async def flush(self) -> None:
+        """Wait until every write made so far is durable."""
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+class InMemoryGameStore(GameStore):
+    """
+    Games in a dict, for a single worker. Only the max_games most recently played are kept, so finished and abandoned
+    games don't pile up for the life of the process; a game dropped from the store can no longer be resumed.
+    """
+
+    def __init__(self, max_games: int = MAX_IN_MEMORY_GAMES) -> None:
+        self.max_games = max_games
+        # Least recently played first
+        self.games: OrderedDict[str, Tuple[str, array]] = OrderedDict()
+
+    async def create_game(self, initial_fen: str) -> str:
+        game_id = GameStore.new_game_id()
+        self.games[game_id] = (initial_fen, array("H"))
+        if len(self.games) > self.max_games:
+            self.games.popitem(last=False)
+        return game_id
+
+    async def append_move(self, game_id: str, move: BoardMove) -> None:
+        game = self.games.get(game_id)
+        if game is None:
+            # Dropped to make room; the game goes on, it just can't be resumed
+            return
+        game[1].append(Encoder.pack_move(move))
+        self.games.move_to_end(game_id)
+
+    async def load_game(self, game_id: str) -> Optional[StoredGame]:
+        if game_id not in self.games:
+            return None
+        self.games.move_to_end(game_id)
+        initial_fen, records = self.games[game_id]
+        return StoredGame(game_id, initial_fen, [Decoder.unpack_move(record) for record in records])
+
+
+class SQLiteGameStore(GameStore):
+    """
+    Games in a SQLite database, one row per game and one row per move.
+
+    Writes are queued and committed together in a worker thread, at most flush_interval seconds after the first
+    queued write or as soon as max_batch writes are waiting, so the event loop never blocks on disk.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, initial_fen TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS moves ("
+        "game_id TEXT NOT NULL, ply INTEGER NOT NULL, record INTEGER NOT NULL, PRIMARY KEY (game_id, ply)"
+        ") WITHOUT ROWID",
+    )
+    INSERT_GAME = "INSERT INTO games (game_id, initial_fen) VALUES (?, ?)"
+    # Plies are numbered in the database so that concurrent handlers never need to agree on a counter
+    INSERT_MOVE = (
+        "INSERT INTO moves (game_id, ply, record) VALUES (?1, (SELECT COUNT(*) FROM moves WHERE game_id = ?1), ?2)"
+    )
+
+    def __init__(self, path: str, flush_interval: float = 0.05, max_batch: int = 256) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pending: List[Tuple[str, Tuple]] = []
+        self.lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def create_game(self, initial_fen: str) -> str:
+        game_id = GameStore.new_game_id()
+        await self._queue(SQLiteGameStore.INSERT_GAME, (game_id, initial_fen))
+        return game_id
+
+    async def append_move(self, game_id: str, move: BoardMove) -> None:
+        await self._queue(SQLiteGameStore.INSERT_MOVE, (game_id, Encoder.pack_move(move)))
+
+    async def load_game(self, game_id: str) -> Optional[StoredGame]:
+        async with self.lock:
+            await self._write_pending()
+            return await asyncio.to_thread(self._read_game, game_id)
+
+    async def flush(self) -> None:
+        async with self.lock:
+            await self._write_pending()
+
+    async def close(self) -> None:
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def _queue(self, statement: str, parameters: Tuple) -> None:
+        self.pending.append((statement, parameters))
+        if len(self.pending) >= self.max_batch:
+            await self._flush_logged()
+        elif self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+            self.flush_task.add_done_callback(SQLiteGameStore._log_flush_failure)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self._flush_logged()
+
+    async def _flush_logged(self) -> None:
+        """Flush on behalf of a writer, which can't do anything about a failed commit but have it logged."""
+        try:
+            await self.flush()
+        except sqlite3.Error:
+            logger.exception("Committing game writes to %s failed", self.path)
+
+    @staticmethod
+    def _log_flush_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background flush of the game store failed", exc_info=task.exception())
+
+    async def _write_pending(self) -> None:
+        # Only called with self.lock held, so the connection is used by one thread at a time
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except sqlite3.OperationalError:
+            # Locked, or out of disk: the transaction rolled back, so the whole batch is retried on the next flush
+            self.pending[:0] = batch
+            GAME_STORE_ERRORS.inc()
+            raise
+        except sqlite3.Error:
+            # A batch that can never commit (a constraint fails) is dropped rather than block every later write
+            GAME_STORE_ERRORS.inc()
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            for statement in SQLiteGameStore.SCHEMA:
+                self.connection.execute(statement)
+        return self.connection
+
+    def _write_batch(self, batch: List[Tuple[str, Tuple]]) -> None:
+        connection = self._connect()
+        with connection:
+            for statement, parameters in batch:
+                connection.execute(statement, parameters)
+
+    def _read_game(self, game_id: str) -> Optional[StoredGame]:
+        connection = self._connect()
+        row = connection.execute("SELECT initial_fen FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        records = connection.execute("SELECT record FROM moves WHERE game_id = ? ORDER BY ply", (game_id,))
+        return StoredGame(game_id, row[0], [Decoder.unpack_move(record) for (record,) in records])
+
+
+def create_game_store(spec: str) -> GameStore:
+    if spec == "memory":
+        return InMemoryGameStore()
+    if spec.startswith(SQLITE_PREFIX):
+        return SQLiteGameStore(spec.removeprefix(SQLITE_PREFIX))
+    raise ValueError(f"'{spec}' is not a valid game store")
+
+
+def replay_game(stored_game: StoredGame, board_class: Type[AbsChessBoard] = ChessBoard) -> AbsChessBoard:
+    """Rebuild the current position of a stored game."""
+    board = board_from_fen(stored_game.initial_fen, board_class)
+    for move in stored_game.moves:
+        board.make_move(move)
+    move_generator = MoveGenerator(board)
+    board.is_white_checked = move_generator.is_in_check(Color.WHITE)
+    board.is_black_checked = move_generator.is_in_check(Color.BLACK)
+    return board
@@ -0,0 +1,389 @@
+"""
+Load generator for the /ws endpoint: N concurrent clients play games against a running server the way browsers do
+(STARTUP, cookie, moves, PROMOTION replies, an acknowledgement and RESTART after CHECKMATE or a draw, a RESTART
+request after TIMEOUT) and the run is summed up as moves/sec, per-move round-trip latency and error counts.
+
+Start a server, then for example::
+
+    python -m src.load_test --clients 500 --duration 60 --output load_report.json
+    python -m src.load_test --clients 500 --pgn games.pgn --engine-color black --compare load_baseline.json
+
+Clients play random legal moves, or replay the games of a PGN file; every game is restarted after --max-plies
+plies. A move's round trip runs from sending it to receiving the server's answer to it (NEW_STATE, CHECKMATE,
+a draw, TIMEOUT, PROMOTION or FAILED_MOVE). Clients follow the position through the FEN of the server's snapshots,
+so they ask for JSON snapshots rather than deltas. Server-side counters (invalid messages, failed moves, analysis
+timeouts) are read from /metrics before and after the run.
+
+With --compare the run fails (exit status 1) when moves/sec dropped, or p99 latency rose, by more than
+--max-regression against the earlier report, so releases can be gated on it. The clients need CPU too: run the
+load generator on another host than the server, or several of them, when measuring near capacity.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import sys
+import time
+import urllib.request
+from array import array
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+from src.abs_chess_board import AbsChessBoard
+from src.data_types import BoardMove
+from src.enums import Color, MessageType
+from src.fen import START_FEN, board_from_fen
+from src.move_generator import MoveGenerator
+from src.pgn import move_from_san, read_pgn
+
+DEFAULT_URL = "ws://127.0.0.1:8000/ws"
+REPORT_VERSION = 1
+# Server counters whose increase over the run is reported, as /metrics sample names
+SERVER_ERROR_SAMPLES = (
+    "chess_invalid_messages_total",
+    'chess_messages_sent_total{message_type="failed_move"}',
+    "chess_analysis_timeouts_total",
+)
+METRIC_LINE_PATTERN = re.compile(r"^(\S+?(?:\{[^}]*\})?)\s+(\S+)$")
+# Game ends the server waits for an acknowledgement of before it sends RESTART
+ACKNOWLEDGED_ENDS = frozenset(
+    str(message_type)
+    for message_type in (MessageType.CHECKMATE, MessageType.REPETITION_DRAW, MessageType.FIFTY_MOVE_DRAW)
+)
+# Answers that end a move's round trip
+MOVE_ANSWERS = ACKNOWLEDGED_ENDS | frozenset(
+    str(message_type)
+    for message_type in (MessageType.NEW_STATE, MessageType.TIMEOUT, MessageType.PROMOTION, MessageType.FAILED_MOVE)
+)
+
+
+class LoadStats:
+    def __init__(self) -> None:
+        # Round trips in seconds, one per move
+        self.latencies = array("d")
+        self.games_started = 0
+        self.checkmates = 0
+        self.draws = 0
+        # Games lost on time; not to be confused with errors["timeouts"], answers the server didn't send in time
+        self.flag_falls = 0
+        self.promotions = 0
+        self.errors: Dict[str, int] = {"failed_moves": 0, "timeouts": 0, "connection_errors": 0, "bad_messages": 0}
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] += 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def metrics_url(websocket_url: str) -> str:
+    """The /metrics URL of the server behind a websocket URL."""
+    parts = urlsplit(websocket_url)
+    scheme = "https" if parts.scheme == "wss" else "http"
+    return f"{scheme}://{parts.netloc}/metrics"
+
+
+def read_server_counters(url: str) -> Optional[Dict[str, float]]:
+    """The SERVER_ERROR_SAMPLES, 0 for those not counted yet; None if the server's metrics can't be read."""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    counters = dict.fromkeys(SERVER_ERROR_SAMPLES, 0.0)
+    for line in text.splitlines():
+        sample = METRIC_LINE_PATTERN.match(line)
+        if sample is not None and sample.group(1) in SERVER_ERROR_SAMPLES:
+            counters[sample.group(1)] = float(sample.group(2))
+    return counters
+
+
+class LoadClient:
+    """One simulated player, restarting games until the deadline."""
+
+    def __init__(
+        self,
+        url: str,
+        stats: LoadStats,
+        rng: random.Random,
+        deadline: float,
+        max_plies: int,
+        timeout: float,
+        engine_color: Optional[Color] = None,
+        scripts: Optional[List[List[str]]] = None,
+    ) -> None:
+        self.url = url
+        self.stats = stats
+        self.rng = rng
+        self.deadline = deadline
+        self.max_plies = max_plies
+        self.timeout = timeout
+        self.engine_color = engine_color
+        self.scripts = scripts
+        self.board: AbsChessBoard = board_from_fen(START_FEN)
+        # SAN moves of the scripted game being replayed, and plies played in the current game
+        self.script: List[str] = []
+        self.plies = 0
+        self.sent_at: Optional[float] = None
+        # Lost on time and asked for the next game, which the server hasn't started yet
+        self.awaiting_restart = False
+
+    async def run(self) -> None:
+        try:
+            async with connect(self.url, ping_interval=None, open_timeout=self.timeout) as websocket:
+                await self.play(websocket)
+        except asyncio.TimeoutError:
+            self.stats.error("timeouts")
+        except (ConnectionClosed, OSError):
+            self.stats.error("connection_errors")
+
+    async def play(self, websocket: ClientConnection) -> None:
+        startup = await self.receive(websocket)
+        if startup.get("message_type") != str(MessageType.STARTUP):
+            self.stats.error("bad_messages")
+            return
+        engine_color = str(self.engine_color) if self.engine_color is not None else None
+        cookie = {"message_type": "cookie", "game": "", "fen_snapshots": True, "engine_color": engine_color}
+        await websocket.send(json.dumps(cookie))
+        self.new_game()
+        while True:
+            message = await self.receive(websocket)
+            message_type = message.get("message_type")
+            if self.sent_at is not None and message_type in MOVE_ANSWERS:
+                self.stats.latencies.append(time.perf_counter() - self.sent_at)
+                self.sent_at = None
+            if message_type == str(MessageType.PROMOTION):
+                self.stats.promotions += 1
+                piece = {"color": str(self.board.turn), "type": "queen", "has_moved": True}
+                await websocket.send(json.dumps({"message_type": "promotion", "piece": piece}))
+                continue
+            if message_type == str(MessageType.GAME_ID):
+                continue
+            if "fen" not in message:
+                self.stats.error("bad_messages")
+                return
+            self.board = board_from_fen(message["fen"])
+            if message_type in ACKNOWLEDGED_ENDS:
+                if message_type == str(MessageType.CHECKMATE):
+                    self.stats.checkmates += 1
+                else:
+                    self.stats.draws += 1
+                # Any JSON acknowledges the end of the game; the server answers with RESTART
+                await websocket.send("{}")
+                continue
+            if message_type == str(MessageType.TIMEOUT):
+                self.stats.flag_falls += 1
+                # The server doesn't wait after a flag falls; the client asks for the next game
+                await websocket.send(json.dumps({"message_type": "restart"}))
+                self.awaiting_restart = True
+                continue
+            if message_type == str(MessageType.RESTART):
+                self.new_game()
+            elif self.awaiting_restart:
+                # The answer to a move that was on its way when the flag fell
+                continue
+            elif message_type == str(MessageType.FAILED_MOVE):
+                self.stats.error("failed_moves")
+            if time.monotonic() >= self.deadline:
+                return
+            if self.board.turn != self.engine_color:
+                await self.move(websocket)
+
+    async def receive(self, websocket: ClientConnection) -> Dict[str, Any]:
+        frame = await asyncio.wait_for(websocket.recv(), self.timeout)
+        message: Dict[str, Any] = json.loads(frame)
+        return message
+
+    def new_game(self) -> None:
+        self.stats.games_started += 1
+        self.plies = 0
+        self.awaiting_restart = False
+        if self.scripts:
+            self.script = list(reversed(self.rng.choice(self.scripts)))
+
+    def next_move(self) -> Optional[BoardMove]:
+        """The scripted or a random legal move, None when the game should be restarted."""
+        if self.plies >= self.max_plies:
+            return None
+        if self.scripts is not None:
+            try:
+                return move_from_san(self.board, self.script.pop()) if self.script else None
+            except ValueError:
+                return None
+        moves = MoveGenerator(self.board).legal_board_moves(self.board.turn)
+        return self.rng.choice(moves) if moves else None
+
+    async def move(self, websocket: ClientConnection) -> None:
+        move = self.next_move()
+        if move is None:
+            await websocket.send(json.dumps({"message_type": "restart"}))
+            return
+        self.plies += 1
+        message = {"message_type": "move", "move": {"start_position": move.start, "end_position": move.end}}
+        self.sent_at = time.perf_counter()
+        await websocket.send(json.dumps(message))
+
+
+async def run_load(args: argparse.Namespace, scripts: Optional[List[List[str]]]) -> Dict[str, Any]:
+    stats = LoadStats()
+    counters_url = args.metrics_url if args.metrics_url is not None else metrics_url(args.url)
+    before = await asyncio.to_thread(read_server_counters, counters_url) if counters_url else None
+    engine_color = Color.from_string(args.engine_color.upper()) if args.engine_color else None
+    start = time.monotonic()
+    deadline = start + args.ramp_up + args.duration
+    clients = []
+    for number in range(args.clients):
+        client = LoadClient(
+            args.url,
+            stats,
+            random.Random(args.seed + number),
+            deadline,
+            args.max_plies,
+            args.timeout,
+            engine_color,
+            scripts,
+        )
+        clients.append(asyncio.create_task(client.run()))
+        if args.ramp_up and args.clients > 1:
+            # Connect gradually, as players arrive
+            await asyncio.sleep(args.ramp_up / args.clients)
+    await asyncio.gather(*clients)
+    seconds = time.monotonic() - start
+    after = await asyncio.to_thread(read_server_counters, counters_url) if counters_url else None
+
+    latencies = sorted(stats.latencies)
+    moves = len(latencies)
+    return {
+        "version": REPORT_VERSION,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "duration": args.duration,
+            "ramp_up": args.ramp_up,
+            "max_plies": args.max_plies,
+            "engine_color": args.engine_color,
+            "pgn": args.pgn,
+            "seed": args.seed,
+        },
+        "seconds": round(seconds, 3),
+        "moves": moves,
+        "moves_per_second": round(moves / seconds, 1) if seconds > 0 else 0.0,
+        "games_started": stats.games_started,
+        "checkmates": stats.checkmates,
+        "draws": stats.draws,
+        "flag_falls": stats.flag_falls,
+        "promotions": stats.promotions,
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / moves, 3) if moves else 0.0,
+            "p50": round(1000 * percentile(latencies, 0.50), 3),
+            "p90": round(1000 * percentile(latencies, 0.90), 3),
+            "p99": round(1000 * percentile(latencies, 0.99), 3),
+            "max": round(1000 * latencies[-1], 3) if moves else 0.0,
+        },
+        "errors": stats.errors,
+        "server_errors": (
+            {name: after[name] - before[name] for name in SERVER_ERROR_SAMPLES}
+            if before is not None and after is not None
+            else None
+        ),
+    }
+
+
+def compare_reports(report: Dict[str, Any], previous_path: str, max_regression: float) -> List[str]:
+    """Regressions of report against an earlier one, as lines to print; empty if there are none."""
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    report["previous_moves_per_second"] = previous["moves_per_second"]
+    report["previous_p99_ms"] = previous["latency_ms"]["p99"]
+    regressions = []
+    if report["moves_per_second"] < previous["moves_per_second"] * (1 - max_regression):
+        regressions.append(f"moves/sec {report['moves_per_second']} < {previous['moves_per_second']}")
+    if report["latency_ms"]["p99"] > previous["latency_ms"]["p99"] * (1 + max_regression):
+        regressions.append(f"p99 {report['latency_ms']['p99']}ms > {previous['latency_ms']['p99']}ms")
+    return regressions
+
+
+def load_scripts(path: str, limit: int) -> List[List[str]]:
+    """The SAN moves of the first limit games of a PGN file that start from the standard position."""
+    scripts = []
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        for game in read_pgn(pgn_file):
+            if game.initial_fen == START_FEN and game.moves:
+                scripts.append(game.moves)
+                if len(scripts) == limit:
+                    break
+    return scripts
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Play many concurrent games against a server and report moves/sec.")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"websocket endpoint (default: {DEFAULT_URL})")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent clients (default: 100)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to play after ramp-up (default: 30)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which clients connect (default: 5)")
+    parser.add_argument("--max-plies", type=int, default=200, help="plies before a game is restarted (default: 200)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for any answer (default: 30)")
+    parser.add_argument("--engine-color", choices=["white", "black"], help="let the server's engine play this color")
+    parser.add_argument("--pgn", help="replay the games of this PGN file instead of random moves")
+    parser.add_argument("--pgn-games", type=int, default=1000, help="games to read from --pgn (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed; client n uses seed + n (default: 0)")
+    parser.add_argument(
+        "--metrics-url", help="server metrics to read error counters from (default: /metrics of --url; '' for none)"
+    )
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="fraction moves/sec may drop or p99 latency rise against --compare (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+    if args.pgn and args.engine_color:
+        parser.error("--pgn games are played by both sides, so they can't be combined with --engine-color")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    scripts = load_scripts(args.pgn, args.pgn_games) if args.pgn else None
+    if scripts is not None and not scripts:
+        print(f"no games from the starting position in {args.pgn}")
+        return 1
+    report = asyncio.run(run_load(args, scripts))
+
+    latency = report["latency_ms"]
+    print(
+        f"{report['moves']} moves in {report['seconds']}s: {report['moves_per_second']} moves/s, "
+        f"{report['games_started']} games, {report['checkmates']} checkmates, {report['draws']} draws, "
+        f"{report['flag_falls']} lost on time"
+    )
+    print(f"round trip ms: p50 {latency['p50']} p90 {latency['p90']} p99 {latency['p99']} max {latency['max']}")
+    print("client errors:", ", ".join(f"{kind} {count}" for kind, count in report["errors"].items()))
+    if report["server_errors"]:
+        print("server errors:", ", ".join(f"{name} {count:g}" for name, count in report["server_errors"].items()))
+
+    regressions = compare_reports(report, args.compare, args.max_regression) if args.compare else []
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
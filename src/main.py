@@ -1,24 +1,110 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
 import uvicorn
 from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from src.chess_game_handler import ChessGameHandler
-from src.decoders import Decoder
+from src.clock import TimeControl
 from src.encoders import Encoder
-from src.enums import MessageType
-from src.data_types import MessageDict, Cookie
+from src.analysis_executor import AnalysisExecutor
+from src.enums import ExecutorMode, MessageType
+from src.game_archive import GameArchiveWriter
+from src.game_hub import MAX_SUBSCRIPTIONS, GameHub, Subscriber
+from src.game_store import create_game_store
+from src.message_parser import MessageParser
+from src.opening_book import OpeningBook
+from src.metrics import CONNECTIONS, INVALID_MESSAGES, MESSAGES_RECEIVED, MESSAGES_SENT, OPEN_WEBSOCKETS, REGISTRY
+from src.profiler import DEFAULT_INTERVAL, SamplingProfiler
+from src.timer_wheel import DEFAULT_RESOLUTION, TimerWheel
 
 # Constants
 DEFAULT_PORT = 8000
+# Play on BitboardChessBoard, whose move generation runs on occupancy masks; compare with `make perft`
+USE_BITBOARD = os.environ.get("CHESS_USE_BITBOARD", "") == "1"
+# "memory", or "sqlite:///path/to/games.db" to keep games across restarts and share them between workers
+GAME_STORE_SPEC = os.environ.get("CHESS_GAME_STORE", "memory")
+# Seconds the built-in engine may think per move
+ENGINE_TIME_BUDGET = float(os.environ.get("CHESS_ENGINE_TIME", "1.0"))
+# Where CPU-heavy checks run: "process" pool, "thread" pool or "inline" on the event loop
+ANALYSIS_EXECUTOR_MODE = ExecutorMode.from_string(os.environ.get("CHESS_ANALYSIS_EXECUTOR", "process"))
+ANALYSIS_WORKERS = int(os.environ.get("CHESS_ANALYSIS_WORKERS", "0")) or None
+ANALYSIS_MAX_PENDING = int(os.environ.get("CHESS_ANALYSIS_MAX_PENDING", "64"))
+ANALYSIS_TIMEOUT = float(os.environ.get("CHESS_ANALYSIS_TIMEOUT", "5.0"))
+# Calls estimated cheaper than this run inline; 0 sends everything to the pool
+ANALYSIS_INLINE_COST = int(os.environ.get("CHESS_ANALYSIS_INLINE_COST", "8"))
+# Opening book file built with "python -m src.opening_book build"; no book when unset
+OPENING_BOOK_PATH = os.environ.get("CHESS_OPENING_BOOK", "")
+# Append-only archive finished games are kept in (see src/game_archive.py); no archive when unset
+GAME_ARCHIVE_PATH = os.environ.get("CHESS_GAME_ARCHIVE", "")
+# Profile every game, or only those switched on by a PROFILE message carrying CHESS_ADMIN_TOKEN
+PROFILE_ALL_GAMES = os.environ.get("CHESS_PROFILE", "") == "1"
+PROFILE_DIRECTORY = os.environ.get("CHESS_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("CHESS_PROFILE_INTERVAL", str(DEFAULT_INTERVAL)))
+ADMIN_TOKEN = os.environ.get("CHESS_ADMIN_TOKEN") or None
+# Games one spectator connection may watch at once
+SPECTATOR_MAX_GAMES = int(os.environ.get("CHESS_SPECTATOR_MAX_GAMES", str(MAX_SUBSCRIPTIONS)))
+# Time control of games whose client doesn't pick one, e.g. "300+2" or "300d5"; games are untimed when unset
+TIME_CONTROL_SPEC = os.environ.get("CHESS_TIME_CONTROL", "")
+DEFAULT_TIME_CONTROL = TimeControl.from_string(TIME_CONTROL_SPEC) if TIME_CONTROL_SPEC else None
+# Seconds per tick of the timer wheel, the most a flag fall is noticed late by
+CLOCK_RESOLUTION = float(os.environ.get("CHESS_CLOCK_RESOLUTION", str(DEFAULT_RESOLUTION)))
 INDEX_PATH = "../index.html"
 STATIC_PATH = "/Users/itaihalperin/chess/static"
 
+# Shared by every connection of this worker
+game_store = create_game_store(GAME_STORE_SPEC)
+analysis_executor = AnalysisExecutor(
+    ANALYSIS_EXECUTOR_MODE, ANALYSIS_WORKERS, ANALYSIS_MAX_PENDING, ANALYSIS_TIMEOUT, ANALYSIS_INLINE_COST
+)
+opening_book = OpeningBook(OPENING_BOOK_PATH) if OPENING_BOOK_PATH else None
+game_archive = GameArchiveWriter(GAME_ARCHIVE_PATH) if GAME_ARCHIVE_PATH else None
+game_hub = GameHub(SPECTATOR_MAX_GAMES)
+timer_wheel = TimerWheel(CLOCK_RESOLUTION)
+profiler = SamplingProfiler(
+    PROFILE_DIRECTORY,
+    [getattr(ChessGameHandler, name) for name in ChessGameHandler.PROFILED_ENTRY_POINTS],
+    PROFILE_INTERVAL,
+)
+REGISTRY.counter(
+    "chess_analysis_inline_calls_total",
+    "Analysis calls run on the event loop.",
+    function=lambda: analysis_executor.inline_calls,
+)
+REGISTRY.counter(
+    "chess_analysis_pooled_calls_total",
+    "Analysis calls sent to the executor pool.",
+    function=lambda: analysis_executor.pooled_calls,
+)
+REGISTRY.counter(
+    "chess_analysis_timeouts_total",
+    "Pooled analysis calls that timed out and ran in-process instead.",
+    function=lambda: analysis_executor.timeouts,
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    timer_wheel.start()
+    yield
+    timer_wheel.stop()
+    # Commit queued game writes before the worker exits
+    await game_store.close()
+    analysis_executor.shutdown()
+    profiler.flush()
+    if opening_book is not None:
+        opening_book.close()
+    if game_archive is not None:
+        game_archive.close()
+
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Setup static files
 static_directory = Path("../static").resolve()
@@ -33,31 +119,99 @@ async def get() -> HTMLResponse:
     return HTMLResponse(html_content)
 
 
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """Server metrics in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
     """WebSocket endpoint for game communication."""
     await websocket.accept()
 
     # Create game handler
-    game_handler = ChessGameHandler(websocket)
-
-    # Initial startup message
-    await websocket.send_json(Encoder.encode_message(message_type=MessageType.STARTUP))
-
-    # Handle cookie
-    cookie_dict: MessageDict = Decoder.recursive_json_loads(await websocket.receive_text())
-    if not cookie_dict.get("game", ""):
-        await game_handler.initialize_game()
-    else:
-        await game_handler.initialize_game(Cookie.model_validate(cookie_dict))
-
-    # Main game loop
-    while True:
-        if game_handler.is_checkmate():
-            await game_handler.handle_checkmate()
-        else:
-            data = Decoder.recursive_json_loads(await websocket.receive_json())
-            await game_handler.handle_message(data)
+    game_handler = ChessGameHandler(
+        websocket,
+        use_bitboard=USE_BITBOARD,
+        game_store=game_store,
+        engine_time_budget=ENGINE_TIME_BUDGET,
+        analysis_executor=analysis_executor,
+        profiler=profiler,
+        admin_token=ADMIN_TOKEN,
+        opening_book=opening_book,
+        game_archive=game_archive,
+        game_hub=game_hub,
+        timer_wheel=timer_wheel,
+    )
+    if PROFILE_ALL_GAMES:
+        game_handler.start_profiling()
+
+    CONNECTIONS.inc()
+    OPEN_WEBSOCKETS.inc()
+    try:
+        # Initial startup message
+        await websocket.send_json(Encoder.encode_message(message_type=MessageType.STARTUP))
+        MESSAGES_SENT.inc(1, str(MessageType.STARTUP))
+
+        # Handle cookie, which may also pick the wire format, delta updates, FEN snapshots, legal moves and clock
+        # offered at startup
+        cookie = MessageParser.parse_cookie(await websocket.receive_text())
+        game_handler.time_control = cookie.time_control or DEFAULT_TIME_CONTROL
+        game_handler.wire_format = cookie.wire_format
+        game_handler.delta_updates = cookie.delta_updates
+        game_handler.fen_snapshots = cookie.fen_snapshots
+        game_handler.send_legal_moves = cookie.legal_moves
+        game_handler.engine_color = cookie.engine_color
+        await game_handler.initialize_game(cookie)
+
+        # Main game loop
+        while True:
+            if await game_handler.is_checkmate():
+                await game_handler.handle_checkmate()
+            else:
+                try:
+                    message = MessageParser.parse_message(await websocket.receive_text())
+                except ValueError:
+                    # Not a message we understand; the client keeps its last state
+                    INVALID_MESSAGES.inc()
+                    continue
+                MESSAGES_RECEIVED.inc(1, message.message_type)
+                await game_handler.handle_message(message)
+    finally:
+        OPEN_WEBSOCKETS.dec()
+        await game_handler.stop_profiling()
+        game_handler.stop_clock()
+        game_handler.stop_broadcasting()
+        # The client may still resume a stored game; archiving it again later supersedes this entry
+        await game_handler.archive_game()
+
+
+@app.websocket("/ws/watch")
+async def watch_endpoint(websocket: WebSocket) -> None:
+    """WebSocket endpoint for spectators, who pick the games to receive snapshots of with WATCH messages."""
+    await websocket.accept()
+    subscriber = Subscriber(websocket)
+    sender = asyncio.create_task(subscriber.run(game_hub))
+
+    CONNECTIONS.inc()
+    OPEN_WEBSOCKETS.inc()
+    try:
+        while True:
+            try:
+                message = MessageParser.parse_watch(await websocket.receive_text())
+            except ValueError:
+                INVALID_MESSAGES.inc()
+                continue
+            MESSAGES_RECEIVED.inc(1, message.message_type)
+            if message.enabled:
+                game_hub.subscribe(message.game_id, subscriber)
+            else:
+                game_hub.unsubscribe(message.game_id, subscriber)
+    finally:
+        OPEN_WEBSOCKETS.dec()
+        sender.cancel()
+        game_hub.unsubscribe_all(subscriber)
 
 
 if __name__ == "__main__":
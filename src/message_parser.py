@@ -0,0 +1,61 @@
+from typing import Any, Union
+
+from pydantic import TypeAdapter, ValidationError
+
+from src.data_types import CookieMessage, InboundMessage, PromotionMessage, WatchMessage
+from src.decoders import Decoder
+from src.metrics import STAGE_SECONDS
+
+RawFrame = Union[str, bytes]
+
+# InboundMessage is a tagged union, so pydantic-core picks the model from message_type with a single lookup while
+# parsing the JSON and validates only that model. Moves, the bulk of the traffic, never touch the other models.
+INBOUND_MESSAGE_ADAPTER: TypeAdapter[InboundMessage] = TypeAdapter(InboundMessage)
+PROMOTION_MESSAGE_ADAPTER: TypeAdapter[PromotionMessage] = TypeAdapter(PromotionMessage)
+COOKIE_MESSAGE_ADAPTER: TypeAdapter[CookieMessage] = TypeAdapter(CookieMessage)
+WATCH_MESSAGE_ADAPTER: TypeAdapter[WatchMessage] = TypeAdapter(WatchMessage)
+
+
+class MessageParser:
+    """
+    Decode and validate inbound websocket frames in one pass, straight from the raw text or bytes.
+
+    Every method raises pydantic's ValidationError (a ValueError) when the frame is not a valid message.
+    """
+
+    @staticmethod
+    def parse_message(raw: RawFrame) -> InboundMessage:
+        """Parse any in-game message, dispatching on message_type."""
+        return MessageParser._validate(INBOUND_MESSAGE_ADAPTER, raw)
+
+    @staticmethod
+    def parse_promotion(raw: RawFrame) -> PromotionMessage:
+        """Parse the piece picked after a PROMOTION message (message_type may be left out)."""
+        return MessageParser._validate(PROMOTION_MESSAGE_ADAPTER, raw)
+
+    @staticmethod
+    def parse_cookie(raw: RawFrame) -> CookieMessage:
+        """Parse the first client message, holding the stored game and the options picked from STARTUP."""
+        return MessageParser._validate(COOKIE_MESSAGE_ADAPTER, raw)
+
+    @staticmethod
+    def parse_watch(raw: RawFrame) -> WatchMessage:
+        """Parse a spectator's request to watch a game or stop watching it."""
+        return MessageParser._validate(WATCH_MESSAGE_ADAPTER, raw)
+
+    @staticmethod
+    def _validate(adapter: TypeAdapter[Any], raw: RawFrame) -> Any:
+        try:
+            with STAGE_SECONDS.time("parse_message"):
+                return adapter.validate_json(raw)
+        except ValidationError:
+            with STAGE_SECONDS.time("json_unwrap"):
+                # Some clients double-encode frames or nest JSON strings inside them; unwrap those the slow way
+                text = raw.decode() if isinstance(raw, bytes) else raw
+                loaded: Any = Decoder.recursive_json_loads(text)
+                while isinstance(loaded, str) and loaded != text:
+                    text = loaded
+                    loaded = Decoder.recursive_json_loads(text)
+                if isinstance(loaded, str):
+                    raise
+                return adapter.validate_python(loaded)
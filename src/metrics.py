@@ -0,0 +1,241 @@
+"""
+In-process server metrics, exposed by main.py at /metrics in the Prometheus text format (version 0.0.4).
+
+Metrics are plain counters, gauges and fixed-bucket histograms kept in dicts keyed by label values. Updating one
+is a dict lookup and an add, plus a bisect for histograms, so instrumentation stays on in production. Updates come
+from the event loop thread and are not locked. Each worker process has its own registry, so scrape every worker
+(or sum across them) when running several.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from types import TracebackType
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+LabelValues = Tuple[str, ...]
+MetricType = TypeVar("MetricType", bound="Metric")
+
+# Seconds, from a cached lookup to a long engine search
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """
+    Base of the metric types. A metric given a function reads its single value from it at every scrape, for
+    numbers that other objects already keep.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.function = function
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+    def render(self) -> str:
+        return "\n".join(
+            [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+        )
+
+
+class Counter(Metric):
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *label_values: str) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) - amount
+
+    def set(self, value: float, *label_values: str) -> None:
+        self.values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: (count in each bucket, not cumulative, with a last one for +Inf; [sum])
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def time(self, *label_values: str) -> "Timer":
+        """Context manager observing the seconds spent in its block."""
+        return Timer(self, label_values)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: LabelValues) -> None:
+        self.histogram = histogram
+        self.label_values = label_values
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class MetricsRegistry:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ) -> Counter:
+        return self._register(Counter(name, documentation, label_names, function))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names, function))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+    def _register(self, metric: MetricType) -> MetricType:
+        if metric.name in self.metrics:
+            raise ValueError(f"'{metric.name}' is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+OPEN_WEBSOCKETS = REGISTRY.gauge("chess_open_websockets", "Websocket connections currently open.")
+CONNECTIONS = REGISTRY.counter("chess_connections_total", "Websocket connections accepted.")
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "chess_messages_received_total", "Valid in-game messages received, by message type.", ("message_type",)
+)
+INVALID_MESSAGES = REGISTRY.counter("chess_invalid_messages_total", "Received frames that were not a valid message.")
+MESSAGES_SENT = REGISTRY.counter("chess_messages_sent_total", "Messages sent, by MessageType.", ("message_type",))
+MOVES = REGISTRY.counter("chess_moves_total", "Moves played, by player (human or engine).", ("player",))
+BOOK_PROBES = REGISTRY.counter(
+    "chess_opening_book_probes_total", "Opening book lookups, by result (hit or miss).", ("result",)
+)
+GAME_STORE_ERRORS = REGISTRY.counter(
+    "chess_game_store_errors_total", "Batches of game writes the game store failed to commit."
+)
+SPECTATORS = REGISTRY.gauge("chess_spectators", "Game subscriptions of spectator connections.")
+BROADCAST_SKIPPED = REGISTRY.counter(
+    "chess_broadcast_skipped_total", "Spectator snapshots replaced by a newer one of the same game before being sent."
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "chess_stage_seconds",
+    "Seconds spent per stage: parse_message, json_unwrap (double-encoded frames), validate_move, mate_check, "
+    "engine_search, encode_message and encode_broadcast (once per update for all spectators).",
+    ("stage",),
+)
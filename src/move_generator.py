@@ -0,0 +1,501 @@
+from typing import Dict, List, Optional, Tuple
+
+from src.abs_chess_board import AbsChessBoard
+from src.attack_tables import (
+    BETWEEN_MASKS,
+    BISHOP_RAY_MASKS,
+    BISHOP_RAYS,
+    KING_ATTACK_MASKS,
+    KING_TARGETS,
+    KNIGHT_ATTACK_MASKS,
+    KNIGHT_TARGETS,
+    PAWN_ATTACK_MASKS,
+    PAWN_ATTACKS,
+    PAWN_DIRECTION,
+    PAWN_START_ROW,
+    ROOK_RAY_MASKS,
+    ROOK_RAYS,
+    SLIDER_RAYS,
+    Ray,
+    SliderRay,
+    slider_attacks,
+)
+from src.bitboard import FULL_BOARD, POSITIONS, square_index
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import Position, BoardMove, LegalMoveMap
+from src.enums import Color, PieceType, CastlingRight
+from src.piece import Piece
+from src.position_cache import POSITION_CACHE
+
+PROMOTION_TYPES: List[PieceType] = [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]
+# Offsets of the piece types within a side's six entries of BitboardChessBoard.bitboards
+PAWN_INDEX, KNIGHT_INDEX, BISHOP_INDEX, ROOK_INDEX, QUEEN_INDEX, KING_INDEX = range(6)
+
+
+class MoveGenerator:
+    """
+    Table-driven legal move generator.
+
+    Pseudo-legal targets come from the precomputed knight/king/pawn tables and sliding rays, plus castling and
+    en passant from the board state; a move is legal when playing it with make_move does not leave the mover's
+    king attacked. On a ``ChessBoard`` the incremental
+    attack maps answer check and pin questions directly, so only king moves, pinned pieces and check evasions
+    are played out on the board. On a ``BitboardChessBoard`` moves come from the occupancy masks instead: checkers
+    and pins are found once per position with the attack tables, so no move is played out except en passant.
+
+    A ``ChessBoard`` also carries a Zobrist key, so when ``use_cache`` is set the legal-move lists and
+    has-a-legal-move answers are shared through the process-wide ``POSITION_CACHE``.
+    """
+
+    def __init__(self, board: AbsChessBoard, use_cache: bool = True):
+        self.board = board
+        self.tracked_board: Optional[ChessBoard] = board if isinstance(board, ChessBoard) else None
+        self.bitboard_board: Optional[BitboardChessBoard] = board if isinstance(board, BitboardChessBoard) else None
+        self.use_cache = use_cache and self.tracked_board is not None
+
+    def pseudo_legal_ends(self, start_pos: Position) -> List[Position]:
+        piece = self.board.get_piece(start_pos)
+        if piece is None:
+            return []
+        index = square_index(start_pos)
+        if piece.type == PieceType.PAWN:
+            return self._pawn_ends(piece, start_pos)
+        if piece.type == PieceType.KNIGHT or piece.type == PieceType.KING:
+            targets = KNIGHT_TARGETS[index] if piece.type == PieceType.KNIGHT else KING_TARGETS[index]
+            ends = []
+            for target in targets:
+                target_piece = self.board.get_piece(target)
+                if target_piece is None or target_piece.color != piece.color:
+                    ends.append(target)
+            if piece.type == PieceType.KING:
+                ends.extend(self._castling_ends(piece, start_pos))
+            return ends
+        ends = []
+        for ray in SLIDER_RAYS[piece.type][index]:
+            for target in ray:
+                target_piece = self.board.get_piece(target)
+                if target_piece is None:
+                    ends.append(target)
+                    continue
+                if target_piece.color != piece.color:
+                    ends.append(target)
+                break
+        return ends
+
+    def legal_ends(self, start_pos: Position) -> List[Position]:
+        piece = self.board.get_piece(start_pos)
+        if piece is None:
+            return []
+        if self.use_cache or self.bitboard_board is not None:
+            return [end for start, end in self.legal_moves(piece.color) if start == start_pos]
+        return self._legal_ends(piece, start_pos, self._free_movers(piece.color))
+
+    def legal_moves(self, color: Color) -> List[Tuple[Position, Position]]:
+        if not self.use_cache or self.tracked_board is None:
+            return self._generate_legal_moves(color)
+        key = (self.tracked_board.zobrist_key, "legal_moves", color)
+        moves = POSITION_CACHE.get(key)
+        if moves is None:
+            moves = tuple(self._generate_legal_moves(color))
+            POSITION_CACHE.put(key, moves)
+        return list(moves)
+
+    def has_legal_move(self, color: Color) -> bool:
+        if not self.use_cache or self.tracked_board is None:
+            return self._has_legal_move(color)
+        key = (self.tracked_board.zobrist_key, "has_legal_move", color)
+        has_move = POSITION_CACHE.get(key)
+        if has_move is None:
+            has_move = self._has_legal_move(color)
+            POSITION_CACHE.put(key, has_move)
+        return bool(has_move)
+
+    def _generate_legal_moves(self, color: Color) -> List[Tuple[Position, Position]]:
+        if self.bitboard_board is not None:
+            return self._bitboard_legal_moves(self.bitboard_board, color)
+        moves: List[Tuple[Position, Position]] = []
+        free_movers = self._free_movers(color)
+        for start_pos in self._positions_of(color):
+            piece = self.board.get_piece(start_pos)
+            moves.extend((start_pos, end) for end in self._legal_ends(piece, start_pos, free_movers))
+        return moves
+
+    def legal_move_map(self, color: Color) -> LegalMoveMap:
+        """Legal moves of color as a bitmask of end squares per start square, the form clients receive them in."""
+        move_map: Dict[int, int] = {}
+        for start_pos, end_pos in self.legal_moves(color):
+            start = square_index(start_pos)
+            move_map[start] = move_map.get(start, 0) | 1 << square_index(end_pos)
+        return move_map
+
+    def legal_board_moves(self, color: Color) -> List[BoardMove]:
+        """Legal moves of color with one entry per promotion choice, ready for make_move."""
+        moves: List[BoardMove] = []
+        for start_pos, end_pos in self.legal_moves(color):
+            piece = self.board.get_piece(start_pos)
+            if piece.type == PieceType.PAWN and (end_pos[0] == 0 or end_pos[0] == 7):
+                moves.extend(BoardMove(start_pos, end_pos, promotion) for promotion in PROMOTION_TYPES)
+            else:
+                moves.append(BoardMove(start_pos, end_pos))
+        return moves
+
+    def legal_captures(self, color: Color) -> List[BoardMove]:
+        """
+        Legal captures (en passant included) and promotions of color, the moves a quiescence search looks at.
+
+        On a ``ChessBoard`` these come straight from the attack maps instead of generating every legal move.
+        """
+        if self.tracked_board is None:
+            return [
+                move
+                for move in self.legal_board_moves(color)
+                if move.promotion is not None or self._is_capture(move.start, move.end)
+            ]
+        board = self.tracked_board
+        color_map = board.attack_maps[color]
+        free_movers = self._free_movers(color)
+        enemy = Color.BLACK if color == Color.WHITE else Color.WHITE
+        moves: List[BoardMove] = []
+        for end_pos in self._positions_of(enemy):
+            attackers = color_map[square_index(end_pos)]
+            while attackers:
+                low_bit = attackers & -attackers
+                attackers ^= low_bit
+                start_pos = POSITIONS[low_bit.bit_length() - 1]
+                piece = board.get_piece(start_pos)
+                if piece.type == PieceType.KING or not free_movers & low_bit:
+                    if self.leaves_king_in_check(piece, start_pos, end_pos):
+                        continue
+                if piece.type == PieceType.PAWN and (end_pos[0] == 0 or end_pos[0] == 7):
+                    moves.extend(BoardMove(start_pos, end_pos, promotion) for promotion in PROMOTION_TYPES)
+                else:
+                    moves.append(BoardMove(start_pos, end_pos))
+
+        en_passant = board.en_passant
+        if en_passant is not None:
+            for start_pos in PAWN_ATTACKS[enemy][square_index(en_passant)]:
+                piece = board.get_piece(start_pos)
+                if piece is not None and piece.type == PieceType.PAWN and piece.color == color:
+                    if not self.leaves_king_in_check(piece, start_pos, en_passant):
+                        moves.append(BoardMove(start_pos, en_passant))
+
+        promotion_row = 7 if color == Color.WHITE else 0
+        for column in range(8):
+            start_pos = (promotion_row - PAWN_DIRECTION[color], column)
+            piece = board.get_piece(start_pos)
+            if piece is None or piece.type != PieceType.PAWN or piece.color != color:
+                continue
+            end_pos = (promotion_row, column)
+            if board.get_piece(end_pos) is not None:
+                continue
+            if not free_movers & (1 << square_index(start_pos)) and self.leaves_king_in_check(
+                piece, start_pos, end_pos
+            ):
+                continue
+            moves.extend(BoardMove(start_pos, end_pos, promotion) for promotion in PROMOTION_TYPES)
+        return moves
+
+    def _is_capture(self, start_pos: Position, end_pos: Position) -> bool:
+        if self.board.get_piece(end_pos) is not None:
+            return True
+        piece = self.board.get_piece(start_pos)
+        return end_pos == self.board.en_passant and piece is not None and piece.type == PieceType.PAWN
+
+    def _has_legal_move(self, color: Color) -> bool:
+        if self.bitboard_board is not None:
+            return bool(self._bitboard_legal_moves(self.bitboard_board, color))
+        free_movers = self._free_movers(color)
+        for start_pos in self._positions_of(color):
+            piece = self.board.get_piece(start_pos)
+            if piece.type != PieceType.KING and free_movers & (1 << square_index(start_pos)):
+                if self._legal_ends(piece, start_pos, free_movers):
+                    return True
+                continue
+            for end in self.pseudo_legal_ends(start_pos):
+                if not self.leaves_king_in_check(piece, start_pos, end):
+                    return True
+        return False
+
+    def leaves_king_in_check(self, piece: Piece, start_pos: Position, end_pos: Position) -> bool:
+        undo = self.board.make_move(BoardMove(start_pos, end_pos))
+        is_checked = self.is_in_check(piece.color)
+        self.board.unmake_move(undo)
+        return is_checked
+
+    def is_in_check(self, color: Color) -> bool:
+        if self.tracked_board is not None:
+            is_checked: bool = self.tracked_board.is_in_check(color)
+            return is_checked
+        if self.bitboard_board is not None:
+            board = self.bitboard_board
+            king = board.bitboards[(0 if color == Color.WHITE else 6) + KING_INDEX]
+            enemy = Color.BLACK if color == Color.WHITE else Color.WHITE
+            return bool(king) and bool(self._bitboard_attackers(board, king.bit_length() - 1, enemy, board.occupied))
+        king_position = self.board.white_king_position if color == Color.WHITE else self.board.black_king_position
+        if king_position is None:
+            return False
+        return self.is_square_attacked(king_position, Color.BLACK if color == Color.WHITE else Color.WHITE)
+
+    def is_square_attacked(self, pos: Position, by_color: Color) -> bool:
+        if self.tracked_board is not None:
+            is_attacked: bool = self.tracked_board.is_square_attacked(pos, by_color)
+            return is_attacked
+        if self.bitboard_board is not None:
+            board = self.bitboard_board
+            return bool(self._bitboard_attackers(board, square_index(pos), by_color, board.occupied))
+        index = square_index(pos)
+        for source in KNIGHT_TARGETS[index]:
+            piece = self.board.get_piece(source)
+            if piece is not None and piece.type == PieceType.KNIGHT and piece.color == by_color:
+                return True
+        for source in KING_TARGETS[index]:
+            piece = self.board.get_piece(source)
+            if piece is not None and piece.type == PieceType.KING and piece.color == by_color:
+                return True
+        # A pawn of by_color attacks pos from the squares a pawn of the other color would attack from pos.
+        defender = Color.BLACK if by_color == Color.WHITE else Color.WHITE
+        for source in PAWN_ATTACKS[defender][index]:
+            piece = self.board.get_piece(source)
+            if piece is not None and piece.type == PieceType.PAWN and piece.color == by_color:
+                return True
+        return self._is_attacked_along(ROOK_RAYS[index], PieceType.ROOK, by_color) or self._is_attacked_along(
+            BISHOP_RAYS[index], PieceType.BISHOP, by_color
+        )
+
+    def _is_attacked_along(self, rays: Tuple[Ray, ...], slider_type: PieceType, by_color: Color) -> bool:
+        for ray in rays:
+            for source in ray:
+                piece = self.board.get_piece(source)
+                if piece is None:
+                    continue
+                if piece.color == by_color and (piece.type == slider_type or piece.type == PieceType.QUEEN):
+                    return True
+                break
+        return False
+
+    def _free_movers(self, color: Color) -> int:
+        """Bitmask of squares whose non-king piece can make any pseudo-legal move without exposing its king."""
+        if self.tracked_board is None or self.tracked_board.is_in_check(color):
+            return 0
+        pinned: int = self.tracked_board.pinned_pieces(color)
+        return ~pinned
+
+    def _legal_ends(self, piece: Piece, start_pos: Position, free_movers: int) -> List[Position]:
+        ends = self.pseudo_legal_ends(start_pos)
+        if piece.type != PieceType.KING and free_movers & (1 << square_index(start_pos)):
+            en_passant = self.board.en_passant
+            if piece.type != PieceType.PAWN or en_passant not in ends:
+                return ends
+            # En passant removes two pawns from the rank, which can expose the king even for an unpinned pawn
+            return [end for end in ends if end != en_passant or not self.leaves_king_in_check(piece, start_pos, end)]
+        return [end for end in ends if not self.leaves_king_in_check(piece, start_pos, end)]
+
+    def _castling_ends(self, king: Piece, start_pos: Position) -> List[Position]:
+        row = 0 if king.color == Color.WHITE else 7
+        if start_pos != (row, 4) or not self.board.castling_rights:
+            return []
+        kingside, queenside = (
+            (CastlingRight.WHITE_KINGSIDE, CastlingRight.WHITE_QUEENSIDE)
+            if king.color == Color.WHITE
+            else (CastlingRight.BLACK_KINGSIDE, CastlingRight.BLACK_QUEENSIDE)
+        )
+        enemy = Color.BLACK if king.color == Color.WHITE else Color.WHITE
+        ends: List[Position] = []
+        for right, empty_columns, safe_columns, end_column in (
+            (kingside, (5, 6), (4, 5, 6), 6),
+            (queenside, (1, 2, 3), (4, 3, 2), 2),
+        ):
+            if not self.board.castling_rights & right:
+                continue
+            if any(self.board.get_piece((row, column)) is not None for column in empty_columns):
+                continue
+            if any(self.is_square_attacked((row, column), enemy) for column in safe_columns):
+                continue
+            ends.append((row, end_column))
+        return ends
+
+    def _pawn_ends(self, piece: Piece, start_pos: Position) -> List[Position]:
+        ends: List[Position] = []
+        direction = PAWN_DIRECTION[piece.color]
+        row, column = start_pos
+        forward: Optional[Position] = (row + direction, column) if 0 <= row + direction <= 7 else None
+        if forward is not None and self.board.get_piece(forward) is None:
+            ends.append(forward)
+            double = (row + 2 * direction, column)
+            if row == PAWN_START_ROW[piece.color] and self.board.get_piece(double) is None:
+                ends.append(double)
+        for target in PAWN_ATTACKS[piece.color][square_index(start_pos)]:
+            target_piece = self.board.get_piece(target)
+            if target_piece is not None and target_piece.color != piece.color:
+                ends.append(target)
+            elif target_piece is None and target == self.board.en_passant:
+                ends.append(target)
+        return ends
+
+    def _positions_of(self, color: Color) -> List[Position]:
+        positions = []
+        for pos in POSITIONS:
+            piece = self.board.get_piece(pos)
+            if piece is not None and piece.color == color:
+                positions.append(pos)
+        return positions
+
+    @staticmethod
+    def _bitboard_attackers(board: BitboardChessBoard, index: int, by_color: Color, occupied: int) -> int:
+        """Squares of by_color's pieces that attack square index, with sliders blocked by the occupied mask."""
+        bitboards = board.bitboards
+        offset = 0 if by_color == Color.WHITE else 6
+        # A pawn of by_color attacks index from the squares a pawn of the other color would attack from index
+        defender = Color.BLACK if by_color == Color.WHITE else Color.WHITE
+        attackers: int = (
+            KNIGHT_ATTACK_MASKS[index] & bitboards[offset + KNIGHT_INDEX]
+            | KING_ATTACK_MASKS[index] & bitboards[offset + KING_INDEX]
+            | PAWN_ATTACK_MASKS[defender][index] & bitboards[offset + PAWN_INDEX]
+        )
+        queens = bitboards[offset + QUEEN_INDEX]
+        straight = bitboards[offset + ROOK_INDEX] | queens
+        if straight:
+            attackers |= slider_attacks(index, occupied, ROOK_RAY_MASKS[index]) & straight
+        diagonal = bitboards[offset + BISHOP_INDEX] | queens
+        if diagonal:
+            attackers |= slider_attacks(index, occupied, BISHOP_RAY_MASKS[index]) & diagonal
+        return attackers
+
+    @staticmethod
+    def _bitboard_pins(board: BitboardChessBoard, king: int, own: int, enemy_offset: int) -> Dict[int, int]:
+        """The squares of pinned pieces, each mapped to the line it may still move along (pinner included)."""
+        bitboards = board.bitboards
+        occupied = board.occupied
+        queens = bitboards[enemy_offset + QUEEN_INDEX]
+        pins: Dict[int, int] = {}
+        rays: Tuple[SliderRay, ...]
+        for rays, sliders in (
+            (ROOK_RAY_MASKS[king], bitboards[enemy_offset + ROOK_INDEX] | queens),
+            (BISHOP_RAY_MASKS[king], bitboards[enemy_offset + BISHOP_INDEX] | queens),
+        ):
+            if not sliders:
+                continue
+            for ray, ascending, ray_masks in rays:
+                if not ray & sliders:
+                    continue
+                blockers = ray & occupied
+                first = (blockers & -blockers).bit_length() - 1 if ascending else blockers.bit_length() - 1
+                if not own >> first & 1:
+                    continue
+                beyond = ray_masks[first] & occupied
+                if not beyond:
+                    continue
+                second = (beyond & -beyond).bit_length() - 1 if ascending else beyond.bit_length() - 1
+                if sliders >> second & 1:
+                    pins[first] = BETWEEN_MASKS[king][second] | 1 << second
+        return pins
+
+    def _bitboard_legal_moves(self, board: BitboardChessBoard, color: Color) -> List[Tuple[Position, Position]]:
+        bitboards = board.bitboards
+        side = 0 if color == Color.WHITE else 1
+        offset = 6 * side
+        enemy_offset = 6 - offset
+        enemy = Color.BLACK if color == Color.WHITE else Color.WHITE
+        own = board.color_occupied[side]
+        occupied = board.occupied
+        not_own = ~own
+        moves: List[Tuple[Position, Position]] = []
+        king_bit = bitboards[offset + KING_INDEX]
+        if not king_bit:
+            return moves
+        king = king_bit.bit_length() - 1
+        king_pos = POSITIONS[king]
+
+        # The king may not step along a checking slider's line, so its own square is taken off the occupancy
+        without_king = occupied ^ king_bit
+        targets = KING_ATTACK_MASKS[king] & not_own
+        while targets:
+            low_bit = targets & -targets
+            targets ^= low_bit
+            target = low_bit.bit_length() - 1
+            if not self._bitboard_attackers(board, target, enemy, without_king):
+                moves.append((king_pos, POSITIONS[target]))
+        checkers = self._bitboard_attackers(board, king, enemy, occupied)
+        if checkers & (checkers - 1):
+            # Double check: only the king can move
+            return moves
+        if checkers:
+            # Capture the checker or block its line
+            allowed = checkers | BETWEEN_MASKS[king][checkers.bit_length() - 1]
+        else:
+            allowed = FULL_BOARD
+            moves.extend((king_pos, end) for end in self._castling_ends(Piece(PieceType.KING, color), king_pos))
+        pins = self._bitboard_pins(board, king, own, enemy_offset)
+
+        # A pinned knight can never stay on its pin line
+        knights = bitboards[offset + KNIGHT_INDEX]
+        while knights:
+            low_bit = knights & -knights
+            knights ^= low_bit
+            start = low_bit.bit_length() - 1
+            if start in pins:
+                continue
+            start_pos = POSITIONS[start]
+            moves.extend(
+                (start_pos, POSITIONS[target]) for target in _squares(KNIGHT_ATTACK_MASKS[start] & not_own & allowed)
+            )
+
+        queens = bitboards[offset + QUEEN_INDEX]
+        for sliders, with_straight, with_diagonal in (
+            (bitboards[offset + ROOK_INDEX], True, False),
+            (bitboards[offset + BISHOP_INDEX], False, True),
+            (queens, True, True),
+        ):
+            while sliders:
+                low_bit = sliders & -sliders
+                sliders ^= low_bit
+                start = low_bit.bit_length() - 1
+                reach = 0
+                if with_straight:
+                    reach |= slider_attacks(start, occupied, ROOK_RAY_MASKS[start])
+                if with_diagonal:
+                    reach |= slider_attacks(start, occupied, BISHOP_RAY_MASKS[start])
+                reach &= not_own & allowed & pins.get(start, FULL_BOARD)
+                start_pos = POSITIONS[start]
+                moves.extend((start_pos, POSITIONS[target]) for target in _squares(reach))
+
+        step = 8 * PAWN_DIRECTION[color]
+        start_row = PAWN_START_ROW[color]
+        empty = ~occupied
+        enemy_occupied = board.color_occupied[1 - side]
+        pawn_attacks = PAWN_ATTACK_MASKS[color]
+        en_passant = -1 if board.en_passant is None else square_index(board.en_passant)
+        pawns = bitboards[offset + PAWN_INDEX]
+        while pawns:
+            low_bit = pawns & -pawns
+            pawns ^= low_bit
+            start = low_bit.bit_length() - 1
+            start_pos = POSITIONS[start]
+            # Pawns never stand on the last rank, so one step forward is always on the board
+            forward = start + step
+            reach = pawn_attacks[start] & enemy_occupied
+            if empty >> forward & 1:
+                reach |= 1 << forward
+                if start >> 3 == start_row and empty >> (forward + step) & 1:
+                    reach |= 1 << (forward + step)
+            reach &= allowed & pins.get(start, FULL_BOARD)
+            moves.extend((start_pos, POSITIONS[target]) for target in _squares(reach))
+            if en_passant >= 0 and pawn_attacks[start] >> en_passant & 1:
+                # Two pawns leave the rank at once, so play it out on the masks: the king must not be attacked
+                # once the mover stands on the en passant square and the captured pawn is gone
+                captured_bit = 1 << (en_passant - step)
+                after = (occupied ^ low_bit ^ captured_bit) | 1 << en_passant
+                if not self._bitboard_attackers(board, king, enemy, after) & ~captured_bit:
+                    moves.append((start_pos, POSITIONS[en_passant]))
+        return moves
+
+
+def _squares(bitboard: int) -> List[int]:
+    """Indices of the set bits, lowest first; a list rather than iter_squares' generator for the hot loops."""
+    squares = []
+    while bitboard:
+        low_bit = bitboard & -bitboard
+        squares.append(low_bit.bit_length() - 1)
+        bitboard ^= low_bit
+    return squares
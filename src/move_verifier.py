@@ -1,14 +1,16 @@
 from typing import List
 
-from abs_chess_board import AbsChessBoard
+from src.abs_chess_board import AbsChessBoard
 from src.enums import PieceType, Color
-from src.piece import Piece
+from src.move_generator import MoveGenerator
+from src.piece import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, Piece
 from src.data_types import Position
 
 
 class MoveVerifier:
     def __init__(self, board: AbsChessBoard):
         self.board = board
+        self.move_generator = MoveGenerator(board)
 
     def is_final_rank_pawn(self, start_pos: Position, end_pos: Position) -> bool:
         x2, y2 = end_pos
@@ -16,153 +18,89 @@ class MoveVerifier:
         if piece.type != PieceType.PAWN:
             return False
         final_rank = 0 if piece.color == Color.BLACK else 7
-        return bool(y2 == final_rank)
+        return bool(x2 == final_rank)
 
     def get_all_valid_ends(self, start_pos: Position) -> List[Position]:
-        valid_ends = []
-        for i in range(8):
-            for j in range(8):
-                if self.is_valid_move(start_pos, (i, j)):
-                    valid_ends.append((i, j))
-        return valid_ends
+        ends: List[Position] = self.move_generator.legal_ends(start_pos)
+        return ends
 
     def is_valid_move(self, start_pos: Position, end_pos: Position) -> bool:
         piece = self.board.get_piece(start_pos)
-        if piece is None:
+        if piece is None or piece.color != self.board.turn:
             return False
-        # Check basic movement pattern validity
+        # Cheap rejections before generating: most illegal drags fail the pattern or are blocked
         if not self._is_valid_pattern(piece, start_pos, end_pos):
             return False
 
-        # Check if path is clear (for pieces that can't jump)
         if not self._is_path_clear(piece, start_pos, end_pos):
             return False
 
-        # Check if move would leave king in check
-        if self.would_leave_in_check(piece, start_pos, end_pos):
-            return False
-
-        return True
+        return end_pos in self.move_generator.legal_ends(start_pos)
 
     def _is_valid_pattern(self, piece: Piece, start_pos: Position, end_pos: Position) -> bool:
         x1, y1 = start_pos
         x2, y2 = end_pos
+        kind = piece.kind
 
         # Rook logic: moves horizontally or vertically
-        if piece.type == PieceType.ROOK:
+        if kind == ROOK:
             return bool(x1 == x2 or y1 == y2)
 
         # Bishop logic: moves diagonally (both x and y change equally)
-        elif piece.type == PieceType.BISHOP:
+        elif kind == BISHOP:
             return bool(abs(x2 - x1) == abs(y2 - y1))
 
         # Knight logic: moves in an "L" shape (2 squares in one direction, 1 in the other)
-        elif piece.type == PieceType.KNIGHT:
+        elif kind == KNIGHT:
             return bool((abs(x2 - x1) == 2 and abs(y2 - y1) == 1) or (abs(x2 - x1) == 1 and abs(y2 - y1) == 2))
 
         # Queen logic: combines the movement of both the Rook and the Bishop
-        elif piece.type == PieceType.QUEEN:
+        elif kind == QUEEN:
             return bool(x1 == x2 or y1 == y2 or abs(x2 - x1) == abs(y2 - y1))
 
-        # King logic: moves one square in any direction
-        elif piece.type == PieceType.KING:
-            return bool(abs(x2 - x1) <= 1 and abs(y2 - y1) <= 1)
+        # King logic: moves one square in any direction, or two along its rank when castling
+        elif kind == KING:
+            return bool((abs(x2 - x1) <= 1 and abs(y2 - y1) <= 1) or (x1 == x2 and abs(y2 - y1) == 2))
 
         # Pawn logic: moves forward one square, or two squares from its starting position; captures diagonally
-        elif piece.type == PieceType.PAWN:
-            # Pawn movement
-            if x1 == x2:
-                # Moving forward by 1 square
-                if y2 == y1 + 1 and piece.color == Color.WHITE:
-                    return True
-                elif y2 == y1 - 1 and piece.color == Color.BLACK:
-                    return True
-                # Moving forward by 2 squares from its starting position
-                elif y1 == 1 and y2 == 3 and piece.color == Color.WHITE:
-                    return True
-                elif y1 == 6 and y2 == 4 and piece.color == Color.BLACK:
-                    return True
-            # Pawn captures diagonally
-            else:
-                end_piece = self.board.get_piece(end_pos)
-                if abs(x2 - x1) != 1 or end_piece is None:
-                    return False
-                elif y2 == y1 + 1 and piece.color == Color.WHITE and end_piece.color == Color.BLACK:
-                    return True
-                elif y2 == y1 - 1 and piece.color == Color.BLACK and end_piece.color == Color.WHITE:
-                    return True
+        elif kind == PAWN:
+            # Pawn movement (positions are (row, column) and white advances towards row 7)
+            forward = 1 if piece.is_white else -1
+            if y1 == y2:
+                # Moving forward by 1 square, or by 2 squares from its starting position
+                return bool(x2 == x1 + forward or (x1 == (1 if piece.is_white else 6) and x2 == x1 + 2 * forward))
+            # Pawn captures diagonally, onto an enemy piece or the en passant square
+            end_piece = self.board.get_piece(end_pos)
+            if abs(y2 - y1) != 1 or x2 != x1 + forward:
+                return False
+            if end_piece is None:
+                return bool(end_pos == self.board.en_passant)
+            return bool(end_piece.is_white != piece.is_white)
 
         return False  # Default: False if no match found for the piece type
 
     def _is_path_clear(self, piece: Piece, start_pos: Position, end_pos: Position) -> bool:
         end_piece = self.board.get_piece(end_pos)
-        if end_piece is not None and (end_piece.color == piece.color or piece.type == PieceType.PAWN):
-            return False
         x1, y1 = start_pos
         x2, y2 = end_pos
-        if piece.type == PieceType.KNIGHT:
-            end_piece = self.board.get_piece(end_pos)
-            return end_piece is None or end_piece.color != piece.color
+        # Pawns only capture diagonally, so a piece in front of one blocks it
+        if end_piece is not None and (end_piece.is_white == piece.is_white or (piece.kind == PAWN and y1 == y2)):
+            return False
+        if piece.kind == KNIGHT:
+            return True
         x_dir = 1 if x1 < x2 else -1 if x1 > x2 else 0
         y_dir = 1 if y1 < y2 else -1 if y1 > y2 else 0
         x, y = x1 + x_dir, y1 + y_dir
-        while (x, y) != end_pos:
-            cur_piece = self.board.get_piece(Position(x, y))
-            if cur_piece is not None:
+        while x != x2 or y != y2:
+            if self.board.get_piece((x, y)) is not None:
                 return False
             x, y = x + x_dir, y + y_dir
         return True
 
     def would_leave_in_check(self, piece: Piece, start_pos: Position, end_pos: Position) -> bool:
-        end_piece = self.board.get_piece(end_pos)
-        self.board.move(start_pos, end_pos)
-        king_color = piece.color
-        self.is_king_checked(king_color)
-        self.board.revert_move(start_pos, end_pos, piece, end_piece)
-        return False
+        leaves_in_check: bool = self.move_generator.leaves_king_in_check(piece, start_pos, end_pos)
+        return leaves_in_check
 
     def is_king_checked(self, king_color: Color) -> bool:
-        king_position: Position = self.board.white_king_position\
-            if self.board.turn == Color.WHITE else self.board.black_king_position
-        for x_dir in range(-1, 2):
-            for y_dir in range(-1, 2):
-                if x_dir == 0 and y_dir == 0:
-                    continue
-                if not self._is_direction_safe(king_color, king_position, x_dir, y_dir):
-                    return True
-        return self._is_threatened_by_knight(king_color, king_position)
-
-    def _is_direction_safe(self, king_color: Color, king_position: Position, x_dir: int, y_dir: int) -> bool:
-        x, y = king_position[0] + x_dir, king_position[1] + y_dir
-        while 0 <= x <= 7 and 0 <= y <= 7:
-            cur_piece = self.board.get_piece(Position(x, y))
-            if cur_piece is None:
-                x += x_dir
-                y += y_dir
-            elif cur_piece.color != king_color:
-                return self._is_valid_pattern(cur_piece, Position(x, y), king_position)
-            else:
-                return True
-        return True
-
-    def _is_threatened_by_knight(self, king_color: Color, king_position: Position) -> bool:
-        knight_offsets = [(i, j) for i in [-2, -1, 1, 2] for j in [-2, -1, 1, 2] if abs(i) + abs(j) == 3]
-
-        # Get coordinates of the king
-        king_x, king_y = king_position
-
-        # Check all possible knight positions that could threaten the king
-        for offset_x, offset_y in knight_offsets:
-            x, y = king_x + offset_x, king_y + offset_y
-
-            # Check if position is within board boundaries
-            if 0 <= x <= 7 and 0 <= y <= 7:
-                piece = self.board.get_piece(Position(x, y))
-
-                # If there's a knight of the opposite color at this position,
-                # the king is threatened
-                if piece is not None and piece.type == PieceType.KNIGHT and piece.color != king_color:
-                    return True
-
-        # No threatening knights found
-        return False
+        is_checked: bool = self.move_generator.is_in_check(king_color)
+        return is_checked
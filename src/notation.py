@@ -0,0 +1,37 @@
+"""Letters, square names and UCI move names shared by the FEN and PGN codecs, perft and the opening book."""
+
+from typing import Dict
+
+from src.data_types import BoardMove, Position
+from src.enums import CastlingRight, PieceType
+
+FEN_PIECE_TYPES: Dict[str, PieceType] = {
+    "p": PieceType.PAWN,
+    "n": PieceType.KNIGHT,
+    "b": PieceType.BISHOP,
+    "r": PieceType.ROOK,
+    "q": PieceType.QUEEN,
+    "k": PieceType.KING,
+}
+FEN_PIECE_LETTERS: Dict[PieceType, str] = {piece_type: letter for letter, piece_type in FEN_PIECE_TYPES.items()}
+FEN_CASTLING: Dict[str, CastlingRight] = {
+    "K": CastlingRight.WHITE_KINGSIDE,
+    "Q": CastlingRight.WHITE_QUEENSIDE,
+    "k": CastlingRight.BLACK_KINGSIDE,
+    "q": CastlingRight.BLACK_QUEENSIDE,
+}
+
+
+def position_to_square_name(pos: Position) -> str:
+    return f"{chr(ord('a') + pos[1])}{pos[0] + 1}"
+
+
+def square_name_to_position(name: str) -> Position:
+    if len(name) != 2 or not "a" <= name[0] <= "h" or not "1" <= name[1] <= "8":
+        raise ValueError(f"'{name}' is not a valid square")
+    return int(name[1]) - 1, ord(name[0]) - ord("a")
+
+
+def move_to_uci(move: BoardMove) -> str:
+    promotion = FEN_PIECE_LETTERS[move.promotion] if move.promotion is not None else ""
+    return f"{position_to_square_name(move.start)}{position_to_square_name(move.end)}{promotion}"
@@ -0,0 +1,248 @@
+"""
+Opening book: the legal moves, check flag and most played replies of the positions a PGN corpus passes through in
+its first plies, built offline and memory-mapped by every worker.
+
+The game handler probes the book before validating a move, before the check and mate analysis that follows one
+and before an engine search, so the first dozen plies of most games need no move generation at all.
+
+Build a book and look a position up with::
+
+    python -m src.opening_book build games.pgn more_games.pgn --output book.bin --max-ply 24 --min-games 2
+    python -m src.opening_book probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+
+File layout (little-endian), with positions sorted by Zobrist key so that a lookup is a binary search over the
+key column:
+
+    header    magic, version, position count, move count (BOOK_HEADER)
+    keys      one uint64 Zobrist key per position
+    records   per position: offset of its moves, legal move count, reply count, flags (BOOK_RECORD)
+    moves     uint16 move records (Encoder.pack_move); a position's legal moves start with its book replies, most
+              played first
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import square_index
+from src.data_types import BoardMove, LegalMoveMap, Position
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.fen import START_FEN, board_from_fen
+from src.move_generator import MoveGenerator
+from src.notation import move_to_uci
+from src.pgn import PgnGame, move_from_san, read_pgn
+
+BOOK_MAGIC = b"CHBK"
+BOOK_VERSION = 1
+# magic, version, reserved, position count, move count
+BOOK_HEADER = struct.Struct("<4sHHII")
+# moves offset, legal move count, reply count, flags
+BOOK_RECORD = struct.Struct("<IHBB")
+IN_CHECK_FLAG = 0x1
+# Start and end squares of a move record, without the promotion
+MOVE_SQUARES_MASK = 0xFFF
+DEFAULT_MAX_PLY = 24
+# Replies kept per position, most played first
+MAX_REPLIES = 8
+
+
+class BookEntry(NamedTuple):
+    # Legal moves of the side to move as move records, book replies first
+    moves: memoryview
+    reply_count: int
+    # Whether the side to move is in check
+    in_check: bool
+
+    def has_move(self, start: Position, end: Position) -> bool:
+        """Whether some legal move (with any promotion) goes from start to end."""
+        squares = square_index(start) | square_index(end) << 6
+        return any(record & MOVE_SQUARES_MASK == squares for record in self.moves)
+
+    @property
+    def is_checkmate(self) -> bool:
+        return self.in_check and not self.moves
+
+    @property
+    def legal_move_map(self) -> LegalMoveMap:
+        """The legal moves in the form MoveGenerator.legal_move_map gives them."""
+        move_map: Dict[int, int] = {}
+        for record in self.moves:
+            start = record & 0x3F
+            move_map[start] = move_map.get(start, 0) | 1 << (record >> 6 & 0x3F)
+        return move_map
+
+    @property
+    def replies(self) -> List[BoardMove]:
+        return [Decoder.unpack_move(record) for record in self.moves[: self.reply_count]]
+
+
+class OpeningBook:
+    """Read-only view of a book file; the pages are shared by every process that maps the same file."""
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("opening books are little-endian and can only be mapped on little-endian hosts")
+        self.path = path
+        with open(path, "rb") as book_file:
+            self.mapping = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, move_count = BOOK_HEADER.unpack_from(self.mapping)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.mapping.close()
+            raise ValueError(f"'{path}' is not a version {BOOK_VERSION} opening book")
+        view = memoryview(self.mapping)
+        keys_start = BOOK_HEADER.size
+        records_start = keys_start + 8 * count
+        moves_start = records_start + BOOK_RECORD.size * count
+        self.keys = view[keys_start:records_start].cast("Q")
+        self.records = view[records_start:moves_start]
+        moves_end = moves_start + 2 * move_count
+        self.moves = view[moves_start:moves_end].cast("H")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def probe(self, board: AbsChessBoard) -> Optional[BookEntry]:
+        """The book's entry for the board's position, None if the book doesn't have it."""
+        key: int = board.zobrist_key
+        index = bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, legal_count, reply_count, flags = BOOK_RECORD.unpack_from(self.records, index * BOOK_RECORD.size)
+        moves_end = offset + legal_count
+        return BookEntry(self.moves[offset:moves_end], reply_count, bool(flags & IN_CHECK_FLAG))
+
+    def close(self) -> None:
+        for view in (self.keys, self.records, self.moves):
+            view.release()
+        self.mapping.close()
+
+
+class BookPosition:
+    __slots__ = ("legal_moves", "in_check", "games", "replies")
+
+    def __init__(self, legal_moves: List[int], in_check: bool) -> None:
+        self.legal_moves = legal_moves
+        self.in_check = in_check
+        # Games that reached the position, and how often each move was played from it
+        self.games = 0
+        self.replies: Counter[int] = Counter()
+
+
+class BookBuilder:
+    def __init__(self, max_ply: int = DEFAULT_MAX_PLY) -> None:
+        self.max_ply = max_ply
+        self.positions: Dict[int, BookPosition] = {}
+        self.games = 0
+        self.skipped_games = 0
+
+    def add_game(self, game: PgnGame) -> None:
+        """Add the game's first max_ply plies; games from a custom position or with a bad move are cut short."""
+        if game.initial_fen != START_FEN:
+            self.skipped_games += 1
+            return
+        self.games += 1
+        board = board_from_fen(START_FEN)
+        move_generator = MoveGenerator(board, use_cache=False)
+        seen = set()
+        for san in game.moves[: self.max_ply]:
+            try:
+                move = move_from_san(board, san)
+            except ValueError:
+                self.skipped_games += 1
+                return
+            key: int = board.zobrist_key
+            position = self.positions.get(key)
+            if position is None:
+                legal_moves = [Encoder.pack_move(legal) for legal in move_generator.legal_board_moves(board.turn)]
+                position = self.positions[key] = BookPosition(legal_moves, move_generator.is_in_check(board.turn))
+            if key not in seen:
+                # Transpositions within a game count once
+                seen.add(key)
+                position.games += 1
+            position.replies[Encoder.pack_move(move)] += 1
+            board.make_move(move)
+
+    def add_games(self, games: Iterable[PgnGame]) -> None:
+        for game in games:
+            self.add_game(game)
+
+    def write(self, path: str, min_games: int = 1) -> int:
+        """Write the positions reached by at least min_games games; returns how many were written."""
+        keys = array("Q")
+        records = bytearray()
+        moves = array("H")
+        for key in sorted(self.positions):
+            position = self.positions[key]
+            if position.games < min_games:
+                continue
+            replies = [move for move, _ in position.replies.most_common(MAX_REPLIES)]
+            reply_set = set(replies)
+            keys.append(key)
+            records += BOOK_RECORD.pack(
+                len(moves), len(position.legal_moves), len(replies), IN_CHECK_FLAG if position.in_check else 0
+            )
+            moves.extend(replies + [move for move in position.legal_moves if move not in reply_set])
+        if sys.byteorder != "little":
+            keys.byteswap()
+            moves.byteswap()
+        with open(path, "wb") as book_file:
+            book_file.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, 0, len(keys), len(moves)))
+            book_file.write(keys.tobytes())
+            book_file.write(records)
+            book_file.write(moves.tobytes())
+        return len(keys)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files, or look a position up.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn_files", nargs="+", help="PGN files to read the games from")
+    build.add_argument("--output", required=True, help="book file to write")
+    build.add_argument(
+        "--max-ply", type=int, default=DEFAULT_MAX_PLY, help=f"plies of each game to add (default: {DEFAULT_MAX_PLY})"
+    )
+    build.add_argument("--min-games", type=int, default=2, help="games a position needs to be kept (default: 2)")
+    probe = commands.add_parser("probe", help="print a book's entry for a position")
+    probe.add_argument("book", help="book file")
+    probe.add_argument("--fen", default=START_FEN, help="position to look up (default: the starting position)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.command == "build":
+        builder = BookBuilder(args.max_ply)
+        for pgn_path in args.pgn_files:
+            with open(pgn_path, encoding="utf-8", errors="replace") as pgn_file:
+                builder.add_games(read_pgn(pgn_file))
+        written = builder.write(args.output, args.min_games)
+        print(
+            f"{builder.games} games ({builder.skipped_games} skipped or cut short), {len(builder.positions)} "
+            f"positions, {written} written to {args.output}"
+        )
+        return 0
+
+    book = OpeningBook(args.book)
+    entry = book.probe(board_from_fen(args.fen))
+    if entry is None:
+        print("not in book")
+        return 1
+    print(f"in check: {entry.in_check}, legal moves: {len(entry.moves)}")
+    print("replies:", " ".join(move_to_uci(move) for move in entry.replies) or "-")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a fixed depth and compare against known counts.
+
+Run from the repository root, for example::
+
+    python -m src.perft --depth 3
+    python -m src.perft --position kiwipete --depth 2 --divide
+    python -m src.perft --depth 3 --output perft_output.json --compare perft_baseline.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.fen import START_FEN, board_from_fen
+from src.move_generator import MoveGenerator
+from src.notation import move_to_uci
+
+
+class PerftPosition(NamedTuple):
+    name: str
+    fen: str
+    # expected[i] is the node count at depth i + 1
+    expected: List[int]
+
+
+# Standard test positions from the chess programming community with their published node counts.
+PERFT_POSITIONS: Dict[str, PerftPosition] = {
+    position.name: position
+    for position in [
+        PerftPosition("startpos", START_FEN, [20, 400, 8902, 197281, 4865609]),
+        PerftPosition(
+            "kiwipete",
+            "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+            [48, 2039, 97862, 4085603],
+        ),
+        PerftPosition("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+        PerftPosition(
+            "position4",
+            "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+            [6, 264, 9467, 422333],
+        ),
+        PerftPosition(
+            "position5",
+            "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+            [44, 1486, 62379, 2103487],
+        ),
+        PerftPosition(
+            "position6",
+            "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+            [46, 2079, 89890, 3894594],
+        ),
+    ]
+}
+
+BOARD_CLASSES: Dict[str, Type[AbsChessBoard]] = {"matrix": ChessBoard, "bitboard": BitboardChessBoard}
+
+
+def perft(board: AbsChessBoard, depth: int, move_generator: Optional[MoveGenerator] = None) -> int:
+    """Number of leaf nodes reachable from board in exactly depth plies."""
+    if depth <= 0:
+        return 1
+    if move_generator is None:
+        move_generator = MoveGenerator(board, use_cache=False)
+    moves = move_generator.legal_board_moves(board.turn)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1, move_generator)
+        board.unmake_move()
+    return nodes
+
+
+def divide(board: AbsChessBoard, depth: int) -> Dict[str, int]:
+    """Leaf counts per root move, the usual way to find which move a generator gets wrong."""
+    move_generator = MoveGenerator(board, use_cache=False)
+    counts = {}
+    for move in move_generator.legal_board_moves(board.turn):
+        board.make_move(move)
+        counts[move_to_uci(move)] = perft(board, depth - 1, move_generator)
+        board.unmake_move()
+    return counts
+
+
+def run_position(
+    name: str, fen: str, depth: int, board_name: str, expected: Optional[int] = None, with_divide: bool = False
+) -> Dict[str, Any]:
+    board = board_from_fen(fen, BOARD_CLASSES[board_name])
+    start = time.perf_counter()
+    if with_divide:
+        counts = divide(board, depth)
+        nodes = sum(counts.values())
+    else:
+        counts = {}
+        nodes = perft(board, depth)
+    seconds = time.perf_counter() - start
+    result: Dict[str, Any] = {
+        "name": name,
+        "fen": fen,
+        "depth": depth,
+        "board": board_name,
+        "nodes": nodes,
+        "expected": expected,
+        "passed": expected is None or nodes == expected,
+        "seconds": round(seconds, 6),
+        "nodes_per_second": round(nodes / seconds) if seconds > 0 else None,
+    }
+    if with_divide:
+        result["divide"] = counts
+    return result
+
+
+def compare_results(results: List[Dict[str, Any]], previous_path: str) -> None:
+    """Annotate results with the speed of the matching run in a previous output file."""
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    previous_by_key = {(run["name"], run["depth"], run["board"]): run for run in previous.get("results", [])}
+    for result in results:
+        match = previous_by_key.get((result["name"], result["depth"], result["board"]))
+        if match is None or not match.get("nodes_per_second") or not result["nodes_per_second"]:
+            continue
+        result["previous_nodes_per_second"] = match["nodes_per_second"]
+        result["speedup"] = round(result["nodes_per_second"] / match["nodes_per_second"], 3)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes and report nodes/sec.")
+    parser.add_argument("--depth", type=int, default=3, help="search depth in plies (default: 3)")
+    parser.add_argument(
+        "--position",
+        default="all",
+        choices=["all", *PERFT_POSITIONS.keys()],
+        help="standard test position to run (default: all)",
+    )
+    parser.add_argument("--fen", help="run a custom FEN instead of the standard positions")
+    parser.add_argument("--divide", action="store_true", help="report leaf counts per root move")
+    parser.add_argument("--board", default="matrix", choices=list(BOARD_CLASSES), help="board implementation")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="previous JSON output to compare nodes/sec against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.fen:
+        runs = [("custom", args.fen, None)]
+    else:
+        positions = PERFT_POSITIONS.values() if args.position == "all" else [PERFT_POSITIONS[args.position]]
+        runs = [
+            (
+                position.name,
+                position.fen,
+                position.expected[args.depth - 1] if args.depth <= len(position.expected) else None,
+            )
+            for position in positions
+        ]
+
+    results = []
+    for name, fen, expected in runs:
+        result = run_position(name, fen, args.depth, args.board, expected, args.divide)
+        results.append(result)
+        for move, count in result.get("divide", {}).items():
+            print(f"  {move}: {count}")
+        status = "-" if expected is None else "ok" if result["passed"] else "FAIL"
+        print(
+            f"{name:<10} depth {args.depth} nodes {result['nodes']:>10} expected {str(expected):>10} {status:<4} "
+            f"{result['seconds']:>8.3f}s {result['nodes_per_second'] or 0:>9} nodes/s"
+        )
+
+    if args.compare:
+        compare_results(results, args.compare)
+        for result in results:
+            if "speedup" in result:
+                print(f"{result['name']:<10} {result['speedup']:.3f}x vs {args.compare}")
+
+    if args.output:
+        report = {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    return 0 if all(result["passed"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
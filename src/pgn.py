@@ -0,0 +1,226 @@
+"""
+PGN import and export. Reading yields tag pairs and the main line of each game as SAN moves; comments, NAGs and
+variations are skipped. Both directions are generators over lines, so a corpus of any size streams through in
+constant memory::
+
+    with open("games.pgn") as pgn_file, open("copy.pgn", "w") as copy_file:
+        copy_file.writelines(write_pgn(game for game, board in replay_pgn(read_pgn(pgn_file))))
+
+SAN is resolved against the legal moves of the position, so a game is only as good as its moves: move_from_san
+raises ValueError for anything that is not exactly one legal move.
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from src.abs_chess_board import AbsChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import BoardMove
+from src.enums import GameResult, PieceType
+from src.fen import START_FEN, board_from_fen
+from src.move_generator import MoveGenerator
+from src.notation import FEN_PIECE_LETTERS, FEN_PIECE_TYPES, position_to_square_name, square_name_to_position
+
+GAME_RESULTS = tuple(str(result) for result in GameResult)
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+# Comments, NAGs, move numbers ("12." or "12...") and everything else, one token per match
+MOVETEXT_TOKEN_PATTERN = re.compile(r"\{[^}]*\}?|;.*|\$\d+|\d+\.+|[()]|[^\s(){};$]+")
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?[+#]?[!?]*$")
+CASTLING_SAN = {"O-O": 2, "0-0": 2, "O-O-O": -2, "0-0-0": -2}
+# Written before any other tags, in this order, as PGN export format asks
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+MOVETEXT_WIDTH = 80
+
+
+class PgnGame(NamedTuple):
+    tags: Dict[str, str]
+    # Main line in SAN, without move numbers or annotations
+    moves: List[str]
+    result: str
+
+    @property
+    def initial_fen(self) -> str:
+        fen: str = self.tags.get("FEN", START_FEN)
+        return fen
+
+
+def read_pgn(lines: Iterable[str]) -> Iterator[PgnGame]:
+    """Games in PGN text, read one line at a time so that corpora of any size stream through."""
+    tags: Dict[str, str] = {}
+    moves: List[str] = []
+    variation_depth = 0
+    in_comment = False
+    for line in lines:
+        if in_comment:
+            if "}" not in line:
+                continue
+            comment_end = line.index("}") + 1
+            line = line[comment_end:]
+            in_comment = False
+        stripped = line.strip()
+        tag = TAG_PATTERN.match(stripped) if variation_depth == 0 else None
+        if tag is not None:
+            if moves:
+                # A game without a result token before the next tag section
+                yield PgnGame(tags, moves, "*")
+                tags, moves = {}, []
+            tags[tag.group(1)] = tag.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            continue
+        for token in MOVETEXT_TOKEN_PATTERN.findall(stripped):
+            if token.startswith("{"):
+                in_comment = not token.endswith("}")
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth or token[0] in ";$" or token[0].isdigit() and token.endswith("."):
+                continue
+            elif token in GAME_RESULTS:
+                yield PgnGame(tags, moves, token)
+                tags, moves = {}, []
+            else:
+                moves.append(token)
+    if tags or moves:
+        yield PgnGame(tags, moves, "*")
+
+
+def move_from_san(board: AbsChessBoard, san: str) -> BoardMove:
+    """The legal move of the side to move that san names."""
+    candidates = MoveGenerator(board).legal_board_moves(board.turn)
+    castling = CASTLING_SAN.get(san.rstrip("+#!?"))
+    if castling is not None:
+        matches = [
+            move
+            for move in candidates
+            if board.get_piece(move.start).type == PieceType.KING and move.end[1] - move.start[1] == castling
+        ]
+    else:
+        parsed = SAN_PATTERN.match(san)
+        if parsed is None:
+            raise ValueError(f"'{san}' is not a valid SAN move")
+        piece_letter, file, rank, target, promotion_letter = parsed.groups()
+        piece_type = FEN_PIECE_TYPES[piece_letter.lower()] if piece_letter else PieceType.PAWN
+        end = square_name_to_position(target)
+        promotion = FEN_PIECE_TYPES[promotion_letter.lower()] if promotion_letter else None
+        matches = [
+            move
+            for move in candidates
+            if move.end == end
+            and move.promotion == promotion
+            and board.get_piece(move.start).type == piece_type
+            and (file is None or move.start[1] == ord(file) - ord("a"))
+            and (rank is None or move.start[0] == int(rank) - 1)
+        ]
+    if len(matches) != 1:
+        raise ValueError(f"'{san}' is {'ambiguous' if matches else 'not a legal move'} here")
+    return matches[0]
+
+
+def move_to_san(board: AbsChessBoard, move: BoardMove) -> str:
+    """SAN of a legal move of the side to move, with the check or mate suffix."""
+    move_generator = MoveGenerator(board)
+    piece = board.get_piece(move.start)
+    if piece.type == PieceType.KING and abs(move.end[1] - move.start[1]) == 2:
+        san = "O-O" if move.end[1] > move.start[1] else "O-O-O"
+    else:
+        # A pawn changing file always captures, en passant included
+        is_capture = board.get_piece(move.end) is not None or (
+            piece.type == PieceType.PAWN and move.start[1] != move.end[1]
+        )
+        target = position_to_square_name(move.end)
+        if piece.type == PieceType.PAWN:
+            san = (position_to_square_name(move.start)[0] + "x" if is_capture else "") + target
+            if move.promotion is not None:
+                san += "=" + FEN_PIECE_LETTERS[move.promotion].upper()
+        else:
+            rivals = [
+                start
+                for start, end in move_generator.legal_moves(board.turn)
+                if end == move.end and start != move.start and board.get_piece(start).type == piece.type
+            ]
+            square = position_to_square_name(move.start)
+            if not rivals:
+                disambiguation = ""
+            elif all(start[1] != move.start[1] for start in rivals):
+                disambiguation = square[0]
+            elif all(start[0] != move.start[0] for start in rivals):
+                disambiguation = square[1]
+            else:
+                disambiguation = square
+            san = FEN_PIECE_LETTERS[piece.type].upper() + disambiguation + ("x" if is_capture else "") + target
+    board.make_move(move)
+    try:
+        opponent = board.turn
+        if move_generator.is_in_check(opponent):
+            san += "+" if move_generator.has_legal_move(opponent) else "#"
+    finally:
+        board.unmake_move()
+    return san
+
+
+def pgn_game(
+    initial_fen: str,
+    moves: Iterable[BoardMove],
+    result: GameResult = GameResult.UNFINISHED,
+    tags: Optional[Dict[str, str]] = None,
+) -> PgnGame:
+    """A game played from initial_fen, ready for write_pgn; games from a custom position get SetUp and FEN tags."""
+    board = board_from_fen(initial_fen)
+    sans = []
+    for move in moves:
+        sans.append(move_to_san(board, move))
+        board.make_move(move)
+    game_tags = dict(tags or {})
+    game_tags["Result"] = str(result)
+    if initial_fen != START_FEN:
+        game_tags.update(SetUp="1", FEN=initial_fen)
+    return PgnGame(game_tags, sans, str(result))
+
+
+def replay_pgn(
+    games: Iterable[PgnGame], board_class: Type[AbsChessBoard] = ChessBoard
+) -> Iterator[Tuple[PgnGame, AbsChessBoard]]:
+    """Each game with the board of its final position; raises ValueError at the first game with an invalid move."""
+    for game in games:
+        board = board_from_fen(game.initial_fen, board_class)
+        for san in game.moves:
+            board.make_move(move_from_san(board, san))
+        yield game, board
+
+
+def write_pgn(games: Iterable[PgnGame]) -> Iterator[str]:
+    """PGN text of each game, as newline-terminated lines; pass the result to a file's writelines."""
+    for game in games:
+        tags = {name: "?" for name in SEVEN_TAG_ROSTER}
+        tags.update(game.tags)
+        tags["Result"] = game.result
+        for name, value in tags.items():
+            escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+            yield f'[{name} "{escaped}"]\n'
+        yield "\n"
+
+        fields = game.initial_fen.split()
+        black_first = len(fields) > 1 and fields[1] == "b"
+        move_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        tokens = []
+        for ply, san in enumerate(game.moves):
+            is_white_move = (ply % 2 == 0) != black_first
+            # A move number stays on the line of its move
+            if is_white_move:
+                tokens.append(f"{move_number}. {san}")
+            elif ply == 0:
+                tokens.append(f"{move_number}... {san}")
+            else:
+                tokens.append(san)
+            if not is_white_move:
+                move_number += 1
+        tokens.append(game.result)
+
+        line = ""
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > MOVETEXT_WIDTH:
+                yield line + "\n"
+                line = token
+            else:
+                line = f"{line} {token}" if line else token
+        yield line + "\n\n"
@@ -1,8 +1,67 @@
-from enums import PieceType, Color
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.enums import PieceType, Color
+from src.wire_format import BLACK_PIECE_BIT
+
+# Integer piece kinds (the PieceType values), for comparisons on hot paths
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = (piece_type.value for piece_type in PieceType)
 
 
 class Piece:
-    def __init__(self, piece_type: PieceType, color: Color):
-        self.type = piece_type
-        self.color = color
-        self.has_moved = False
+    """
+    Immutable piece; there is exactly one instance per (type, color), so Piece(type, color) returns the shared
+    flyweight instead of allocating.
+
+    Besides the enums each piece carries its integer kind (the PieceType value), is_white and code, the wire format
+    square code. Whether a piece has moved belongs to the square it stands on and is tracked by the board
+    (AbsChessBoard.moved).
+    """
+
+    __slots__ = ("type", "color", "kind", "is_white", "code")
+
+    type: PieceType
+    color: Color
+    kind: int
+    is_white: bool
+    code: int
+
+    def __new__(cls, piece_type: PieceType, color: Color) -> "Piece":
+        return PIECES[(piece_type, color)]
+
+    @staticmethod
+    def from_code(code: int) -> Optional["Piece"]:
+        """The piece with the given wire format square code, None for an empty square (code 0)."""
+        return PIECES_BY_CODE[code]
+
+    @classmethod
+    def _intern(cls, piece_type: PieceType, color: Color) -> "Piece":
+        piece = object.__new__(cls)
+        for name, value in (
+            ("type", piece_type),
+            ("color", color),
+            ("kind", piece_type.value),
+            ("is_white", color == Color.WHITE),
+            ("code", piece_type.value | (BLACK_PIECE_BIT if color == Color.BLACK else 0)),
+        ):
+            object.__setattr__(piece, name, value)
+        return piece
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Piece is immutable, cannot set '{name}'")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Unpickle and copy to the shared instance
+        return Piece, (self.type, self.color)
+
+    def __repr__(self) -> str:
+        return f"Piece({self.type!s}, {self.color!s})"
+
+
+PIECES: Dict[Tuple[PieceType, Color], Piece] = {
+    (piece_type, color): Piece._intern(piece_type, color) for color in Color for piece_type in PieceType
+}
+# Indexed by wire format square code
+PIECES_BY_CODE: List[Optional[Piece]] = [None] * (2 * BLACK_PIECE_BIT)
+for _piece in PIECES.values():
+    PIECES_BY_CODE[_piece.code] = _piece
+del _piece
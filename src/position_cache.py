@@ -0,0 +1,46 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class PositionCache:
+    """
+    Bounded LRU cache for results that depend only on a position, keyed by Zobrist key and query.
+
+    Values must be immutable (tuples, bools) since one entry is shared by every game in the process.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "max_entries": self.max_entries}
+
+
+# Shared by every game handled by this process.
+POSITION_CACHE = PositionCache(int(os.environ.get("CHESS_POSITION_CACHE_SIZE", DEFAULT_MAX_ENTRIES)))
@@ -0,0 +1,142 @@
+"""
+Opt-in sampling profiler for individual games, for finding out why one game is slow without profiling the whole
+worker.
+
+A daemon thread wakes every interval seconds while at least one game is profiled and takes the stack of the event
+loop thread. A sample counts when the stack runs through one of the entry points (the game handler methods that
+handle a message or look for mate) on behalf of a profiled handler; the stack from that entry point down is added
+to the handler's game. Waiting on the socket or on a pool costs nothing, so the counts are the CPU time each code
+path took on the loop. The loop thread only hands the GIL over every sys.getswitchinterval() seconds, so the switch
+interval is lowered to the sampling interval while the thread runs; otherwise any call shorter than the default 5ms
+would go unseen.
+
+Samples are written in the collapsed-stack format (one "outer;inner;leaf count" line per distinct stack) to
+<directory>/<game id>.collapsed, ready for flamegraph.pl or speedscope, when the game stops being profiled; its
+counts are dropped once written.
+"""
+
+import os
+import re
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Callable, DefaultDict, Dict, Iterable, List, Optional
+
+# Seconds between samples; each one holds the GIL for a stack walk of a few microseconds
+DEFAULT_INTERVAL = 0.005
+# Characters allowed in profile file names, anything else becomes "_"
+UNSAFE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def profile_name(subject: Any) -> str:
+    """File name stem of a profiled object: its game id, or the object id until it has one."""
+    game_id = getattr(subject, "game_id", None)
+    return UNSAFE_NAME_CHARACTERS.sub("_", str(game_id)) if game_id else f"connection-{id(subject):x}"
+
+
+def frame_label(code: CodeType) -> str:
+    return f"{Path(code.co_filename).stem}.{code.co_qualname}"
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        directory: str,
+        entry_points: Iterable[Callable[..., Any]],
+        interval: float = DEFAULT_INTERVAL,
+    ) -> None:
+        self.directory = Path(directory)
+        self.entry_codes = frozenset(entry_point.__code__ for entry_point in entry_points)
+        self.interval = interval
+        # Profiled objects by id, and the thread running them (the event loop's)
+        self.subjects: Dict[int, Any] = {}
+        self.thread_id: Optional[int] = None
+        # Sample counts per profiled object id and collapsed stack
+        self.samples: DefaultDict[int, DefaultDict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+        # Set to end the running sampler thread; each thread gets its own
+        self.wake = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.switch_interval = sys.getswitchinterval()
+
+    def is_profiling(self, subject: Any) -> bool:
+        return id(subject) in self.subjects
+
+    def start(self, subject: Any) -> None:
+        """Profile subject; call from the thread that runs it."""
+        with self.lock:
+            self.subjects[id(subject)] = subject
+            self.thread_id = threading.get_ident()
+            if self.thread is None:
+                self.switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, self.switch_interval))
+                self.wake = threading.Event()
+                self.thread = threading.Thread(target=self._run, args=(self.wake,), name="game-profiler", daemon=True)
+                self.thread.start()
+
+    def stop(self, subject: Any) -> None:
+        """
+        Stop profiling subject and write its profile. This joins the sampler thread when it was the last profiled
+        object and writes a file, so an event loop should call it through asyncio.to_thread.
+        """
+        with self.lock:
+            if self.subjects.pop(id(subject), None) is None:
+                return
+            stacks: Dict[str, int] = self.samples.pop(id(subject), {})
+            thread = self.thread if not self.subjects else None
+            if thread is not None:
+                self.thread = None
+                self.wake.set()
+        if thread is not None:
+            thread.join()
+            with self.lock:
+                # Unless another game started profiling meanwhile
+                if self.thread is None:
+                    sys.setswitchinterval(self.switch_interval)
+        self._write(profile_name(subject), stacks)
+
+    def flush(self) -> None:
+        """Write the profiles of the games still being profiled, replacing earlier files."""
+        with self.lock:
+            profiles = [
+                (profile_name(self.subjects[key]), dict(stacks))
+                for key, stacks in self.samples.items()
+                if key in self.subjects
+            ]
+        for name, stacks in profiles:
+            self._write(name, stacks)
+
+    def _write(self, name: str, stacks: Dict[str, int]) -> None:
+        if not stacks:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}.collapsed"
+        temporary_path = path.with_suffix(".tmp")
+        temporary_path.write_text("".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())))
+        os.replace(temporary_path, path)
+
+    def _run(self, wake: threading.Event) -> None:
+        while not wake.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        frame: Optional[FrameType] = sys._current_frames().get(self.thread_id) if self.thread_id else None
+        stack: List[FrameType] = []
+        entry_depth = -1
+        while frame is not None:
+            stack.append(frame)
+            if frame.f_code in self.entry_codes:
+                entry_depth = len(stack)
+            frame = frame.f_back
+        if entry_depth < 0:
+            return
+        key = id(stack[entry_depth - 1].f_locals.get("self"))
+        if key not in self.subjects:
+            return
+        collapsed = ";".join(frame_label(frame.f_code) for frame in reversed(stack[:entry_depth]))
+        with self.lock:
+            # stop may have taken the subject's counts since the check above
+            if key in self.subjects:
+                self.samples[key][collapsed] += 1
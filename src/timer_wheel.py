@@ -0,0 +1,111 @@
+"""
+Hierarchical timer wheel: one per worker, holding the deadline of every live game so that games need no task or
+sleep of their own.
+
+Time is cut into ticks of resolution seconds. Level 0 has a slot per tick for the next WHEEL_SLOTS ticks, level 1 a
+slot per WHEEL_SLOTS ticks for the next WHEEL_SLOTS ** 2, and so on. A timer goes in the slot of the lowest level
+that reaches its expiry; whenever the ticks of a level wrap around, the next slot of the level above is emptied
+into the levels below. Each tick therefore runs only the timers due in one level 0 slot, and every timer is moved
+at most once per level, so the work per tick doesn't depend on how many timers are waiting. Scheduling and
+cancelling are a set add and discard. With the default 20ms resolution and four levels, timers can be set up to
+about 93 hours ahead; later ones are held at the top level until they come into range.
+
+Timers fire at most one tick late and never early. Callbacks run on the event loop, so they must be quick and not
+raise; start tasks from them for anything that needs to await.
+"""
+
+import asyncio
+import math
+import time
+from typing import Callable, List, Optional, Set
+
+# Slots per level, as a power of two
+WHEEL_BITS = 6
+WHEEL_SLOTS = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SLOTS - 1
+WHEEL_LEVELS = 4
+DEFAULT_RESOLUTION = 0.02
+
+
+class Timer:
+    __slots__ = ("expires", "callback", "slot")
+
+    def __init__(self, expires: int, callback: Callable[[], None]) -> None:
+        # Tick on which the timer fires
+        self.expires = expires
+        self.callback = callback
+        # Slot holding the timer, None once it fired or was cancelled
+        self.slot: Optional[Set["Timer"]] = None
+
+    def cancel(self) -> None:
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+
+
+class TimerWheel:
+    def __init__(self, resolution: float = DEFAULT_RESOLUTION, levels: int = WHEEL_LEVELS) -> None:
+        self.resolution = resolution
+        self.levels = levels
+        self.wheels: List[List[Set[Timer]]] = [[set() for _ in range(WHEEL_SLOTS)] for _ in range(levels)]
+        # Ticks run so far, and the monotonic time of tick 0
+        self.tick = 0
+        self.started_at = time.monotonic()
+        self.task: Optional[asyncio.Task[None]] = None
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> Timer:
+        """Call callback once the monotonic clock reaches when; cancel the returned timer to call it off."""
+        expires = max(math.ceil((when - self.started_at) / self.resolution), self.tick + 1)
+        timer = Timer(expires, callback)
+        self._place(timer)
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def advance(self) -> None:
+        """Run the next tick: move timers down from the levels that wrap around, then fire those due."""
+        self.tick += 1
+        for level in range(self.levels - 1, 0, -1):
+            if self.tick & ((1 << WHEEL_BITS * level) - 1) == 0:
+                slot = self.wheels[level][self.tick >> WHEEL_BITS * level & WHEEL_MASK]
+                cascading = list(slot)
+                slot.clear()
+                for timer in cascading:
+                    self._place(timer)
+        slot = self.wheels[0][self.tick & WHEEL_MASK]
+        due = list(slot)
+        slot.clear()
+        for timer in due:
+            timer.slot = None
+            timer.callback()
+
+    def start(self) -> None:
+        """Start ticking on the running event loop."""
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def __len__(self) -> int:
+        return sum(len(slot) for wheel in self.wheels for slot in wheel)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.resolution)
+            # Catch up on ticks missed while the loop was busy
+            target = int((time.monotonic() - self.started_at) / self.resolution)
+            while self.tick < target:
+                self.advance()
+
+    def _place(self, timer: Timer) -> None:
+        # Timers beyond the top level's reach wait in its furthest slot and are placed again from there
+        expires = min(timer.expires, self.tick + (1 << WHEEL_BITS * self.levels) - 1)
+        ticks = max(expires - self.tick, 0)
+        level = min((ticks.bit_length() - 1) // WHEEL_BITS if ticks else 0, self.levels - 1)
+        slot = self.wheels[level][expires >> WHEEL_BITS * level & WHEEL_MASK]
+        slot.add(timer)
+        timer.slot = slot
@@ -0,0 +1,44 @@
+"""
+Layout of the binary board frame a client can negotiate in place of JSON.
+
+Every frame starts with a 9-byte header::
+
+    byte 0      format version (BINARY_FRAME_VERSION)
+    byte 1      MessageType value
+    byte 2      flags: FLAG_BLACK_TO_MOVE | FLAG_WHITE_CHECKED | FLAG_BLACK_CHECKED | FLAG_DELTA | FLAG_LEGAL_MOVES
+    byte 3      castling rights (CastlingRight bitmask)
+    byte 4      en passant square index (row * 8 + column), NO_SQUARE when there is none
+    bytes 5-8   sequence number, little endian
+
+A snapshot frame (FLAG_DELTA clear) continues with the 32-byte packed board, one nibble per square,
+square i in byte i // 2 (low nibble for even i).
+
+A delta frame (FLAG_DELTA set) continues with a count byte and then one (square index, square code) byte pair
+per changed square.
+
+When FLAG_LEGAL_MOVES is set, either kind of frame ends with the legal moves of the side to move: a count byte
+and then per start square that has legal moves its index and a little-endian 64-bit mask of end squares (bit i
+for square index i), LEGAL_MOVE_ENTRY.
+
+A square code is 0 when empty, otherwise the PieceType value, plus BLACK_PIECE_BIT for black pieces.
+"""
+
+import struct
+
+BINARY_FRAME_VERSION = 2
+
+HEADER = struct.Struct("<BBBBBI")
+PACKED_BOARD_SIZE = 32
+FRAME_SIZE = HEADER.size + PACKED_BOARD_SIZE
+DELTA_CHANGE_SIZE = 2
+# start square index, end squares bitmask
+LEGAL_MOVE_ENTRY = struct.Struct("<BQ")
+
+FLAG_BLACK_TO_MOVE = 1
+FLAG_WHITE_CHECKED = 2
+FLAG_BLACK_CHECKED = 4
+FLAG_DELTA = 8
+FLAG_LEGAL_MOVES = 16
+
+NO_SQUARE = 0xFF
+BLACK_PIECE_BIT = 8
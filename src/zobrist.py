@@ -0,0 +1,52 @@
+import random
+from typing import List, Optional
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import POSITIONS
+from src.data_types import Position
+from src.enums import Color, PieceType
+from src.piece import Piece
+
+# Fixed seed so that keys are identical across processes and restarts (shared caches, stored books).
+ZOBRIST_SEED = 0x5EED_C4E55
+
+_random = random.Random(ZOBRIST_SEED)
+
+# One key per (color, piece type, square), indexed by piece_key_index(piece) * 64 + square index.
+PIECE_KEYS: List[int] = [_random.getrandbits(64) for _ in range(2 * len(PieceType) * 64)]
+BLACK_TO_MOVE_KEY: int = _random.getrandbits(64)
+# Indexed by the CastlingRight bitmask and by the en passant column respectively.
+CASTLING_KEYS: List[int] = [_random.getrandbits(64) for _ in range(16)]
+EN_PASSANT_KEYS: List[int] = [_random.getrandbits(64) for _ in range(8)]
+
+
+def piece_key_index(piece: Piece) -> int:
+    index: int = (0 if piece.color == Color.WHITE else len(PieceType)) + piece.type.value - 1
+    return index
+
+
+def square_key(piece: Optional[Piece], index: int) -> int:
+    """Key contribution of piece standing on the square with the given index (0 for an empty square)."""
+    if piece is None:
+        return 0
+    return PIECE_KEYS[piece_key_index(piece) * 64 + index]
+
+
+def turn_key(turn: Optional[Color]) -> int:
+    return BLACK_TO_MOVE_KEY if turn == Color.BLACK else 0
+
+
+def castling_key(castling_rights: int) -> int:
+    return CASTLING_KEYS[castling_rights] if castling_rights else 0
+
+
+def en_passant_key(en_passant: Optional[Position]) -> int:
+    return EN_PASSANT_KEYS[en_passant[1]] if en_passant is not None else 0
+
+
+def position_key(board: AbsChessBoard) -> int:
+    """Key of any board's position, computed from scratch; boards keep the same key up to date as zobrist_key."""
+    key = turn_key(board.turn) ^ castling_key(board.castling_rights) ^ en_passant_key(board.en_passant)
+    for index, position in enumerate(POSITIONS):
+        key ^= square_key(board.get_piece(position), index)
+    return key
@@ -0,0 +1,24 @@
+import asyncio
+
+from src.analysis_executor import AnalysisExecutor, analyse_board
+from src.enums import ExecutorMode
+from src.fen import board_from_fen
+
+# Fool's mate
+MATED_FEN = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
+
+
+def test_pool_timeouts_fail_validation_and_move_analysis_to_a_thread() -> None:
+    async def run() -> None:
+        # Every call goes to the pool, and no pool call finishes in time
+        executor = AnalysisExecutor(ExecutorMode.THREAD, timeout=0, inline_cost_threshold=0)
+        board = board_from_fen(MATED_FEN)
+        assert not await executor.is_valid_move(board, (1, 4), (2, 4))
+        analysis = await executor.analyse(board, with_legal_moves=True)
+        assert analysis == analyse_board(board, with_legal_moves=True)
+        assert analysis.is_checkmate
+        assert executor.timeouts == 2
+        assert executor.inline_calls == 0
+        executor.shutdown()
+
+    asyncio.run(run())
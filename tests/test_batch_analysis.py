@@ -0,0 +1,71 @@
+import random
+from typing import List
+
+import pytest
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard_chess_board import BitboardChessBoard
+from src.encoders import Encoder
+from src.enums import Color, MessageType
+from src.fen import board_from_fen, board_to_fen
+from src.move_generator import MoveGenerator
+from src.perft import PERFT_POSITIONS
+
+np = pytest.importorskip("numpy")
+batch_analysis = pytest.importorskip("src.batch_analysis")
+
+RANDOM_GAMES = 4
+RANDOM_GAME_PLIES = 60
+# Fool's mate, a queen stalemate, and an en passant capture that would expose the king on its rank
+EDGE_CASE_FENS = [
+    "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3",
+    "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1",
+    "8/8/8/KPp4r/8/8/8/7k w - c6 0 1",
+]
+
+
+def random_positions() -> List[AbsChessBoard]:
+    """Every position reached in a few random games from each of the perft positions, plus EDGE_CASE_FENS."""
+    rng = random.Random(1)
+    boards = [board_from_fen(fen) for fen in EDGE_CASE_FENS]
+    for position in PERFT_POSITIONS.values():
+        for _ in range(RANDOM_GAMES):
+            board = board_from_fen(position.fen)
+            for _ in range(RANDOM_GAME_PLIES):
+                moves = MoveGenerator(board, use_cache=False).legal_board_moves(board.turn)
+                if not moves:
+                    break
+                board.make_move(rng.choice(moves))
+                boards.append(board_from_fen(board_to_fen(board)))
+    return boards
+
+
+@pytest.fixture(scope="module")
+def boards() -> List[AbsChessBoard]:
+    return random_positions()
+
+
+def test_batch_analysis_agrees_with_the_move_generator(boards: List[AbsChessBoard]) -> None:
+    # A small chunk size so that positions are split across several chunks
+    analysis = batch_analysis.analyse_batch(batch_analysis.batch_from_boards(boards), 97)
+    for index, board in enumerate(boards):
+        move_generator = MoveGenerator(board, use_cache=False)
+        legal_moves = len(move_generator.legal_board_moves(board.turn))
+        is_turn_checked = move_generator.is_in_check(board.turn)
+        fen = board_to_fen(board)
+        assert analysis.white_checked[index] == move_generator.is_in_check(Color.WHITE), fen
+        assert analysis.black_checked[index] == move_generator.is_in_check(Color.BLACK), fen
+        assert analysis.legal_move_counts[index] == legal_moves, fen
+        assert analysis.is_checkmate[index] == (is_turn_checked and not legal_moves), fen
+        assert analysis.is_stalemate[index] == (not is_turn_checked and not legal_moves), fen
+
+
+def test_batch_sources_agree(boards: List[AbsChessBoard]) -> None:
+    batch = batch_analysis.batch_from_boards(boards)
+    frames = [Encoder.encode_binary_message(MessageType.NEW_STATE, board) for board in boards]
+    for from_frames, from_boards in zip(batch_analysis.batch_from_frames(frames), batch):
+        assert (from_frames == from_boards).all()
+    bitboards = np.array(
+        [board_from_fen(board_to_fen(board), BitboardChessBoard).bitboards for board in boards], dtype=np.uint64
+    )
+    assert (batch_analysis.squares_from_bitboards(bitboards) == batch.squares).all()
@@ -0,0 +1,98 @@
+import random
+from typing import Dict, List, Tuple, Type
+
+import pytest
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import POSITIONS
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import BoardMove
+from src.enums import Color
+from src.fen import board_from_fen
+from src.move_generator import MoveGenerator
+from src.perft import PERFT_POSITIONS
+from src.zobrist import position_key
+
+# Plies of random play per game; enough to see captures, castling, en passant and promotions from kiwipete
+RANDOM_GAME_PLIES = 60
+
+
+def rebuilt_attack_maps(board: ChessBoard) -> Tuple[List[int], Dict[Color, List[int]]]:
+    """Attack maps computed from scratch for the board's current position."""
+    fresh = ChessBoard()
+    fresh.board = board.board
+    fresh._rebuild_attack_maps()
+    return fresh.attacks_from, fresh.attack_maps
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("name", ["startpos", "kiwipete", "position4"])
+def test_incremental_attack_maps_match_a_rebuild(name: str, seed: int) -> None:
+    rng = random.Random(seed)
+    board = board_from_fen(PERFT_POSITIONS[name].fen, ChessBoard)
+    assert isinstance(board, ChessBoard)
+    for _ in range(RANDOM_GAME_PLIES):
+        moves = MoveGenerator(board, use_cache=False).legal_board_moves(board.turn)
+        if not moves:
+            break
+        board.make_move(rng.choice(moves))
+        assert (board.attacks_from, board.attack_maps) == rebuilt_attack_maps(board)
+
+
+def board_state(board: AbsChessBoard) -> tuple:
+    """Everything make_move may change, for comparing a board before and after a round trip."""
+    squares = tuple(board.get_piece(position) for position in POSITIONS)
+    state = (
+        squares,
+        board.turn,
+        board.castling_rights,
+        board.en_passant,
+        board.moved,
+        board.white_king_position,
+        board.black_king_position,
+        board.is_white_checked,
+        board.is_black_checked,
+        board.zobrist_key,
+        len(board.undo_stack),
+        tuple(board.history),
+        tuple(sorted(board.position_counts.items())),
+    )
+    if isinstance(board, ChessBoard):
+        return state + (tuple(board.attacks_from), tuple(map(tuple, board.attack_maps.values())))
+    return state
+
+
+@pytest.mark.parametrize("board_class", [ChessBoard, BitboardChessBoard])
+@pytest.mark.parametrize("name", list(PERFT_POSITIONS))
+def test_make_unmake_round_trip(name: str, board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen(PERFT_POSITIONS[name].fen, board_class)
+    before = board_state(board)
+    for move in MoveGenerator(board, use_cache=False).legal_board_moves(board.turn):
+        undo = board.make_move(move)
+        assert board.zobrist_key == position_key(board)
+        board.unmake_move(undo)
+        assert board_state(board) == before, move
+
+
+@pytest.mark.parametrize("board_class", [ChessBoard, BitboardChessBoard])
+def test_unmaking_a_game_restores_the_start(board_class: Type[AbsChessBoard]) -> None:
+    rng = random.Random(7)
+    board = board_from_fen(PERFT_POSITIONS["kiwipete"].fen, board_class)
+    before = board_state(board)
+    for _ in range(RANDOM_GAME_PLIES):
+        moves = MoveGenerator(board, use_cache=False).legal_board_moves(board.turn)
+        if not moves:
+            break
+        board.make_move(rng.choice(moves))
+    while board.undo_stack:
+        board.unmake_move()
+    assert board_state(board) == before
+
+
+def test_only_the_last_move_can_be_unmade() -> None:
+    board = ChessBoard(turn=Color.WHITE)
+    first = board.make_move(BoardMove((1, 4), (3, 4)))
+    board.make_move(BoardMove((6, 4), (4, 4)))
+    with pytest.raises(AssertionError):
+        board.unmake_move(first)
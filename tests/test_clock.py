@@ -0,0 +1,138 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+from src import chess_game_handler
+from src.chess_game_handler import ChessGameHandler
+from src.clock import GameClock, TimeControl
+from src.data_types import BoardMove
+from src.enums import ClockMode, Color
+from src.message_parser import MessageParser
+from src.timer_wheel import TimerWheel
+
+# White to promote on e8
+PROMOTION_FEN = "8/4P3/8/8/8/8/k7/4K3 w - - 0 1"
+E8_PROMOTION = BoardMove((6, 4), (7, 4))
+
+
+class SlowSocket:
+    """Takes reply_delay seconds to answer anything the handler waits for, and keeps what it was sent."""
+
+    def __init__(self, reply_delay: float) -> None:
+        self.reply_delay = reply_delay
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        self.sent.append(data)
+
+    async def receive_text(self) -> str:
+        await asyncio.sleep(self.reply_delay)
+        return json.dumps(
+            {"message_type": "promotion", "piece": {"color": "white", "type": "queen", "has_moved": True}}
+        )
+
+    async def receive_json(self) -> Dict[str, Any]:
+        await asyncio.sleep(self.reply_delay)
+        return {}
+
+
+def move_message(move: BoardMove) -> Any:
+    return MessageParser.parse_message(
+        json.dumps(
+            {"message_type": "move", "move": {"start_position": list(move.start), "end_position": list(move.end)}}
+        )
+    )
+
+
+def test_increment_is_added_after_the_move() -> None:
+    clock = GameClock(TimeControl(10.0, 2.0, ClockMode.INCREMENT))
+    clock.start(Color.WHITE, 0.0)
+    assert clock.deadline() == 10.0
+    clock.press(3.0)
+    assert clock.remaining[Color.WHITE] == 9.0
+    # A move faster than the increment gains time
+    clock.press(4.0)
+    assert clock.remaining[Color.BLACK] == 11.0
+    assert clock.time_left(Color.WHITE, 5.0) == 8.0
+
+
+def test_delay_is_waited_out_before_the_clock_runs() -> None:
+    clock = GameClock(TimeControl(10.0, 2.0, ClockMode.DELAY))
+    clock.start(Color.WHITE, 0.0)
+    assert clock.deadline() == 12.0
+    assert clock.time_left(Color.WHITE, 1.5) == 10.0
+    clock.press(3.0)
+    assert clock.remaining[Color.WHITE] == 9.0
+    # A move within the delay costs nothing, and nothing is gained either
+    clock.press(4.0)
+    assert clock.remaining[Color.BLACK] == 10.0
+    assert clock.deadline() == 4.0 + 2.0 + 9.0
+
+
+def test_flag_falls_between_two_moves() -> None:
+    clock = GameClock(TimeControl(5.0))
+    clock.start(Color.WHITE, 0.0)
+    clock.press(1.0)
+    assert clock.flagged(5.5) is None
+    assert clock.flagged(6.0) == Color.BLACK
+    assert clock.time_left(Color.WHITE, 6.0) == 4.0
+
+
+def test_handler_ends_the_game_when_the_flag_falls_between_moves() -> None:
+    async def play() -> None:
+        socket = SlowSocket(0.0)
+        wheel = TimerWheel(resolution=0.005)
+        wheel.start()
+        handler = ChessGameHandler(socket, timer_wheel=wheel, time_control=TimeControl(0.05))
+        await handler.initialize_game()
+        await handler.handle_message(move_message(BoardMove((1, 4), (3, 4))))
+        assert socket.sent[-1]["message_type"] == "new_state"
+        # Black doesn't answer; the timer wheel calls the flag without any message coming in
+        await asyncio.sleep(0.2)
+        assert socket.sent[-1]["message_type"] == "timeout"
+        await handler.handle_message(move_message(BoardMove((6, 4), (4, 4))))
+        assert socket.sent[-1]["message_type"] == "failed_move"
+        wheel.stop()
+
+    asyncio.run(play())
+
+
+def play_promotion(socket: SlowSocket, time_control: TimeControl) -> ChessGameHandler:
+    async def play() -> ChessGameHandler:
+        handler = ChessGameHandler(socket, time_control=time_control)
+        await handler.initialize_game(
+            MessageParser.parse_cookie(json.dumps({"message_type": "cookie", "fen": PROMOTION_FEN}))
+        )
+        await handler.handle_message(move_message(E8_PROMOTION))
+        return handler
+
+    return asyncio.run(play())
+
+
+def test_promotion_choice_is_charged_to_the_mover() -> None:
+    handler = play_promotion(SlowSocket(0.05), TimeControl(10.0))
+    assert handler.game_board is not None and handler.game_board.clock is not None
+    assert handler.game_board.get_piece((7, 4)) is not None
+    assert handler.game_board.clock.remaining[Color.WHITE] <= 10.0 - 0.05
+
+
+def test_flag_falls_while_choosing_a_promotion() -> None:
+    socket = SlowSocket(1.0)
+    handler = play_promotion(socket, TimeControl(0.05))
+    assert socket.sent[-1]["message_type"] == "timeout"
+    assert handler.game_board is not None and handler.game_board.get_piece((7, 4)) is None
+
+
+def test_unacknowledged_game_end_restarts(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chess_game_handler, "ACKNOWLEDGEMENT_TIMEOUT", 0.01)
+
+    async def play() -> None:
+        socket = SlowSocket(60.0)
+        handler = ChessGameHandler(socket)
+        await handler.initialize_game()
+        await asyncio.wait_for(handler.handle_checkmate(), 1)
+        assert [message["message_type"] for message in socket.sent[-2:]] == ["checkmate", "restart"]
+
+    asyncio.run(play())
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Type
+
+import pytest
+
+from src.abs_chess_board import FIFTY_MOVE_PLIES, AbsChessBoard
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.chess_game_handler import ChessGameHandler
+from src.data_types import BoardMove
+from src.fen import START_FEN, board_from_fen
+from src.message_parser import MessageParser
+
+BOARD_CLASSES = [ChessBoard, BitboardChessBoard]
+# Both knights out and back: the start position recurs every four plies
+KNIGHT_SHUFFLE = [
+    BoardMove((0, 6), (2, 5)),
+    BoardMove((7, 6), (5, 5)),
+    BoardMove((2, 5), (0, 6)),
+    BoardMove((5, 5), (7, 6)),
+]
+# White rook and king against a lone king, one ply short of the fifty-move rule
+ROOK_ENDING_FEN = "8/8/8/4k3/8/8/8/R3K3 w - - 99 60"
+
+
+class RecordingSocket:
+    """Answers every acknowledgement the handler waits for and keeps what it was sent."""
+
+    def __init__(self) -> None:
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        self.sent.append(data)
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(json.loads(text))
+
+    async def receive_json(self) -> Dict[str, Any]:
+        return {}
+
+
+def move_message(move: BoardMove) -> Any:
+    return MessageParser.parse_message(
+        json.dumps(
+            {"message_type": "move", "move": {"start_position": list(move.start), "end_position": list(move.end)}}
+        )
+    )
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_threefold_repetition(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen(START_FEN, board_class)
+    for move in KNIGHT_SHUFFLE:
+        board.make_move(move)
+    assert board.repetition_count() == 2
+    assert not board.is_threefold_repetition()
+    for move in KNIGHT_SHUFFLE:
+        board.make_move(move)
+    assert board.repetition_count() == 3
+    assert board.is_threefold_repetition()
+    board.unmake_move()
+    assert not board.is_threefold_repetition()
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_a_pawn_move_makes_earlier_positions_unrepeatable(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen(START_FEN, board_class)
+    for move in KNIGHT_SHUFFLE:
+        board.make_move(move)
+    board.make_move(BoardMove((1, 4), (3, 4)))
+    assert board.halfmove_clock == 0
+    assert board.repetition_count() == 1
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_fifty_move_rule(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen(ROOK_ENDING_FEN, board_class)
+    assert board.halfmove_clock == FIFTY_MOVE_PLIES - 1
+    assert not board.is_fifty_move_draw()
+    board.make_move(BoardMove((0, 0), (1, 0)))
+    assert board.is_fifty_move_draw()
+    board.unmake_move()
+    assert not board.is_fifty_move_draw()
+
+
+def test_handler_ends_the_game_on_a_draw() -> None:
+    async def play() -> None:
+        socket = RecordingSocket()
+        handler = ChessGameHandler(socket)
+        await handler.initialize_game()
+        for move in KNIGHT_SHUFFLE * 2:
+            await handler.handle_message(move_message(move))
+        assert [message["message_type"] for message in socket.sent[-3:]] == ["new_state", "repetition_draw", "restart"]
+
+        socket.sent.clear()
+        await handler.initialize_game(
+            MessageParser.parse_cookie(json.dumps({"message_type": "cookie", "fen": ROOK_ENDING_FEN}))
+        )
+        await handler.handle_message(move_message(BoardMove((0, 0), (1, 0))))
+        assert [message["message_type"] for message in socket.sent[-2:]] == ["fifty_move_draw", "restart"]
+
+    asyncio.run(play())
@@ -0,0 +1,65 @@
+from typing import Type
+
+import pytest
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.data_types import BoardMove
+from src.encoders import Encoder
+from src.enums import Color, MessageType
+from src.fen import START_FEN, board_from_fen, board_to_fen, read_fens
+from src.perft import PERFT_POSITIONS
+
+BOARD_CLASSES = [ChessBoard, BitboardChessBoard]
+RUY_LOPEZ_EPD = 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - bm Bb5; id "ruy lopez";'
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+@pytest.mark.parametrize("name", list(PERFT_POSITIONS))
+def test_fen_round_trip(name: str, board_class: Type[AbsChessBoard]) -> None:
+    fen = PERFT_POSITIONS[name].fen
+    assert board_to_fen(board_from_fen(fen, board_class)) == fen
+
+
+def test_epd_lines_are_read_with_default_counters() -> None:
+    (board,) = read_fens([RUY_LOPEZ_EPD])
+    assert board.turn == Color.WHITE
+    assert board.halfmove_clock == 0
+    assert board_to_fen(board) == "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1"
+
+
+def test_counters_are_optional() -> None:
+    assert board_to_fen(board_from_fen("8/8/8/4k3/8/8/8/R3K3 b - -")) == "8/8/8/4k3/8/8/8/R3K3 b - - 0 1"
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_fullmove_number_follows_the_game(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen(START_FEN, board_class)
+    # 1. Nf3 Nf6 2. Ng1
+    for move, fullmove_number in [
+        (BoardMove((0, 6), (2, 5)), 1),
+        (BoardMove((7, 6), (5, 5)), 2),
+        (BoardMove((2, 5), (0, 6)), 2),
+    ]:
+        board.make_move(move)
+        assert board.fullmove_number == fullmove_number
+        assert board_to_fen(board).split()[-1] == str(fullmove_number)
+    board.unmake_move()
+    assert board.fullmove_number == 2
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_fullmove_number_counts_on_from_the_fen(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen("8/8/8/4k3/8/8/8/R3K3 b - - 12 40", board_class)
+    assert board.fullmove_number == 40
+    board.make_move(BoardMove((4, 4), (5, 4)))
+    assert board_to_fen(board) == "8/8/4k3/8/8/8/8/R3K3 w - - 13 41"
+
+
+def test_snapshots_carry_the_fen_only_for_clients_that_opted_in() -> None:
+    board = board_from_fen(START_FEN)
+    snapshot = Encoder.encode_message(MessageType.NEW_STATE, board, 1)
+    assert snapshot["game"] is not None and snapshot["fen"] is None
+    fen_snapshot = Encoder.encode_message(MessageType.NEW_STATE, board, 1, fen_snapshots=True)
+    assert fen_snapshot["game"] is None and fen_snapshot["fen"] == START_FEN
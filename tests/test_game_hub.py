@@ -0,0 +1,49 @@
+import asyncio
+import json
+from typing import Any
+
+from starlette.websockets import WebSocketDisconnect
+
+from src.chess_board import ChessBoard
+from src.enums import MessageType
+from src.fen import START_FEN, board_from_fen
+from src.game_hub import GameHub, Subscriber
+
+
+class ClosedSocket:
+    """A spectator that went away: every send fails the way Starlette's do after the close."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+    async def send_text(self, text: str) -> None:
+        raise self.error
+
+
+def test_subscriber_leaves_its_games_when_its_socket_closes() -> None:
+    async def watch(error: Exception) -> None:
+        hub = GameHub()
+        board = board_from_fen(START_FEN, ChessBoard)
+        hub.publish("game", MessageType.NEW_STATE, board, 1)
+        socket: Any = ClosedSocket(error)
+        subscriber = Subscriber(socket)
+        sender = asyncio.create_task(subscriber.run(hub))
+        hub.subscribe("game", subscriber)
+        hub.subscribe("other", subscriber)
+        await asyncio.wait_for(sender, 1)
+        assert not subscriber.game_ids
+        assert not hub.channels["game"].subscribers
+        # A game nobody plays or watches is forgotten
+        assert "other" not in hub.channels
+
+    for error in (WebSocketDisconnect(), RuntimeError("Cannot call send once a close message has been sent.")):
+        asyncio.run(watch(error))
+
+
+def test_spectators_get_fen_snapshots() -> None:
+    hub = GameHub()
+    hub.publish("game", MessageType.NEW_STATE, board_from_fen(START_FEN, ChessBoard), 1)
+    text = hub.channels["game"].snapshot("game")
+    assert text is not None
+    snapshot = json.loads(text)
+    assert snapshot["fen"] == START_FEN and snapshot["game"] is None and snapshot["game_id"] == "game"
@@ -0,0 +1,51 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.data_types import BoardMove
+from src.fen import START_FEN
+from src.game_store import InMemoryGameStore, SQLiteGameStore
+
+E4 = BoardMove((6, 4), (4, 4))
+
+
+def test_in_memory_store_drops_the_least_recently_played_game() -> None:
+    async def play() -> None:
+        store = InMemoryGameStore(max_games=2)
+        first = await store.create_game(START_FEN)
+        second = await store.create_game(START_FEN)
+        await store.append_move(first, E4)
+        third = await store.create_game(START_FEN)
+        assert await store.load_game(second) is None
+        # Moves of a dropped game are ignored rather than raising
+        await store.append_move(second, E4)
+        first_game = await store.load_game(first)
+        assert first_game is not None and first_game.moves == [E4]
+        assert await store.load_game(third) is not None
+
+    asyncio.run(play())
+
+
+def test_sqlite_store_keeps_a_batch_that_failed_to_commit(tmp_path: Path) -> None:
+    async def play() -> None:
+        store = SQLiteGameStore(str(tmp_path / "games.db"), max_batch=1000)
+        game_id = await store.create_game(START_FEN)
+        await store.append_move(game_id, E4)
+        store._connect()
+        assert store.connection is not None
+        # A second connection holding the write lock makes the commit fail with "database is locked"
+        blocker = sqlite3.connect(str(tmp_path / "games.db"), timeout=0)
+        blocker.execute("BEGIN IMMEDIATE")
+        store.connection.execute("PRAGMA busy_timeout = 0")
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush()
+        assert len(store.pending) == 2
+        blocker.rollback()
+        blocker.close()
+        game = await store.load_game(game_id)
+        assert game is not None and game.moves == [E4]
+        await store.close()
+
+    asyncio.run(play())
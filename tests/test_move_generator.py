@@ -0,0 +1,91 @@
+import random
+from typing import Type
+
+import pytest
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.enums import Color
+from src.fen import board_from_fen, board_to_fen
+from src.move_generator import MoveGenerator
+from src.perft import PERFT_POSITIONS, perft
+
+BOARD_CLASSES = [ChessBoard, BitboardChessBoard]
+# Positions cheap enough to also run at depth 3 on every board
+DEPTH_3_POSITIONS = ["startpos", "position3", "position4"]
+
+
+def legal_moves(fen: str, board_class: Type[AbsChessBoard]) -> set:
+    board = board_from_fen(fen, board_class)
+    return set(MoveGenerator(board, use_cache=False).legal_moves(board.turn))
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+@pytest.mark.parametrize("name", list(PERFT_POSITIONS))
+def test_perft_depth_2(name: str, board_class: Type[AbsChessBoard]) -> None:
+    position = PERFT_POSITIONS[name]
+    assert perft(board_from_fen(position.fen, board_class), 2) == position.expected[1]
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+@pytest.mark.parametrize("name", DEPTH_3_POSITIONS)
+def test_perft_depth_3(name: str, board_class: Type[AbsChessBoard]) -> None:
+    position = PERFT_POSITIONS[name]
+    assert perft(board_from_fen(position.fen, board_class), 3) == position.expected[2]
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_pinned_piece_stays_on_the_pin_line(board_class: Type[AbsChessBoard]) -> None:
+    # The e2 rook is pinned by the e8 rook: it may slide along the e-file only
+    moves = legal_moves("4r1k1/8/8/8/8/8/4R3/4K3 w - - 0 1", board_class)
+    rook_ends = {end for start, end in moves if start == (1, 4)}
+    assert rook_ends == {(row, 4) for row in range(2, 8)}
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_check_must_be_answered(board_class: Type[AbsChessBoard]) -> None:
+    # The black queen on e2 checks the white king; only taking her or stepping aside is legal
+    moves = legal_moves("4k3/8/8/8/8/8/4q3/4K1N1 w - - 0 1", board_class)
+    assert moves == {((0, 4), (1, 4)), ((0, 6), (1, 4))}
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_king_cannot_castle_through_an_attacked_square(board_class: Type[AbsChessBoard]) -> None:
+    # The f8 rook covers f1, so kingside castling is illegal while queenside stays legal
+    moves = legal_moves("5rk1/8/8/8/8/8/8/R3K2R w KQ - 0 1", board_class)
+    assert ((0, 4), (0, 6)) not in moves
+    assert ((0, 4), (0, 2)) in moves
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_en_passant_exposing_the_king_is_illegal(board_class: Type[AbsChessBoard]) -> None:
+    # Taking d6 en passant would clear the fifth rank between the white king and the h5 rook
+    moves = legal_moves("4k3/8/8/K2pP2r/8/8/8/8 w - d6 0 1", board_class)
+    assert ((4, 4), (5, 3)) not in moves
+    assert ((4, 4), (5, 4)) in moves
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+def test_checkmated_side_has_no_moves(board_class: Type[AbsChessBoard]) -> None:
+    board = board_from_fen("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", board_class)
+    generator = MoveGenerator(board, use_cache=False)
+    assert generator.is_in_check(Color.WHITE)
+    assert not generator.has_legal_move(Color.WHITE)
+
+
+@pytest.mark.parametrize("name", list(PERFT_POSITIONS))
+def test_bitboard_generator_agrees_with_the_matrix_board(name: str) -> None:
+    rng = random.Random(name)
+    board = board_from_fen(PERFT_POSITIONS[name].fen, ChessBoard)
+    for _ in range(80):
+        fen = board_to_fen(board)
+        matrix_generator = MoveGenerator(board, use_cache=False)
+        bitboard = board_from_fen(fen, BitboardChessBoard)
+        bitboard_generator = MoveGenerator(bitboard, use_cache=False)
+        assert set(bitboard_generator.legal_moves(bitboard.turn)) == legal_moves(fen, ChessBoard), fen
+        assert bitboard_generator.is_in_check(bitboard.turn) == matrix_generator.is_in_check(board.turn), fen
+        moves = matrix_generator.legal_board_moves(board.turn)
+        if not moves:
+            break
+        board.make_move(rng.choice(moves))
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from src.chess_board import ChessBoard
+from src.enums import Color
+from src.move_generator import MoveGenerator
+from src.profiler import SamplingProfiler
+
+
+class Game:
+    def __init__(self, game_id: str) -> None:
+        self.game_id = game_id
+
+    def work(self) -> None:
+        board = ChessBoard(turn=Color.WHITE)
+        for _ in range(100):
+            MoveGenerator(board, use_cache=False).legal_board_moves(Color.WHITE)
+
+
+def test_stopping_a_game_writes_only_its_profile_and_drops_its_counts(tmp_path: Path) -> None:
+    profiler = SamplingProfiler(str(tmp_path), [Game.work], interval=0.001)
+    first, second = Game("first"), Game("second")
+    profiler.start(first)
+    profiler.start(second)
+    first.work()
+    second.work()
+    profiler.stop(first)
+    assert [path.name for path in tmp_path.iterdir()] == ["first.collapsed"]
+    assert "Game.work" in (tmp_path / "first.collapsed").read_text()
+    assert id(first) not in profiler.samples
+    # The sampler keeps running for the game still profiled
+    assert profiler.thread is not None
+
+    profiler.stop(second)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["first.collapsed", "second.collapsed"]
+    assert not profiler.samples
+    assert profiler.thread is None
@@ -0,0 +1,69 @@
+from typing import List
+
+import pytest
+
+from src.timer_wheel import WHEEL_SLOTS, Timer, TimerWheel
+
+START_TICK = 100
+
+
+def wheel_at(tick: int) -> TimerWheel:
+    """A wheel with one-second ticks counted from time 0, advanced to tick."""
+    wheel = TimerWheel(resolution=1.0)
+    wheel.started_at = 0.0
+    for _ in range(tick):
+        wheel.advance()
+    return wheel
+
+
+def level_of(wheel: TimerWheel, timer: Timer) -> int:
+    """The wheel level whose slot holds the timer."""
+    return next(level for level, slots in enumerate(wheel.wheels) if any(slot is timer.slot for slot in slots))
+
+
+@pytest.mark.parametrize(
+    "expires",
+    [
+        START_TICK + 1,
+        START_TICK + WHEEL_SLOTS - 1,
+        # Due just across the first and second level boundaries
+        START_TICK + WHEEL_SLOTS,
+        START_TICK + WHEEL_SLOTS + 1,
+        START_TICK + WHEEL_SLOTS**2,
+        4100,
+        START_TICK + 4100,
+    ],
+)
+def test_timer_fires_on_its_tick(expires: int) -> None:
+    wheel = wheel_at(START_TICK)
+    fired: List[int] = []
+    wheel.call_at(float(expires), lambda: fired.append(wheel.tick))
+    while wheel.tick < expires + WHEEL_SLOTS and not fired:
+        wheel.advance()
+    assert fired == [expires]
+    assert len(wheel) == 0
+
+
+def test_timer_due_in_the_past_fires_on_the_next_tick() -> None:
+    wheel = wheel_at(START_TICK)
+    fired: List[int] = []
+    wheel.call_at(float(WHEEL_SLOTS), lambda: fired.append(wheel.tick))
+    wheel.advance()
+    assert fired == [START_TICK + 1]
+
+
+def test_cancel_after_a_cascade() -> None:
+    wheel = wheel_at(START_TICK)
+    fired: List[int] = []
+    expires = START_TICK + 4100
+    timer = wheel.call_at(float(expires), lambda: fired.append(wheel.tick))
+    assert level_of(wheel, timer) == 2
+    # Run until the timer has been moved down to the bottom level
+    while level_of(wheel, timer) != 0:
+        wheel.advance()
+    assert wheel.tick < expires
+    timer.cancel()
+    assert len(wheel) == 0
+    while wheel.tick < expires + WHEEL_SLOTS:
+        wheel.advance()
+    assert not fired
@@ -0,0 +1,67 @@
+from typing import List, Type
+
+import pytest
+
+from src.abs_chess_board import AbsChessBoard
+from src.bitboard import POSITIONS
+from src.bitboard_chess_board import BitboardChessBoard
+from src.chess_board import ChessBoard
+from src.decoders import Decoder
+from src.encoders import Encoder
+from src.enums import MessageType, PieceType
+from src.fen import board_from_fen
+from src.move_generator import MoveGenerator
+from src.perft import PERFT_POSITIONS
+from src.wire_format import FRAME_SIZE, HEADER, PACKED_BOARD_SIZE
+
+BOARD_CLASSES = [ChessBoard, BitboardChessBoard]
+
+
+def castling_moved_bits(board: AbsChessBoard) -> List[bool]:
+    """
+    The moved bits the binary frame carries: those of the kings on their home squares, and of the rooks in the
+    corners beside an unmoved king. Once the king has moved its rooks can no longer castle, so the frame drops them.
+    """
+    bits = []
+    for row in (0, 7):
+        king = board.get_piece((row, 4))
+        if king is None or king.type != PieceType.KING:
+            continue
+        bits.append(board.has_moved((row, 4)))
+        if board.has_moved((row, 4)):
+            continue
+        for column in (0, 7):
+            rook = board.get_piece((row, column))
+            if rook is not None and rook.type == PieceType.ROOK and rook.color == king.color:
+                bits.append(board.has_moved((row, column)))
+    return bits
+
+
+def boards_after_one_move(fen: str, board_class: Type[AbsChessBoard]) -> List[AbsChessBoard]:
+    """The position itself and every position one legal move later: double pushes, castling, king and rook moves."""
+    boards = [board_from_fen(fen, board_class)]
+    for move in MoveGenerator(boards[0], use_cache=False).legal_board_moves(boards[0].turn):
+        board = board_from_fen(fen, board_class)
+        board.make_move(move)
+        boards.append(board)
+    return boards
+
+
+@pytest.mark.parametrize("board_class", BOARD_CLASSES)
+@pytest.mark.parametrize("name", list(PERFT_POSITIONS))
+def test_binary_frame_round_trip(name: str, board_class: Type[AbsChessBoard]) -> None:
+    for board in boards_after_one_move(PERFT_POSITIONS[name].fen, board_class):
+        frame = Encoder.encode_binary_message(MessageType.NEW_STATE, board, 7)
+        assert len(frame) == FRAME_SIZE == HEADER.size + PACKED_BOARD_SIZE == 9 + 32
+
+        message_type, matrix, game_state, moved = Decoder.decode_binary_game(frame)
+        decoded = board_class(board=matrix, game_state=game_state, moved=moved)
+        assert message_type == MessageType.NEW_STATE
+        assert Decoder.decode_binary_header(frame).sequence == 7
+        assert [decoded.get_piece(pos) for pos in POSITIONS] == [board.get_piece(pos) for pos in POSITIONS]
+        assert decoded.turn == board.turn
+        assert decoded.is_white_checked == board.is_white_checked
+        assert decoded.is_black_checked == board.is_black_checked
+        assert decoded.en_passant == board.en_passant
+        assert decoded.castling_rights == board.castling_rights
+        assert castling_moved_bits(decoded) == castling_moved_bits(board)